@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import argparse
+import random
+import time
+from dataclasses import dataclass
+from typing import List, Optional, Sequence
+
+from benchmarks.suite import percentile
+from rag_pipeline.indexes import VectorIndex
+from rag_pipeline.schemas import H2Node
+
+
+@dataclass(frozen=True)
+class RecallResult:
+    nprobe: int
+    scoped: bool
+    recall: float
+    p50_ms: float
+    exact_p50_ms: float
+    probed: float
+
+    @property
+    def speedup(self) -> float:
+        return self.exact_p50_ms / self.p50_ms if self.p50_ms else float("inf")
+
+
+def clustered_vectors(
+    count: int, dim: int, clusters: int, spread: float = 0.35, seed: int = 7
+) -> List[List[float]]:
+    # Section embeddings bunch by topic, which is what IVF partitioning exploits.
+    rng = random.Random(seed)
+    centres = [[rng.gauss(0.0, 1.0) for _ in range(dim)] for _ in range(clusters)]
+    vectors = []
+    for _ in range(count):
+        centre = rng.choice(centres)
+        vectors.append([value + rng.gauss(0.0, spread) for value in centre])
+    return vectors
+
+
+def build_index(
+    vectors: Sequence[List[float]], dim: int, backend: str = "numpy", **options: object
+) -> VectorIndex:
+    index = VectorIndex(dim=dim, backend=backend, **options)
+    index.add_many(
+        H2Node(
+            node_id=f"h2_{row:06d}",
+            parent=f"h1_{row // 8:05d}",
+            level="H2",
+            head=f"Section {row}",
+            text="",
+            pages=[row // 8 + 1],
+            pdf_name="synthetic.pdf",
+            embedding=vector,
+        )
+        for row, vector in enumerate(vectors)
+    )
+    return index
+
+
+def timed(call) -> tuple:
+    started = time.perf_counter()
+    result = call()
+    return result, time.perf_counter() - started
+
+
+def measure_recall(
+    index: VectorIndex,
+    queries: Sequence[List[float]],
+    nprobes: Sequence[int],
+    top_k: int = 10,
+    scope: Optional[List[str]] = None,
+) -> List[RecallResult]:
+    ann = index.ann
+    index.ann = None
+    exact = []
+    exact_latencies = []
+    for query in queries:
+        hits, seconds = timed(lambda: index.rank(query, scope, top_k))
+        exact.append({node_id for node_id, _ in hits})
+        exact_latencies.append(seconds)
+    index.ann = ann
+
+    results = []
+    for nprobe in nprobes:
+        found = 0
+        latencies = []
+        for query, truth in zip(queries, exact):
+            hits, seconds = timed(lambda: index.rank(query, scope, top_k, nprobe=nprobe))
+            found += len(truth & {node_id for node_id, _ in hits})
+            latencies.append(seconds)
+        results.append(
+            RecallResult(
+                nprobe=nprobe,
+                scoped=scope is not None,
+                recall=found / max(sum(map(len, exact)), 1),
+                p50_ms=percentile(latencies, 0.5) * 1000,
+                exact_p50_ms=percentile(exact_latencies, 0.5) * 1000,
+                probed=ann.probed_fraction(nprobe),
+            )
+        )
+    return results
+
+
+def run(
+    count: int = 20000,
+    dim: int = 128,
+    clusters: int = 64,
+    queries: int = 100,
+    top_k: int = 10,
+    nprobes: Sequence[int] = (1, 2, 4, 8, 16, 32),
+    seed: int = 7,
+) -> List[RecallResult]:
+    vectors = clustered_vectors(count + queries, dim, clusters, seed=seed)
+    index = build_index(vectors[:count], dim)
+    index.build_ann(seed=seed, min_scope=0)
+    probes = vectors[count:]
+    rng = random.Random(seed)
+    # A wide H1-filtered scope, as produced by a doc_filter over a large corpus.
+    scope = sorted(rng.sample(index.node_ids(), count // 2))
+    return measure_recall(index, probes, nprobes, top_k) + measure_recall(
+        index, probes, nprobes, top_k, scope=scope
+    )
+
+
+def report(results: Sequence[RecallResult], top_k: int = 10) -> str:
+    lines = [
+        f"{'scope':<8}{'nprobe':>8}{'probed':>9}{f'recall@{top_k}':>11}"
+        f"{'p50 ms':>10}{'exact ms':>10}{'speedup':>9}"
+    ]
+    for result in results:
+        lines.append(
+            f"{'half' if result.scoped else 'global':<8}{result.nprobe:>8}"
+            f"{result.probed:>9.1%}{result.recall:>11.3f}{result.p50_ms:>10.3f}"
+            f"{result.exact_p50_ms:>10.3f}{result.speedup:>8.1f}x"
+        )
+    return "\n".join(lines)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Recall and latency of IVF search against exact search.")
+    parser.add_argument("--count", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=128)
+    parser.add_argument("--clusters", type=int, default=64)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    args = parser.parse_args(argv)
+    results = run(args.count, args.dim, args.clusters, args.queries, args.top_k, args.nprobe)
+    print(report(results, args.top_k))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import argparse
+import gc
+import random
+import tracemalloc
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+from benchmarks.synthetic import WORDS
+from rag_pipeline.node_table import NodeTable
+from rag_pipeline.schemas import H2Node
+
+
+@dataclass(frozen=True)
+class LegacyH2Node:
+    # The dict-backed layout H2Node had before it was slotted, kept for comparison.
+    node_id: str
+    parent: str
+    level: str
+    head: str
+    text: str
+    pages: List[int]
+    pdf_name: str
+    embedding: Optional[List[float]] = None
+
+
+def synthetic_records(count: int, dim: int, seed: int = 13) -> List[Dict[str, object]]:
+    rng = random.Random(seed)
+    records = []
+    for idx in range(count):
+        h1 = idx // 8
+        embedding = [rng.random() for _ in range(dim)] if dim else None
+        records.append(
+            {
+                "node_id": f"h2_{h1:05d}_{idx % 8:02d}",
+                "parent": f"h1_{h1:05d}",
+                "level": "H2",
+                "head": f"Rule {h1}.{idx % 8}",
+                "text": " ".join(rng.choice(WORDS) for _ in range(60)),
+                "pages": [h1 + 1, h1 + 2],
+                "pdf_name": f"volume_{h1 % 20:02d}.pdf",
+                "embedding": embedding,
+            }
+        )
+    return records
+
+
+def fresh(record: Dict[str, object]) -> Dict[str, object]:
+    # Simulate values decoded from storage: every string and list is its own object.
+    copied = {
+        key: "".join(value) if isinstance(value, str) else value for key, value in record.items()
+    }
+    copied["pages"] = list(record["pages"])
+    if record["embedding"] is not None:
+        copied["embedding"] = list(record["embedding"])
+    return copied
+
+
+def measure(
+    build: Callable[[List[Dict[str, object]]], object], records: List[Dict[str, object]]
+) -> int:
+    gc.collect()
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    inputs = [fresh(record) for record in records]
+    built = build(inputs)
+    # Only what the layout keeps alive counts; decoded values it copied or interned are freed.
+    del inputs
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - start
+    tracemalloc.stop()
+    del built
+    return used
+
+
+def layouts() -> Dict[str, Callable[[List[Dict[str, object]]], object]]:
+    return {
+        "legacy dataclass": lambda records: [LegacyH2Node(**record) for record in records],
+        "slotted H2Node": lambda records: [H2Node(**record) for record in records],
+        "NodeTable": lambda records: NodeTable.from_nodes(H2Node(**record) for record in records),
+    }
+
+
+def run(count: int, dim: int) -> Dict[str, float]:
+    records = synthetic_records(count, dim)
+    text_bytes = sum(len(record["text"]) + 49 for record in records)
+    results = {}
+    for name, build in layouts().items():
+        used = measure(build, records)
+        results[name] = used / count
+        overhead = (used - text_bytes) / count
+        print(f"{name:>18}: {used / count:8.1f} bytes/node ({overhead:8.1f} excluding text)")
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Bytes per H2 node for each node layout.")
+    parser.add_argument("--nodes", type=int, default=50_000)
+    parser.add_argument(
+        "--dim", type=int, default=0, help="embedding dimension (0 = no embeddings)"
+    )
+    args = parser.parse_args()
+    run(args.nodes, args.dim)
+
+
+if __name__ == "__main__":
+    main()
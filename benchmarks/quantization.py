@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import argparse
+import time
+from dataclasses import dataclass
+from typing import List, Optional, Sequence
+
+from benchmarks.ann_recall import build_index, clustered_vectors
+from benchmarks.suite import percentile
+from rag_pipeline.indexes import VectorIndex
+
+MODES = (("float32", False), ("float16", False), ("int8", False), ("int8", True))
+
+
+@dataclass(frozen=True)
+class QuantizationResult:
+    precision: str
+    rescore: bool
+    bytes_per_vector: float
+    recall: float
+    exact_order: float
+    p50_ms: float
+
+
+def measure(
+    index: VectorIndex,
+    reference: VectorIndex,
+    queries: Sequence[List[float]],
+    top_k: int,
+) -> QuantizationResult:
+    found = 0
+    same_order = 0
+    latencies = []
+    for query in queries:
+        truth = [node_id for node_id, _ in reference.rank(query, None, top_k)]
+        started = time.perf_counter()
+        hits = [node_id for node_id, _ in index.rank(query, None, top_k)]
+        latencies.append(time.perf_counter() - started)
+        found += len(set(truth) & set(hits))
+        same_order += hits == truth
+    store = index.store
+    # Per allocated row, leaving out the re-scoring copy, which is meant to stay on a mapped
+    # snapshot rather than the heap.
+    resident = store.memory_bytes() - (store.full.memory_bytes() if index.rescore else 0)
+    return QuantizationResult(
+        precision=index.precision,
+        rescore=index.rescore,
+        bytes_per_vector=resident / store.matrix.shape[0],
+        recall=found / (top_k * max(len(queries), 1)),
+        exact_order=same_order / max(len(queries), 1),
+        p50_ms=percentile(latencies, 0.5) * 1000,
+    )
+
+
+def run(
+    count: int = 20000,
+    dim: int = 256,
+    clusters: int = 64,
+    queries: int = 100,
+    top_k: int = 10,
+    seed: int = 7,
+) -> List[QuantizationResult]:
+    vectors = clustered_vectors(count + queries, dim, clusters, seed=seed)
+    probes = vectors[count:]
+    reference = build_index(vectors[:count], dim)
+    results = []
+    for precision, rescore in MODES:
+        index = build_index(vectors[:count], dim, precision=precision, rescore=rescore)
+        results.append(measure(index, reference, probes, top_k))
+    return results
+
+
+def report(results: Sequence[QuantizationResult], top_k: int = 10) -> str:
+    lines = [
+        f"{'precision':<10}{'rescore':>8}{'bytes/vec':>11}{f'recall@{top_k}':>11}"
+        f"{'same order':>12}{'p50 ms':>9}"
+    ]
+    for result in results:
+        lines.append(
+            f"{result.precision:<10}{'yes' if result.rescore else 'no':>8}"
+            f"{result.bytes_per_vector:>11.1f}{result.recall:>11.3f}"
+            f"{result.exact_order:>12.1%}{result.p50_ms:>9.3f}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Memory and ranking drift of quantized vectors.")
+    parser.add_argument("--count", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--clusters", type=int, default=64)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=10)
+    args = parser.parse_args(argv)
+    print(report(run(args.count, args.dim, args.clusters, args.queries, args.top_k), args.top_k))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import argparse
+import os
+import time
+from dataclasses import dataclass
+from typing import List, Optional, Sequence
+
+from benchmarks.suite import build_documents
+from benchmarks.synthetic import CorpusSpec, generate_queries
+from rag_pipeline.corpus import CorpusIndex
+from rag_pipeline.indexes import VectorIndex
+from rag_pipeline.ingestion import IngestionConfig, parse_markdown_to_tree
+from rag_pipeline.sharding import ShardedRetrievalAgent
+
+
+@dataclass(frozen=True)
+class ShardingResult:
+    shards: int
+    queries_per_second: float
+    matches_unsharded: bool
+
+
+def build_corpus(documents: int, spec: CorpusSpec, backend: str = "numpy") -> CorpusIndex:
+    corpus = CorpusIndex(vector=VectorIndex(backend=backend))
+    corpus.add_trees(
+        {
+            f"doc_{idx}": parse_markdown_to_tree(
+                markdown, IngestionConfig(doc_id=f"doc_{idx}", pdf_name=f"doc_{idx}.pdf")
+            )
+            for idx, markdown in enumerate(build_documents(documents, spec))
+        }
+    )
+    return corpus
+
+
+def throughput(retrieve_many, queries: Sequence[str], batch_size: int, rounds: int) -> float:
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for start in range(0, len(queries), batch_size):
+            retrieve_many(queries[start : start + batch_size])
+    return rounds * len(queries) / (time.perf_counter() - started)
+
+
+def run(
+    shard_counts: Sequence[int] = (1, 2, 4),
+    documents: int = 40,
+    queries: int = 256,
+    batch_size: int = 32,
+    rounds: int = 3,
+    backend: str = "numpy",
+) -> List[ShardingResult]:
+    corpus = build_corpus(documents, CorpusSpec(h1_count=60, h2_per_h1=6), backend)
+    probes = generate_queries(queries)
+    # Short queries stop after BM25, so the H1-only merge path is measured too.
+    probes += [" ".join(query.split()[-2:]) for query in generate_queries(queries // 4, seed=3)]
+    agent = corpus.agent()
+    expected = agent.retrieve_many(probes)
+    # Shard count 0 stands for the in-process agent the shards are compared against.
+    results = [ShardingResult(0, throughput(agent.retrieve_many, probes, batch_size, rounds), True)]
+    for shards in shard_counts:
+        with ShardedRetrievalAgent(corpus, shards=shards) as sharded:
+            matches = sharded.retrieve_many(probes) == expected
+            qps = throughput(sharded.retrieve_many, probes, batch_size, rounds)
+        results.append(ShardingResult(shards, qps, matches))
+    return results
+
+
+def report(results: Sequence[ShardingResult]) -> str:
+    baseline = results[0].queries_per_second
+    lines = [f"{'shards':<10}{'queries/s':>11}{'speedup':>9}{'exact':>7}  ({os.cpu_count()} cores)"]
+    for result in results:
+        label = str(result.shards) if result.shards else "unsharded"
+        lines.append(
+            f"{label:<10}{result.queries_per_second:>11.1f}"
+            f"{result.queries_per_second / baseline:>8.2f}x{'yes' if result.matches_unsharded else 'NO':>7}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Throughput of sharded scatter-gather retrieval.")
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--documents", type=int, default=40)
+    parser.add_argument("--queries", type=int, default=256)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--backend", choices=("python", "numpy"), default="numpy")
+    args = parser.parse_args(argv)
+    print(
+        report(
+            run(args.shards, args.documents, args.queries, args.batch_size, args.rounds, args.backend)
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, List, Optional, Sequence
+
+from benchmarks.synthetic import CorpusSpec, generate_markdown, generate_queries
+from rag_pipeline.corpus import namespace_tree
+from rag_pipeline.indexes import BM25Index, VectorIndex
+from rag_pipeline.ingestion import IngestionConfig, parse_markdown_to_tree
+from rag_pipeline.retrieval import RetrievalAgent
+from rag_pipeline.schemas import DocumentRoot, TreeIndex
+
+try:
+    import mongomock
+except ModuleNotFoundError:
+    mongomock = None
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+SCALES = {
+    "tiny": (2, CorpusSpec(h1_count=5, h2_per_h1=3, words_per_section=30), 20),
+    "small": (4, CorpusSpec(h1_count=40, h2_per_h1=6, words_per_section=80), 200),
+    "medium": (8, CorpusSpec(h1_count=150, h2_per_h1=8, words_per_section=120), 1000),
+}
+
+
+@dataclass(frozen=True)
+class BenchResult:
+    name: str
+    ops: int
+    seconds: float
+    p50_ms: float
+    p99_ms: float
+    peak_kib: float
+
+    @property
+    def throughput(self) -> float:
+        return self.ops / self.seconds if self.seconds else float("inf")
+
+
+def percentile(samples: Sequence[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def bench(
+    name: str,
+    setup: Callable[[], object],
+    operation: Callable[[object, int], object],
+    ops: int,
+) -> BenchResult:
+    state = setup()
+    latencies = []
+    started = time.perf_counter()
+    for idx in range(ops):
+        begin = time.perf_counter()
+        operation(state, idx)
+        latencies.append(time.perf_counter() - begin)
+    seconds = time.perf_counter() - started
+
+    # Peak memory is taken from a second, traced pass so tracing overhead does not skew timings.
+    state = setup()
+    tracemalloc.start()
+    for idx in range(ops):
+        operation(state, idx)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return BenchResult(
+        name=name,
+        ops=ops,
+        seconds=seconds,
+        p50_ms=percentile(latencies, 0.5) * 1000,
+        p99_ms=percentile(latencies, 0.99) * 1000,
+        peak_kib=peak / 1024,
+    )
+
+
+def build_documents(doc_count: int, spec: CorpusSpec) -> List[str]:
+    return [
+        generate_markdown(CorpusSpec(**{**asdict(spec), "seed": spec.seed + idx}))
+        for idx in range(doc_count)
+    ]
+
+
+def merged_tree(configs: Sequence[IngestionConfig], trees: Sequence[TreeIndex]) -> TreeIndex:
+    merged = TreeIndex(h1_nodes={}, h2_nodes={}, lookup={})
+    for config, tree in zip(configs, trees):
+        namespaced = namespace_tree(config.doc_id, tree)
+        merged.h1_nodes.update(namespaced.h1_nodes)
+        merged.h2_nodes.update(namespaced.h2_nodes)
+        merged.lookup.update(namespaced.lookup)
+    return merged
+
+
+def run_suite(scale: str = "small", backend: str = "python") -> List[BenchResult]:
+    doc_count, spec, query_count = SCALES[scale]
+    documents = build_documents(doc_count, spec)
+    configs = [
+        IngestionConfig(doc_id=f"doc_{idx}", pdf_name=f"doc_{idx}.pdf") for idx in range(doc_count)
+    ]
+    trees = [
+        parse_markdown_to_tree(markdown, config) for markdown, config in zip(documents, configs)
+    ]
+    tree = merged_tree(configs, trees)
+    h1_nodes = list(tree.h1_nodes.values())
+    h2_nodes = list(tree.h2_nodes.values())
+    queries = generate_queries(query_count)
+
+    def indexes() -> RetrievalAgent:
+        bm25 = BM25Index()
+        bm25.add_many(h1_nodes)
+        vector = VectorIndex(backend=backend)
+        vector.add_many(h2_nodes)
+        return RetrievalAgent(tree, bm25, vector)
+
+    agent = indexes()
+    scopes = [agent.h2_scope(agent.bm25_search(query, top_k=3)) for query in queries]
+
+    results = [
+        bench(
+            "parse_markdown_to_tree",
+            lambda: None,
+            lambda _, idx: parse_markdown_to_tree(documents[idx], configs[idx]),
+            doc_count,
+        ),
+        bench("bm25.add", BM25Index, lambda bm25, idx: bm25.add(h1_nodes[idx]), len(h1_nodes)),
+        bench(
+            "bm25.search",
+            lambda: agent.bm25,
+            lambda bm25, idx: bm25.search(queries[idx], top_k=5),
+            len(queries),
+        ),
+        bench(
+            f"vector.add[{backend}]",
+            lambda: VectorIndex(backend=backend),
+            lambda vector, idx: vector.add(h2_nodes[idx]),
+            len(h2_nodes),
+        ),
+        bench(
+            f"vector.search[{backend}]",
+            lambda: agent.vector,
+            lambda vector, idx: vector.search(queries[idx], scopes[idx], top_k=4),
+            len(queries),
+        ),
+        bench(
+            "agent.retrieve",
+            lambda: agent,
+            lambda retrieval, idx: retrieval.retrieve(queries[idx]),
+            len(queries),
+        ),
+    ]
+    if mongomock is not None:
+        from rag_pipeline.storage import MongoTreeStore
+
+        def store() -> MongoTreeStore:
+            return MongoTreeStore(uri="mongodb://bench", client=mongomock.MongoClient())
+
+        roots = [
+            DocumentRoot(pdf_name=config.pdf_name, doc_id=config.doc_id) for config in configs
+        ]
+        loaded = store()
+        for root, doc_tree in zip(roots, trees):
+            loaded.save_tree(root, doc_tree)
+        results.append(
+            bench(
+                "mongo.save_tree",
+                store,
+                lambda mongo, idx: mongo.save_tree(roots[idx], trees[idx]),
+                doc_count,
+            )
+        )
+        results.append(
+            bench(
+                "mongo.load_tree",
+                lambda: loaded,
+                lambda mongo, idx: mongo.load_tree(roots[idx].doc_id),
+                doc_count,
+            )
+        )
+    return results
+
+
+def compare(
+    results: Sequence[BenchResult],
+    baseline: Dict[str, Dict[str, float]],
+    tolerance: float,
+    min_delta_ms: float = 0.25,
+) -> List[str]:
+    regressions = []
+    for result in results:
+        expected = baseline.get(result.name)
+        if expected is None:
+            continue
+        if result.throughput < expected["throughput"] * (1 - tolerance):
+            regressions.append(
+                f"{result.name}: throughput {result.throughput:.1f} ops/s "
+                f"< baseline {expected['throughput']:.1f}"
+            )
+        # Sub-millisecond tails are scheduler noise; require an absolute slowdown as well.
+        p99_limit = max(expected["p99_ms"] * (1 + tolerance), expected["p99_ms"] + min_delta_ms)
+        if result.p99_ms > p99_limit:
+            regressions.append(
+                f"{result.name}: p99 {result.p99_ms:.3f} ms > baseline {expected['p99_ms']:.3f}"
+            )
+        if result.peak_kib > expected["peak_kib"] * (1 + tolerance):
+            regressions.append(
+                f"{result.name}: peak {result.peak_kib:.0f} KiB "
+                f"> baseline {expected['peak_kib']:.0f}"
+            )
+    return regressions
+
+
+def to_baseline(results: Sequence[BenchResult]) -> Dict[str, Dict[str, float]]:
+    return {
+        result.name: {
+            "throughput": round(result.throughput, 2),
+            "p50_ms": round(result.p50_ms, 4),
+            "p99_ms": round(result.p99_ms, 4),
+            "peak_kib": round(result.peak_kib, 1),
+        }
+        for result in results
+    }
+
+
+def report(results: Sequence[BenchResult]) -> str:
+    lines = [
+        f"{'benchmark':<26} {'ops':>6} {'ops/s':>11} {'p50 ms':>9} {'p99 ms':>9} {'peak KiB':>10}"
+    ]
+    for result in results:
+        lines.append(
+            f"{result.name:<26} {result.ops:>6} {result.throughput:>11.1f} "
+            f"{result.p50_ms:>9.3f} {result.p99_ms:>9.3f} {result.peak_kib:>10.0f}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Time the ingestion, index and retrieval paths.")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    parser.add_argument("--backend", choices=["python", "numpy"], default="python")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--tolerance", type=float, default=0.5)
+    parser.add_argument("--min-delta-ms", type=float, default=0.25)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--json", help="also write the raw results to this path")
+    args = parser.parse_args(argv)
+
+    results = run_suite(args.scale, args.backend)
+    print(report(results))
+    key = f"{args.scale}/{args.backend}"
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as handle:
+            json.dump([asdict(result) for result in results], handle, indent=2)
+
+    baselines: Dict[str, Dict[str, Dict[str, float]]] = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as handle:
+            baselines = json.load(handle)
+    if args.update_baseline:
+        baselines[key] = to_baseline(results)
+        with open(args.baseline, "w", encoding="utf-8") as handle:
+            json.dump(baselines, handle, indent=2, sort_keys=True)
+            handle.write("\n")
+        print(f"baseline {key} written to {args.baseline}")
+        return 0
+    if key not in baselines:
+        print(f"no baseline for {key}; run with --update-baseline to record one")
+        return 0
+    regressions = compare(results, baselines[key], args.tolerance, args.min_delta_ms)
+    for regression in regressions:
+        print(f"REGRESSION {regression}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
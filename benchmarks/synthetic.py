@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import random
+from dataclasses import dataclass
+from typing import List
+
+VOCABULARY = [
+    "board", "cantonment", "tax", "levy", "powers", "section", "appeal", "officer",
+    "notice", "penalty", "license", "water", "building", "election", "member", "fund",
+    "collector", "tribunal", "schedule", "rule", "order", "assessment", "property", "land",
+    "lease", "permit", "inspection", "fine", "sanction", "president", "vice", "meeting",
+    "quorum", "budget", "account", "audit", "contract", "market", "trade", "drain",
+    "street", "lighting", "sanitation", "hospital", "school", "octroi", "toll", "rent",
+]
+# The first sixteen words, for small hand-sized test corpora.
+WORDS = VOCABULARY[:16]
+
+# A two-chapter code used by the unit tests.
+SAMPLE_MARKDOWN = (
+    "# Board\n[[PAGE 1]]\n"
+    "## Powers\nThe board may levy taxes and tolls.\n"
+    "## Duties\nThe board shall meet monthly.\n"
+    "# Appeals\n[[PAGE 2]]\n"
+    "## Filing\nAppeals lie to the collector within 30 days.\n"
+)
+
+
+@dataclass(frozen=True)
+class CorpusSpec:
+    h1_count: int = 40
+    h2_per_h1: int = 6
+    words_per_section: int = 80
+    sections_per_page: float = 2.0
+    seed: int = 7
+
+
+def section_text(rng: random.Random, words: int) -> str:
+    sentences = []
+    remaining = words
+    while remaining > 0:
+        length = min(remaining, rng.randint(8, 20))
+        sentence = " ".join(rng.choice(VOCABULARY) for _ in range(length))
+        sentences.append(sentence.capitalize() + ".")
+        remaining -= length
+    return " ".join(sentences)
+
+
+def generate_markdown(spec: CorpusSpec) -> str:
+    rng = random.Random(spec.seed)
+    lines: List[str] = ["[[PAGE 1]]"]
+    page = 1
+    sections = 0
+    for h1 in range(spec.h1_count):
+        title = f"{rng.choice(VOCABULARY).title()} {rng.choice(VOCABULARY)}"
+        lines.append(f"# Chapter {h1 + 1} {title}")
+        lines.append(section_text(rng, max(spec.words_per_section // 4, 1)))
+        for h2 in range(spec.h2_per_h1):
+            if sections >= spec.sections_per_page * page:
+                page += 1
+                lines.append(f"[[PAGE {page}]]")
+            lines.append(f"## Section {h1 + 1}.{h2 + 1} {rng.choice(VOCABULARY).title()}")
+            lines.append(section_text(rng, spec.words_per_section))
+            sections += 1
+    return "\n".join(lines) + "\n"
+
+
+def generate_queries(count: int, seed: int = 11) -> List[str]:
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        words = [rng.choice(VOCABULARY) for _ in range(rng.randint(2, 8))]
+        queries.append(f"What does the code say about {' '.join(words)}?")
+    return queries
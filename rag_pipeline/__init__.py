@@ -1,23 +1,48 @@
+from rag_pipeline.corpus import CorpusIndex, ingest_corpus
+from rag_pipeline.embeddings import CachedEmbedder, EmbeddingCache, HashEmbedder
 from rag_pipeline.inference import AnswerPayload, InferencePipeline
-from rag_pipeline.ingestion import IngestionConfig, parse_markdown_to_tree
+from rag_pipeline.ingestion import (
+    IngestionConfig,
+    iter_markdown_nodes,
+    parse_markdown_file,
+    parse_markdown_stream,
+    parse_markdown_to_tree,
+)
 from rag_pipeline.indexes import BM25Index, VectorIndex
 from rag_pipeline.llm import LlmConfig, LlmSummarizer, load_summarizer_from_env
+from rag_pipeline.result_cache import ResultCache
 from rag_pipeline.retrieval import RetrievalAgent, RetrievalResult
-from rag_pipeline.schemas import DocumentRoot, H1Node, H2Node, TreeIndex
+from rag_pipeline.schemas import DocFilter, DocumentRoot, H1Node, H2Node, TreeIndex
+from rag_pipeline.snapshot import SnapshotError
+from rag_pipeline.summary_cache import SummaryCache
+from rag_pipeline.tracing import MetricsRegistry
 from rag_pipeline.storage import MongoTreeStore
 
 __all__ = [
     "AnswerPayload",
     "BM25Index",
+    "CachedEmbedder",
+    "CorpusIndex",
+    "DocFilter",
     "DocumentRoot",
+    "EmbeddingCache",
     "H1Node",
     "H2Node",
+    "HashEmbedder",
     "IngestionConfig",
     "InferencePipeline",
+    "MetricsRegistry",
     "MongoTreeStore",
+    "ResultCache",
     "RetrievalAgent",
     "RetrievalResult",
+    "SnapshotError",
+    "SummaryCache",
     "TreeIndex",
     "VectorIndex",
+    "ingest_corpus",
+    "iter_markdown_nodes",
+    "parse_markdown_file",
+    "parse_markdown_stream",
     "parse_markdown_to_tree",
 ]
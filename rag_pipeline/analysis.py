@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import threading
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from rag_pipeline.utils import TOKEN_RE, stable_hash
+
+
+@dataclass(frozen=True)
+class Analysis:
+    tokens: Tuple[str, ...]
+    # None marks a query token that is not in the vocabulary.
+    token_ids: Tuple[Optional[int], ...]
+
+
+class Vocabulary:
+    def __init__(self) -> None:
+        self.ids: Dict[str, int] = {}
+        self.tokens: List[str] = []
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.tokens)
+
+    def __contains__(self, token: str) -> bool:
+        return token in self.ids
+
+    def intern(self, token: str) -> int:
+        token_id = self.ids.get(token)
+        if token_id is None:
+            with self._lock:
+                token_id = self.ids.get(token)
+                if token_id is None:
+                    token_id = len(self.tokens)
+                    self.tokens.append(token)
+                    self.ids[token] = token_id
+        return token_id
+
+
+class Analyzer:
+    def __init__(
+        self, vocabulary: Optional[Vocabulary] = None, query_cache_size: int = 4096
+    ) -> None:
+        self.vocabulary = vocabulary if vocabulary is not None else Vocabulary()
+        self._slots: Dict[int, List[int]] = {}
+        self._lock = threading.Lock()
+        # Queries repeat and are analyzed by both BM25 and the embedder, so they are memoized.
+        self.analyze_query = lru_cache(maxsize=query_cache_size)(self._analyze_query)
+
+    def _analyze_query(self, query: str) -> Analysis:
+        # Query tokens are looked up, never interned, so serving does not grow the vocabulary.
+        return self.analyze(query, intern=False)
+
+    def analyze(self, text: str, intern: bool = True) -> Analysis:
+        if text.isascii():
+            # The pattern is ASCII-only, so lowering first matches lowering each token.
+            tokens = TOKEN_RE.findall(text.lower())
+        else:
+            tokens = [token.lower() for token in TOKEN_RE.findall(text)]
+        token_ids = list(map(self.vocabulary.ids.get, tokens))
+        if intern and None in token_ids:
+            add = self.vocabulary.intern
+            token_ids = [
+                add(token) if token_id is None else token_id
+                for token, token_id in zip(tokens, token_ids)
+            ]
+        return Analysis(tuple(tokens), tuple(token_ids))
+
+    def slots(self, dim: int) -> List[int]:
+        # Hash buckets per token id, filled in as the vocabulary grows.
+        slots = self._slots.get(dim)
+        if slots is None or len(slots) < len(self.vocabulary):
+            with self._lock:
+                slots = self._slots.setdefault(dim, [])
+                tokens = self.vocabulary.tokens
+                slots.extend(stable_hash(token) % dim for token in tokens[len(slots) : len(tokens)])
+        return slots
+
+    def term_vector(self, analysis: Analysis, dim: int) -> List[float]:
+        slots = self.slots(dim)
+        vector = [0.0] * dim
+        for token, token_id in zip(analysis.tokens, analysis.token_ids):
+            slot = slots[token_id] if token_id is not None else stable_hash(token) % dim
+            vector[slot] += 1.0
+        return vector
+
+
+ANALYZER = Analyzer()
+
+
+def analyze(text: str) -> Analysis:
+    return ANALYZER.analyze(text)
+
+
+def analyze_query(query: str) -> Analysis:
+    return ANALYZER.analyze_query(query)
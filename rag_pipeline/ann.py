@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import math
+from typing import Collection, Dict, List, Optional, Sequence
+
+from rag_pipeline.vector_store import normalize, np, require_numpy
+
+
+class IvfIndex:
+    def __init__(
+        self,
+        dim: int,
+        nlist: int = 64,
+        nprobe: int = 8,
+        iterations: int = 10,
+        seed: int = 0,
+    ) -> None:
+        require_numpy()
+        self.dim = dim
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.iterations = iterations
+        self.seed = seed
+        self.centroids: Optional["np.ndarray"] = None
+        self.lists: List[Dict[str, None]] = []
+        self.assignments: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.assignments)
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    def train(self, node_ids: Sequence[str], vectors: "np.ndarray") -> None:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0.0, 1.0, norms)
+        nlist = max(1, min(self.nlist, len(node_ids)))
+        rng = np.random.default_rng(self.seed)
+        centroids = vectors[rng.choice(len(node_ids), size=nlist, replace=False)].copy()
+        for _ in range(self.iterations):
+            # Spherical k-means: cosine assignment, re-normalised mean per cluster.
+            assignment = self._nearest(vectors, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, vectors)
+            counts = np.bincount(assignment, minlength=nlist)
+            empty = np.flatnonzero(counts == 0)
+            if empty.size:
+                sums[empty] = vectors[rng.choice(len(node_ids), size=empty.size, replace=False)]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            centroids = (sums / np.where(norms == 0.0, 1.0, norms)).astype(np.float32)
+        self.centroids = centroids
+        self.lists = [{} for _ in range(nlist)]
+        self.assignments = {}
+        for node_id, cluster in zip(node_ids, self._nearest(vectors, centroids).tolist()):
+            self.lists[cluster][node_id] = None
+            self.assignments[node_id] = cluster
+
+    def _nearest(self, vectors: "np.ndarray", centroids: "np.ndarray") -> "np.ndarray":
+        assignment = np.empty(len(vectors), dtype=np.intp)
+        # Chunked so the (rows x nlist) score block stays small for large corpora.
+        for start in range(0, len(vectors), 8192):
+            block = vectors[start : start + 8192] @ centroids.T
+            assignment[start : start + 8192] = np.argmax(block, axis=1)
+        return assignment
+
+    def add(self, node_id: str, vector: Sequence[float]) -> None:
+        if self.centroids is None:
+            raise ValueError("IvfIndex must be trained before inserting vectors")
+        self.remove(node_id)
+        cluster = int(np.argmax(self.centroids @ normalize(vector)))
+        self.lists[cluster][node_id] = None
+        self.assignments[node_id] = cluster
+
+    def remove(self, node_id: str) -> bool:
+        cluster = self.assignments.pop(node_id, None)
+        if cluster is None:
+            return False
+        del self.lists[cluster][node_id]
+        return True
+
+    def probe(
+        self,
+        query_embedding: Sequence[float],
+        nprobe: Optional[int] = None,
+        scope: Optional[Collection[str]] = None,
+    ) -> List[str]:
+        if self.centroids is None:
+            raise ValueError("IvfIndex must be trained before searching")
+        nprobe = min(nprobe or self.nprobe, len(self.lists))
+        scores = self.centroids @ normalize(query_embedding)
+        if nprobe < len(scores):
+            probed = np.argpartition(-scores, nprobe - 1)[:nprobe]
+        else:
+            probed = np.arange(len(scores))
+        members = [node_id for cluster in probed.tolist() for node_id in self.lists[cluster]]
+        if scope is None:
+            return members
+        # Walk the probed lists rather than the scope: they are the small side once the
+        # scope is wide enough to be worth approximating.
+        allowed = scope if isinstance(scope, (set, frozenset)) else set(scope)
+        return [node_id for node_id in members if node_id in allowed]
+
+    def probed_fraction(self, nprobe: Optional[int] = None) -> float:
+        if not self.lists:
+            return 0.0
+        return min(nprobe or self.nprobe, len(self.lists)) / len(self.lists)
+
+
+def default_nlist(count: int) -> int:
+    return max(1, int(math.sqrt(count)))
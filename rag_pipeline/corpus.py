@@ -0,0 +1,287 @@
+from __future__ import annotations
+
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field, replace
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Set, Tuple, Union
+
+from rag_pipeline.embeddings import Embedder, attach_embeddings
+from rag_pipeline.incremental import TreeChangeset, apply_changeset, diff_trees
+from rag_pipeline.indexes import BM25Index, VectorIndex
+from rag_pipeline.ingestion import IngestionConfig, parse_markdown_file
+from rag_pipeline.result_cache import ResultCache
+from rag_pipeline.retrieval import RetrievalAgent
+from rag_pipeline.schemas import DocFilter, H1Node, TreeIndex
+from rag_pipeline.tracing import Tracer
+
+NAMESPACE_SEPARATOR = ":"
+
+
+@dataclass(frozen=True)
+class CorpusEntry:
+    path: str
+    doc_id: str
+    pdf_name: str
+
+
+def namespace_node_id(doc_id: str, node_id: str) -> str:
+    return f"{doc_id}{NAMESPACE_SEPARATOR}{node_id}"
+
+
+def namespace_tree(doc_id: str, tree: TreeIndex) -> TreeIndex:
+    def scoped(node_id: str) -> str:
+        return namespace_node_id(doc_id, node_id)
+
+    h1_nodes = {
+        scoped(node.node_id): replace(
+            node,
+            node_id=scoped(node.node_id),
+            children=[scoped(child) for child in node.children],
+        )
+        for node in tree.h1_nodes.values()
+    }
+    h2_nodes = {
+        scoped(node.node_id): replace(node, node_id=scoped(node.node_id), parent=scoped(node.parent))
+        for node in tree.h2_nodes.values()
+    }
+    lookup = {
+        scoped(h1_id): dict(entry, children=[scoped(child) for child in entry["children"]])
+        for h1_id, entry in tree.lookup.items()
+    }
+    return TreeIndex(h1_nodes=h1_nodes, h2_nodes=h2_nodes, lookup=lookup)
+
+
+class CorpusIndex:
+    def __init__(
+        self, bm25: Optional[BM25Index] = None, vector: Optional[VectorIndex] = None
+    ) -> None:
+        self.tree = TreeIndex(h1_nodes={}, h2_nodes={}, lookup={})
+        self.bm25 = bm25 if bm25 is not None else BM25Index()
+        self.vector = vector if vector is not None else VectorIndex()
+        self.doc_h1: Dict[str, Set[str]] = {}
+        self.pdf_h1: Dict[str, Set[str]] = {}
+        self.h1_doc: Dict[str, str] = {}
+
+    def add_tree(self, doc_id: str, tree: TreeIndex, namespaced: bool = False) -> None:
+        self.add_trees({doc_id: tree}, namespaced=namespaced)
+
+    def add_trees(
+        self,
+        trees: Mapping[str, TreeIndex],
+        namespaced: bool = False,
+        index_bm25: bool = True,
+        index_vectors: bool = True,
+    ) -> None:
+        staged = {}
+        for doc_id, tree in trees.items():
+            self.remove_document(doc_id)
+            staged[doc_id] = tree if namespaced else namespace_tree(doc_id, tree)
+        for doc_id, tree in staged.items():
+            self.tree.h1_nodes.update(tree.h1_nodes)
+            self.tree.h2_nodes.update(tree.h2_nodes)
+            self.tree.lookup.update(tree.lookup)
+            members = self.doc_h1.setdefault(doc_id, set())
+            for h1 in tree.h1_nodes.values():
+                members.add(h1.node_id)
+                self.pdf_h1.setdefault(h1.pdf_name, set()).add(h1.node_id)
+                self.h1_doc[h1.node_id] = doc_id
+        self.tree.invalidate_navigation()
+        if index_bm25:
+            self.bm25.add_many(h1 for tree in staged.values() for h1 in tree.h1_nodes.values())
+        if index_vectors:
+            self.vector.add_many(h2 for tree in staged.values() for h2 in tree.h2_nodes.values())
+
+    def document_tree(self, doc_id: str) -> TreeIndex:
+        h1_ids = self.doc_h1.get(doc_id, set())
+        h1_nodes = {h1_id: self.tree.h1_nodes[h1_id] for h1_id in h1_ids}
+        h2_nodes = {
+            h2_id: self.tree.h2_nodes[h2_id]
+            for h1 in h1_nodes.values()
+            for h2_id in h1.children
+            if h2_id in self.tree.h2_nodes
+        }
+        lookup = {h1_id: self.tree.lookup[h1_id] for h1_id in h1_ids if h1_id in self.tree.lookup}
+        return TreeIndex(h1_nodes=h1_nodes, h2_nodes=h2_nodes, lookup=lookup)
+
+    def update_tree(self, doc_id: str, tree: TreeIndex, namespaced: bool = False) -> TreeChangeset:
+        new_tree = tree if namespaced else namespace_tree(doc_id, tree)
+        changeset = diff_trees(self.document_tree(doc_id), new_tree)
+        for h1_id in changeset.removed_h1:
+            self._forget_h1(self.tree.h1_nodes[h1_id])
+        # A changed H1 may have moved to another pdf, so it is re-registered from scratch.
+        for h1 in changeset.changed_h1:
+            self._forget_h1(self.tree.h1_nodes[h1.node_id])
+        apply_changeset(changeset, tree=self.tree, bm25=self.bm25, vector=self.vector)
+        members = self.doc_h1.setdefault(doc_id, set())
+        for h1 in changeset.upserted_h1:
+            members.add(h1.node_id)
+            self.pdf_h1.setdefault(h1.pdf_name, set()).add(h1.node_id)
+            self.h1_doc[h1.node_id] = doc_id
+        return changeset
+
+    def _forget_h1(self, h1: H1Node) -> None:
+        doc_id = self.h1_doc.pop(h1.node_id, None)
+        if doc_id in self.doc_h1:
+            self.doc_h1[doc_id].discard(h1.node_id)
+        members = self.pdf_h1.get(h1.pdf_name)
+        if members is not None:
+            members.discard(h1.node_id)
+            if not members:
+                del self.pdf_h1[h1.pdf_name]
+
+    def remove_document(self, doc_id: str) -> bool:
+        h1_ids = self.doc_h1.pop(doc_id, None)
+        if h1_ids is None:
+            return False
+        h2_ids = []
+        for h1_id in h1_ids:
+            h1 = self.tree.h1_nodes.pop(h1_id)
+            self.tree.lookup.pop(h1_id, None)
+            self._forget_h1(h1)
+            h2_ids.extend(h1.children)
+        for h2_id in h2_ids:
+            self.tree.h2_nodes.pop(h2_id, None)
+        self.tree.invalidate_navigation()
+        self.bm25.remove_many(h1_ids)
+        self.vector.remove_many(h2_ids)
+        return True
+
+    def resolve_filter(self, doc_filter: DocFilter) -> Set[str]:
+        allowed: Optional[Set[str]] = None
+        if doc_filter.doc_ids is not None:
+            allowed = set().union(*(self.doc_h1.get(doc_id, ()) for doc_id in doc_filter.doc_ids))
+        if doc_filter.pdf_names is not None:
+            by_pdf = set().union(*(self.pdf_h1.get(name, ()) for name in doc_filter.pdf_names))
+            allowed = by_pdf if allowed is None else allowed & by_pdf
+        return set(self.h1_doc) if allowed is None else allowed
+
+    def agent(
+        self, result_cache: Optional[ResultCache] = None, tracer: Optional[Tracer] = None
+    ) -> RetrievalAgent:
+        return RetrievalAgent(
+            tree=self.tree,
+            bm25=self.bm25,
+            vector=self.vector,
+            corpus=self,
+            result_cache=result_cache,
+            tracer=tracer,
+        )
+
+
+@dataclass
+class CorpusIngestResult:
+    index: CorpusIndex = field(default_factory=CorpusIndex)
+    trees: Dict[str, TreeIndex] = field(default_factory=dict)
+    failures: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def bm25(self) -> BM25Index:
+        return self.index.bm25
+
+    @property
+    def vector(self) -> VectorIndex:
+        return self.index.vector
+
+
+def discover_corpus(directory: str, suffix: str = ".md") -> List[CorpusEntry]:
+    entries = []
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if not name.endswith(suffix) or not os.path.isfile(path):
+            continue
+        stem = name[: -len(suffix)]
+        entries.append(CorpusEntry(path=path, doc_id=stem, pdf_name=f"{stem}.pdf"))
+    return entries
+
+
+def load_manifest(path: str) -> List[CorpusEntry]:
+    base_dir = os.path.dirname(os.path.abspath(path))
+    entries = []
+    with open(path, "r", encoding="utf-8") as handle:
+        for line in handle:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            entry_path = record["path"]
+            if not os.path.isabs(entry_path):
+                entry_path = os.path.join(base_dir, entry_path)
+            entries.append(
+                CorpusEntry(path=entry_path, doc_id=record["doc_id"], pdf_name=record["pdf_name"])
+            )
+    return entries
+
+
+def corpus_config(entry: CorpusEntry, base: Optional[IngestionConfig] = None) -> IngestionConfig:
+    # Ids are namespaced at parse time, so the trees can be merged without rewriting.
+    base = base or IngestionConfig(doc_id=entry.doc_id, pdf_name=entry.pdf_name)
+    return replace(
+        base,
+        doc_id=entry.doc_id,
+        pdf_name=entry.pdf_name,
+        h1_prefix=namespace_node_id(entry.doc_id, "h1"),
+        h2_prefix=namespace_node_id(entry.doc_id, "h2"),
+    )
+
+
+IngestTask = Tuple[CorpusEntry, Optional[IngestionConfig], Optional[Embedder]]
+
+
+def _ingest_entry(task: IngestTask) -> Tuple[CorpusEntry, Optional[TreeIndex], Optional[str]]:
+    entry, base_config, embedder = task
+    try:
+        tree = parse_markdown_file(entry.path, corpus_config(entry, base_config))
+        if embedder is not None:
+            tree = attach_embeddings(tree, embedder)
+    except Exception as exc:
+        return entry, None, f"{type(exc).__name__}: {exc}"
+    return entry, tree, None
+
+
+def ingest_corpus(
+    source: Union[str, Sequence[CorpusEntry]],
+    workers: Optional[int] = None,
+    chunksize: int = 4,
+    vector: Optional[VectorIndex] = None,
+    bm25: Optional[BM25Index] = None,
+    base_config: Optional[IngestionConfig] = None,
+    index_bm25: bool = True,
+    index_vectors: bool = True,
+) -> CorpusIngestResult:
+    if isinstance(source, str):
+        entries = load_manifest(source) if os.path.isfile(source) else discover_corpus(source)
+    else:
+        entries = list(source)
+    result = CorpusIngestResult(index=CorpusIndex(bm25=bm25, vector=vector))
+
+    # Without vector indexing the embeddings would be thrown away, so workers skip them.
+    embedder = result.vector.embedder if index_vectors else None
+    tasks = []
+    seen = set()
+    for entry in entries:
+        if entry.doc_id in seen:
+            result.failures[entry.path] = f"duplicate doc_id {entry.doc_id!r}"
+            continue
+        seen.add(entry.doc_id)
+        tasks.append((entry, base_config, embedder))
+
+    for entry, tree, error in _run_tasks(tasks, workers, chunksize):
+        if error is not None:
+            result.failures[entry.path] = error
+        else:
+            result.trees[entry.doc_id] = tree
+
+    result.index.add_trees(
+        result.trees, namespaced=True, index_bm25=index_bm25, index_vectors=index_vectors
+    )
+    return result
+
+
+def _run_tasks(
+    tasks: List[IngestTask], workers: Optional[int], chunksize: int
+) -> Iterable[Tuple[CorpusEntry, Optional[TreeIndex], Optional[str]]]:
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(tasks) <= 1:
+        return [_ingest_entry(task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+        return list(pool.map(_ingest_entry, tasks, chunksize=max(chunksize, 1)))
@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import tempfile
+from array import array
+from dataclasses import dataclass, replace
+from typing import List, Optional, Protocol, Sequence
+
+from rag_pipeline.analysis import ANALYZER
+from rag_pipeline.schemas import TreeIndex
+
+
+class Embedder(Protocol):
+    name: str
+    dim: int
+
+    def embed(self, text: str) -> List[float]:
+        ...
+
+    def embed_many(self, texts: Sequence[str]) -> List[List[float]]:
+        ...
+
+
+@dataclass(frozen=True)
+class HashEmbedder:
+    dim: int = 256
+
+    @property
+    def name(self) -> str:
+        return f"hash-blake2b-v1/{self.dim}"
+
+    def embed(self, text: str) -> List[float]:
+        return ANALYZER.term_vector(ANALYZER.analyze(text), self.dim)
+
+    def embed_many(self, texts: Sequence[str]) -> List[List[float]]:
+        return [self.embed(text) for text in texts]
+
+    def embed_queries(self, queries: Sequence[str]) -> List[List[float]]:
+        # Same vectors as embed_many; the analysis is shared with BM25 through the query cache.
+        return [
+            ANALYZER.term_vector(ANALYZER.analyze_query(query), self.dim)
+            for query in queries
+        ]
+
+
+def content_key(namespace: str, text: str) -> str:
+    digest = hashlib.sha256()
+    digest.update(namespace.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(text.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class EmbeddingCache:
+    def __init__(self, root: str) -> None:
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], f"{key}.f32")
+
+    def get(self, key: str, dim: int) -> Optional[List[float]]:
+        try:
+            with open(self.path_for(key), "rb") as handle:
+                payload = handle.read()
+        except FileNotFoundError:
+            return None
+        vector = array("f")
+        vector.frombytes(payload)
+        if len(vector) != dim:
+            return None
+        return vector.tolist()
+
+    def put(self, key: str, vector: Sequence[float]) -> None:
+        path = self.path_for(key)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        # Write-then-rename so concurrent workers never observe a partial vector.
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as handle:
+                handle.write(array("f", vector).tobytes())
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+
+class CachedEmbedder:
+    def __init__(self, embedder: Embedder, cache: EmbeddingCache) -> None:
+        self.embedder = embedder
+        self.cache = cache
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def name(self) -> str:
+        return self.embedder.name
+
+    @property
+    def dim(self) -> int:
+        return self.embedder.dim
+
+    def embed(self, text: str) -> List[float]:
+        return self.embed_many([text])[0]
+
+    def embed_many(self, texts: Sequence[str]) -> List[List[float]]:
+        keys = [content_key(self.name, text) for text in texts]
+        vectors: List[Optional[List[float]]] = [self.cache.get(key, self.dim) for key in keys]
+        missing = [idx for idx, vector in enumerate(vectors) if vector is None]
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+        if missing:
+            computed = self.embedder.embed_many([texts[idx] for idx in missing])
+            for idx, vector in zip(missing, computed):
+                self.cache.put(keys[idx], vector)
+                vectors[idx] = vector
+        return vectors
+
+
+def attach_embeddings(tree: TreeIndex, embedder: Embedder) -> TreeIndex:
+    pending = [node for node in tree.h2_nodes.values() if not node.embedding]
+    vectors = embedder.embed_many([node.text for node in pending])
+    h2_nodes = dict(tree.h2_nodes)
+    for node, vector in zip(pending, vectors):
+        h2_nodes[node.node_id] = replace(node, embedding=vector)
+    return TreeIndex(h1_nodes=tree.h1_nodes, h2_nodes=h2_nodes, lookup=tree.lookup)
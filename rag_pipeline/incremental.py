@@ -0,0 +1,208 @@
+from __future__ import annotations
+
+import hashlib
+import json
+from dataclasses import asdict, dataclass, field, replace
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Set, Union
+
+from rag_pipeline.indexes import BM25Index, VectorIndex
+from rag_pipeline.schemas import DocumentRoot, H1Node, H2Node, TreeIndex
+
+if TYPE_CHECKING:
+    from rag_pipeline.storage import MongoTreeStore
+
+
+# Ids are positional, so they are left out when pairing old and new sections.
+IDENTITY_FIELDS = ("node_id", "parent", "children")
+
+
+def _fingerprint(node: Union[H1Node, H2Node], exclude: Iterable[str]) -> str:
+    payload = asdict(node)
+    for name in exclude:
+        payload.pop(name, None)
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def node_fingerprint(node: Union[H1Node, H2Node]) -> str:
+    # Embeddings are derived from the text, so they never make a section "changed".
+    return _fingerprint(node, ("embedding",))
+
+
+def content_fingerprint(node: Union[H1Node, H2Node]) -> str:
+    return _fingerprint(node, ("embedding",) + IDENTITY_FIELDS)
+
+
+def tree_fingerprints(tree: TreeIndex) -> Dict[str, str]:
+    fingerprints = {node_id: node_fingerprint(node) for node_id, node in tree.h1_nodes.items()}
+    fingerprints.update(
+        (node_id, node_fingerprint(node)) for node_id, node in tree.h2_nodes.items()
+    )
+    return fingerprints
+
+
+@dataclass
+class TreeChangeset:
+    added_h1: List[H1Node] = field(default_factory=list)
+    changed_h1: List[H1Node] = field(default_factory=list)
+    removed_h1: List[str] = field(default_factory=list)
+    added_h2: List[H2Node] = field(default_factory=list)
+    changed_h2: List[H2Node] = field(default_factory=list)
+    removed_h2: List[str] = field(default_factory=list)
+
+    @property
+    def upserted_h1(self) -> List[H1Node]:
+        return self.added_h1 + self.changed_h1
+
+    @property
+    def upserted_h2(self) -> List[H2Node]:
+        return self.added_h2 + self.changed_h2
+
+    def __len__(self) -> int:
+        return (
+            len(self.upserted_h1)
+            + len(self.removed_h1)
+            + len(self.upserted_h2)
+            + len(self.removed_h2)
+        )
+
+
+def _match_nodes(
+    old_nodes: Iterable[Union[H1Node, H2Node]], new_nodes: Iterable[Union[H1Node, H2Node]]
+) -> Dict[str, str]:
+    # Identical sections pair first, then edited ones by heading; duplicates pair in order.
+    matches: Dict[str, str] = {}
+    unmatched = list(old_nodes)
+    pending = list(new_nodes)
+    for key in (content_fingerprint, lambda node: node.head):
+        candidates: Dict[str, List[Union[H1Node, H2Node]]] = {}
+        for node in unmatched:
+            candidates.setdefault(key(node), []).append(node)
+        remaining = []
+        for node in pending:
+            bucket = candidates.get(key(node))
+            if bucket:
+                matches[node.node_id] = bucket.pop(0).node_id
+            else:
+                remaining.append(node)
+        pending = remaining
+        matched = set(matches.values())
+        unmatched = [node for node in unmatched if node.node_id not in matched]
+    return matches
+
+
+def _fresh_id(node_id: str, taken: Set[str]) -> str:
+    candidate = node_id
+    suffix = 1
+    while candidate in taken:
+        candidate = f"{node_id}_{suffix}"
+        suffix += 1
+    taken.add(candidate)
+    return candidate
+
+
+def align_tree(old: TreeIndex, new: TreeIndex) -> TreeIndex:
+    h1_ids = _match_nodes(old.h1_nodes.values(), new.h1_nodes.values())
+    h2_ids: Dict[str, str] = {}
+    for new_id, old_id in h1_ids.items():
+        old_children = old.h1_nodes[old_id].children
+        new_children = new.h1_nodes[new_id].children
+        h2_ids.update(
+            _match_nodes(
+                (old.h2_nodes[node_id] for node_id in old_children if node_id in old.h2_nodes),
+                (new.h2_nodes[node_id] for node_id in new_children if node_id in new.h2_nodes),
+            )
+        )
+    # Sections without a counterpart keep their parsed id unless a matched section holds it.
+    taken = set(h1_ids.values()) | set(h2_ids.values())
+    for node_id in new.h1_nodes:
+        if node_id not in h1_ids:
+            h1_ids[node_id] = _fresh_id(node_id, taken)
+    for node_id in new.h2_nodes:
+        if node_id not in h2_ids:
+            h2_ids[node_id] = _fresh_id(node_id, taken)
+
+    h1_nodes = {}
+    lookup = {}
+    for node_id, node in new.h1_nodes.items():
+        children = [h2_ids.get(child, child) for child in node.children]
+        h1 = replace(node, node_id=h1_ids[node_id], children=children)
+        h1_nodes[h1.node_id] = h1
+        lookup[h1.node_id] = {"summary": h1.summary, "children": h1.children}
+    h2_nodes = {
+        h2_ids[node_id]: replace(
+            node, node_id=h2_ids[node_id], parent=h1_ids.get(node.parent, node.parent)
+        )
+        for node_id, node in new.h2_nodes.items()
+    }
+    return TreeIndex(h1_nodes=h1_nodes, h2_nodes=h2_nodes, lookup=lookup)
+
+
+def diff_trees(old: TreeIndex, new: TreeIndex) -> TreeChangeset:
+    # Changed and added nodes carry the ids of align_tree(old, new), not new's positional ids.
+    new = align_tree(old, new)
+    changeset = TreeChangeset()
+    for node_id, node in new.h1_nodes.items():
+        previous = old.h1_nodes.get(node_id)
+        if previous is None:
+            changeset.added_h1.append(node)
+        elif node_fingerprint(previous) != node_fingerprint(node):
+            changeset.changed_h1.append(node)
+    changeset.removed_h1 = [node_id for node_id in old.h1_nodes if node_id not in new.h1_nodes]
+    for node_id, node in new.h2_nodes.items():
+        previous = old.h2_nodes.get(node_id)
+        if previous is None:
+            changeset.added_h2.append(node)
+        elif node_fingerprint(previous) != node_fingerprint(node):
+            changeset.changed_h2.append(node)
+    changeset.removed_h2 = [node_id for node_id in old.h2_nodes if node_id not in new.h2_nodes]
+    return changeset
+
+
+def apply_changeset(
+    changeset: TreeChangeset,
+    tree: Optional[TreeIndex] = None,
+    bm25: Optional[BM25Index] = None,
+    vector: Optional[VectorIndex] = None,
+    store: Optional[MongoTreeStore] = None,
+    doc_root: Optional[DocumentRoot] = None,
+) -> None:
+    if tree is not None:
+        for node_id in changeset.removed_h1:
+            tree.h1_nodes.pop(node_id, None)
+            tree.lookup.pop(node_id, None)
+        for node_id in changeset.removed_h2:
+            tree.h2_nodes.pop(node_id, None)
+        for node in changeset.upserted_h1:
+            tree.h1_nodes[node.node_id] = node
+            tree.lookup[node.node_id] = {"summary": node.summary, "children": node.children}
+        for node in changeset.upserted_h2:
+            tree.h2_nodes[node.node_id] = node
+        tree.invalidate_navigation()
+    if bm25 is not None:
+        bm25.remove_many(changeset.removed_h1)
+        bm25.add_many(changeset.upserted_h1)
+    if vector is not None:
+        vector.remove_many(changeset.removed_h2)
+        vector.add_many(changeset.upserted_h2)
+    if store is not None:
+        if doc_root is None:
+            raise ValueError("doc_root is required to apply a changeset to the store")
+        store.apply_changeset(doc_root, changeset)
+
+
+def incremental_update(
+    old: TreeIndex,
+    new: TreeIndex,
+    tree: Optional[TreeIndex] = None,
+    bm25: Optional[BM25Index] = None,
+    vector: Optional[VectorIndex] = None,
+    store: Optional[MongoTreeStore] = None,
+    doc_root: Optional[DocumentRoot] = None,
+) -> TreeChangeset:
+    changeset = diff_trees(old, new)
+    if changeset:
+        apply_changeset(
+            changeset, tree=tree, bm25=bm25, vector=vector, store=store, doc_root=doc_root
+        )
+    return changeset
@@ -1,11 +1,41 @@
 from __future__ import annotations
 
+import heapq
+import json
 import math
+from array import array
+from collections import Counter
 from dataclasses import dataclass, field
-from typing import Dict, List, Tuple
+from typing import Collection, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
 
+from rag_pipeline.analysis import analyze, analyze_query
+from rag_pipeline.ann import IvfIndex, default_nlist
+from rag_pipeline.embeddings import Embedder, HashEmbedder
+from rag_pipeline.quantization import PRECISIONS, QuantizedVectorStore, decode, make_store
 from rag_pipeline.schemas import H1Node, H2Node
-from rag_pipeline.utils import cosine_similarity, hash_embedding, tokenize
+from rag_pipeline.snapshot import (
+    SnapshotError,
+    SnapshotReader,
+    SnapshotWriter,
+    from_little_endian,
+    to_little_endian,
+)
+from rag_pipeline.utils import TOKEN_RE, cosine_similarity
+from rag_pipeline.vector_store import NumpyVectorStore, np
+
+BM25_MAGIC = b"RAGBM25"
+VECTOR_MAGIC = b"RAGVEC"
+
+
+@dataclass(frozen=True)
+class CollectionStats:
+    doc_count: int
+    total_doc_len: int
+    doc_freqs: Mapping[str, int]
+
+    @property
+    def avg_doc_len(self) -> float:
+        return self.total_doc_len / max(self.doc_count, 1)
 
 
 @dataclass
@@ -16,35 +46,296 @@ class BM25Index:
     doc_freqs: Dict[str, int] = field(default_factory=dict)
     doc_lengths: Dict[str, int] = field(default_factory=dict)
     avg_doc_len: float = 0.0
+    postings: Dict[str, Dict[str, int]] = field(default_factory=dict)
+    max_term_freqs: Dict[str, int] = field(default_factory=dict)
+    doc_order: Dict[str, int] = field(default_factory=dict)
+    total_doc_len: int = 0
+    next_ordinal: int = 0
+    generation: int = field(default=0, compare=False)
+    stats: Optional[CollectionStats] = field(default=None, compare=False, repr=False)
 
     def add(self, node: H1Node) -> None:
+        self.add_many([node])
+
+    def add_many(self, nodes: Iterable[H1Node]) -> None:
+        for node in nodes:
+            ordinal = self.doc_order.get(node.node_id)
+            self._discard(node.node_id)
+            self._index(node, ordinal)
+        self._refresh_avg_doc_len()
+
+    def update(self, node: H1Node) -> None:
+        self.add(node)
+
+    def remove(self, node_id: str) -> bool:
+        removed = self._discard(node_id)
+        self._refresh_avg_doc_len()
+        return removed
+
+    def remove_many(self, node_ids: Iterable[str]) -> int:
+        removed = sum(1 for node_id in node_ids if self._discard(node_id))
+        self._refresh_avg_doc_len()
+        return removed
+
+    def _index(self, node: H1Node, ordinal: Optional[int] = None) -> None:
         text = f"{node.head}\n{node.summary}\n{node.pdf_name}"
         self.documents[node.node_id] = text
-        tokens = tokenize(text)
+        if ordinal is None:
+            ordinal = self.next_ordinal
+            self.next_ordinal += 1
+        self.doc_order[node.node_id] = ordinal
+        tokens = analyze(text).tokens
         self.doc_lengths[node.node_id] = len(tokens)
-        for token in set(tokens):
+        self.total_doc_len += len(tokens)
+        for token, count in Counter(tokens).items():
             self.doc_freqs[token] = self.doc_freqs.get(token, 0) + 1
-        self.avg_doc_len = sum(self.doc_lengths.values()) / max(len(self.doc_lengths), 1)
-
-    def search(self, query: str, top_k: int = 5) -> List[Tuple[str, float]]:
-        scores = []
-        query_tokens = tokenize(query)
-        total_docs = len(self.documents)
-        for doc_id, text in self.documents.items():
-            doc_tokens = tokenize(text)
-            doc_len = self.doc_lengths.get(doc_id, 1)
-            token_counts = {token: doc_tokens.count(token) for token in set(doc_tokens)}
-            score = 0.0
-            for token in query_tokens:
-                if token not in token_counts:
+            self.postings.setdefault(token, {})[node.node_id] = count
+            if count > self.max_term_freqs.get(token, 0):
+                self.max_term_freqs[token] = count
+
+    def _discard(self, node_id: str) -> bool:
+        text = self.documents.pop(node_id, None)
+        if text is None:
+            return False
+        self.doc_order.pop(node_id, None)
+        self.total_doc_len -= self.doc_lengths.pop(node_id, 0)
+        for token in set(analyze(text).tokens):
+            remaining = self.doc_freqs.get(token, 0) - 1
+            postings = self.postings.get(token, {})
+            postings.pop(node_id, None)
+            if remaining > 0:
+                self.doc_freqs[token] = remaining
+            else:
+                self.doc_freqs.pop(token, None)
+                self.postings.pop(token, None)
+                self.max_term_freqs.pop(token, None)
+        return True
+
+    def _refresh_avg_doc_len(self) -> None:
+        self.avg_doc_len = self.total_doc_len / max(len(self.doc_lengths), 1)
+        self.generation += 1
+
+    def save(self, path: str) -> None:
+        doc_ids = sorted(self.doc_order, key=self.doc_order.__getitem__)
+        doc_rows = {doc_id: row for row, doc_id in enumerate(doc_ids)}
+        terms = list(self.postings)
+        offsets = array("Q", [0])
+        posting_docs = array("I")
+        posting_tfs = array("I")
+        for term in terms:
+            for doc_id, tf in self.postings[term].items():
+                posting_docs.append(doc_rows[doc_id])
+                posting_tfs.append(tf)
+            offsets.append(len(posting_docs))
+
+        writer = SnapshotWriter(
+            BM25_MAGIC,
+            {
+                "k1": self.k1,
+                "b": self.b,
+                "tokenizer": TOKEN_RE.pattern,
+                "total_doc_len": self.total_doc_len,
+                "next_ordinal": self.next_ordinal,
+            },
+        )
+        writer.add_strings("doc_ids", doc_ids)
+        writer.add_strings("documents", [self.documents[doc_id] for doc_id in doc_ids])
+        writer.add_array("doc_lengths", array("I", (self.doc_lengths[d] for d in doc_ids)))
+        writer.add_array("doc_order", array("Q", (self.doc_order[d] for d in doc_ids)))
+        writer.add_strings("terms", terms)
+        writer.add_array("doc_freqs", array("I", (self.doc_freqs[t] for t in terms)))
+        writer.add_array("max_term_freqs", array("I", (self.max_term_freqs[t] for t in terms)))
+        writer.add_array("posting_offsets", offsets)
+        writer.add_array("posting_docs", posting_docs)
+        writer.add_array("posting_tfs", posting_tfs)
+        writer.write(path)
+
+    @classmethod
+    def load(cls, path: str, verify: bool = True) -> "BM25Index":
+        reader = SnapshotReader(path, BM25_MAGIC, verify=verify)
+        reader.expect("tokenizer", TOKEN_RE.pattern)
+        header = reader.header
+        index = cls(k1=header["k1"], b=header["b"])
+        doc_ids = reader.strings("doc_ids")
+        index.documents = dict(zip(doc_ids, reader.strings("documents")))
+        index.doc_lengths = dict(zip(doc_ids, reader.array("doc_lengths")))
+        index.doc_order = dict(zip(doc_ids, reader.array("doc_order")))
+        terms = reader.strings("terms")
+        index.doc_freqs = dict(zip(terms, reader.array("doc_freqs")))
+        index.max_term_freqs = dict(zip(terms, reader.array("max_term_freqs")))
+        offsets = reader.array("posting_offsets")
+        posting_docs = reader.array("posting_docs")
+        posting_tfs = reader.array("posting_tfs")
+        for position, term in enumerate(terms):
+            start, end = offsets[position], offsets[position + 1]
+            index.postings[term] = {
+                doc_ids[row]: tf for row, tf in zip(posting_docs[start:end], posting_tfs[start:end])
+            }
+        index.total_doc_len = header["total_doc_len"]
+        index.next_ordinal = header["next_ordinal"]
+        index._refresh_avg_doc_len()
+        return index
+
+    def collection_stats(self) -> CollectionStats:
+        return CollectionStats(len(self.documents), self.total_doc_len, self.doc_freqs)
+
+    def idf(self, token: str) -> float:
+        if self.stats is not None:
+            # A shard scores with corpus-wide statistics so its scores match one big index.
+            df = self.stats.doc_freqs.get(token, 0)
+            return math.log(1 + (self.stats.doc_count - df + 0.5) / (df + 0.5))
+        df = self.doc_freqs.get(token, 0)
+        return math.log(1 + (len(self.documents) - df + 0.5) / (df + 0.5))
+
+    def term_score(self, idf: float, tf: int, doc_len: int) -> float:
+        avg_doc_len = self.avg_doc_len if self.stats is None else self.stats.avg_doc_len
+        denom = tf + self.k1 * (1 - self.b + self.b * doc_len / max(avg_doc_len, 1))
+        return idf * (tf * (self.k1 + 1) / denom)
+
+    def term_upper_bound(self, token: str) -> float:
+        # doc_len >= 0, so the length-normalised denominator is at least tf + k1 * (1 - b).
+        tf = self.max_term_freqs.get(token, 0)
+        if not tf:
+            return 0.0
+        return self.idf(token) * (tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b)))
+
+    def score(self, query_tokens: List[str], doc_id: str) -> float:
+        doc_len = self.doc_lengths.get(doc_id, 1)
+        score = 0.0
+        for token in query_tokens:
+            tf = self.postings.get(token, {}).get(doc_id)
+            if tf is None:
+                continue
+            score += self.term_score(self.idf(token), tf, doc_len)
+        return score
+
+    def search(
+        self,
+        query: str,
+        top_k: int = 5,
+        prune: bool = False,
+        allowed: Optional[Collection[str]] = None,
+    ) -> List[Tuple[str, float]]:
+        if top_k <= 0:
+            return []
+        query_tokens = list(analyze_query(query).tokens)
+        if allowed is not None and len(allowed) < self._postings_size(query_tokens):
+            # A narrow filter is cheaper to score directly than to intersect with the postings.
+            scores = {}
+            for doc_id in allowed:
+                if doc_id in self.documents and any(
+                    doc_id in self.postings.get(token, ()) for token in query_tokens
+                ):
+                    scores[doc_id] = self.score(query_tokens, doc_id)
+        elif prune:
+            scores = self._maxscore(query_tokens, top_k, allowed)
+        else:
+            scores = self._exhaustive(query_tokens, allowed)
+        return self._top_k(scores, top_k, allowed)
+
+    def search_many(
+        self,
+        queries: Sequence[str],
+        top_k: int = 5,
+        allowed: Optional[Collection[str]] = None,
+    ) -> List[List[Tuple[str, float]]]:
+        if top_k <= 0:
+            return [[] for _ in queries]
+        tokenized = [analyze_query(query).tokens for query in queries]
+        # Each distinct term's postings are scored once for the whole batch. Scores are then
+        # summed per query in token order, so the floats match search() exactly.
+        contributions: Dict[str, Dict[str, float]] = {}
+        for token in {token for tokens in tokenized for token in tokens}:
+            postings = self.postings.get(token)
+            if not postings:
+                continue
+            idf = self.idf(token)
+            if allowed is not None and len(allowed) < len(postings):
+                matched = ((doc_id, postings[doc_id]) for doc_id in allowed if doc_id in postings)
+            else:
+                matched = (
+                    (doc_id, tf)
+                    for doc_id, tf in postings.items()
+                    if allowed is None or doc_id in allowed
+                )
+            contributions[token] = {
+                doc_id: self.term_score(idf, tf, self.doc_lengths.get(doc_id, 1))
+                for doc_id, tf in matched
+            }
+        results = []
+        for tokens in tokenized:
+            scores: Dict[str, float] = {}
+            for token in tokens:
+                for doc_id, contribution in contributions.get(token, {}).items():
+                    scores[doc_id] = scores.get(doc_id, 0.0) + contribution
+            results.append(self._top_k(scores, top_k, allowed))
+        return results
+
+    def _postings_size(self, query_tokens: List[str]) -> int:
+        return sum(len(self.postings.get(token, ())) for token in set(query_tokens))
+
+    def _exhaustive(
+        self, query_tokens: List[str], allowed: Optional[Collection[str]] = None
+    ) -> Dict[str, float]:
+        scores: Dict[str, float] = {}
+        for token in query_tokens:
+            postings = self.postings.get(token)
+            if not postings:
+                continue
+            idf = self.idf(token)
+            for doc_id, tf in postings.items():
+                if allowed is not None and doc_id not in allowed:
                     continue
-                df = self.doc_freqs.get(token, 0)
-                idf = math.log(1 + (total_docs - df + 0.5) / (df + 0.5))
-                tf = token_counts[token]
-                denom = tf + self.k1 * (1 - self.b + self.b * doc_len / max(self.avg_doc_len, 1))
-                score += idf * (tf * (self.k1 + 1) / denom)
-            scores.append((doc_id, score))
-        return sorted(scores, key=lambda item: item[1], reverse=True)[:top_k]
+                doc_len = self.doc_lengths.get(doc_id, 1)
+                scores[doc_id] = scores.get(doc_id, 0.0) + self.term_score(idf, tf, doc_len)
+        return scores
+
+    def _maxscore(
+        self, query_tokens: List[str], top_k: int, allowed: Optional[Collection[str]] = None
+    ) -> Dict[str, float]:
+        weights = Counter(token for token in query_tokens if token in self.postings)
+        terms = sorted(weights, key=lambda token: weights[token] * self.term_upper_bound(token))
+        cumulative = []
+        running = 0.0
+        for token in terms:
+            running += weights[token] * self.term_upper_bound(token)
+            cumulative.append(running)
+
+        scores: Dict[str, float] = {}
+        heap: List[Tuple[float, int]] = []
+        for position in range(len(terms) - 1, -1, -1):
+            # Documents matching only terms[: position + 1] score at most cumulative[position].
+            if len(heap) >= top_k and cumulative[position] < heap[0][0]:
+                break
+            for doc_id in self.postings[terms[position]]:
+                if doc_id in scores or (allowed is not None and doc_id not in allowed):
+                    continue
+                score = self.score(query_tokens, doc_id)
+                scores[doc_id] = score
+                entry = (score, -self.doc_order[doc_id])
+                if len(heap) < top_k:
+                    heapq.heappush(heap, entry)
+                elif entry > heap[0]:
+                    heapq.heapreplace(heap, entry)
+        return scores
+
+    def _top_k(
+        self, scores: Dict[str, float], top_k: int, allowed: Optional[Collection[str]] = None
+    ) -> List[Tuple[str, float]]:
+        ranked = heapq.nsmallest(
+            top_k, scores.items(), key=lambda item: (-item[1], self.doc_order[item[0]])
+        )
+        if len(ranked) < top_k:
+            # Unmatched documents score zero and keep their insertion order.
+            candidates = self.doc_order if allowed is None else allowed
+            unmatched = (
+                doc_id
+                for doc_id in candidates
+                if doc_id not in scores and doc_id in self.doc_order
+            )
+            filler = heapq.nsmallest(top_k - len(ranked), unmatched, key=self.doc_order.__getitem__)
+            ranked.extend((doc_id, 0.0) for doc_id in filler)
+        return ranked
 
 
 @dataclass
@@ -52,10 +343,58 @@ class VectorIndex:
     embeddings: Dict[str, List[float]] = field(default_factory=dict)
     metadata: Dict[str, H2Node] = field(default_factory=dict)
     dim: int = 256
+    backend: str = "python"
+    store: Optional[NumpyVectorStore] = None
+    embedder: Optional[Embedder] = None
+    node_source: Optional[Mapping[str, H2Node]] = None
+    generation: int = field(default=0, compare=False)
+    ann: Optional[IvfIndex] = field(default=None, compare=False, repr=False)
+    ann_min_scope: int = 2048
+    precision: str = "float32"
+    rescore: bool = False
+
+    def __post_init__(self) -> None:
+        if self.embedder is None:
+            self.embedder = HashEmbedder(dim=self.dim)
+        self.dim = self.embedder.dim
+        if self.backend not in ("python", "numpy"):
+            raise ValueError(f"unknown VectorIndex backend: {self.backend}")
+        if self.precision not in PRECISIONS:
+            raise ValueError(f"unknown VectorIndex precision: {self.precision}")
+        if self.precision != "float32" and self.backend != "numpy":
+            raise ValueError("quantized precision requires the numpy backend")
+        if self.backend == "numpy" and self.store is None:
+            self.store = make_store(self.dim, self.precision, self.rescore)
+            for node_id, embedding in self.embeddings.items():
+                self.store.set(node_id, embedding)
+            self.embeddings = {}
 
     def add(self, node: H2Node) -> None:
-        embedding = node.embedding or hash_embedding(node.text, dim=self.dim)
-        self.embeddings[node.node_id] = embedding
+        self.add_many([node])
+
+    def add_many(self, nodes: Iterable[H2Node]) -> None:
+        nodes = list(nodes)
+        pending = [node for node in nodes if not node.embedding]
+        computed = dict(
+            zip(
+                (node.node_id for node in pending),
+                self.embedder.embed_many([node.text for node in pending]),
+            )
+        )
+        for node in nodes:
+            self._insert(node, node.embedding or computed[node.node_id])
+
+    def _insert(self, node: H2Node, embedding: List[float]) -> None:
+        self.generation += 1
+        if self.store is not None:
+            self.store.set(node.node_id, embedding)
+        else:
+            self.embeddings[node.node_id] = embedding
+        if self.ann is not None:
+            self.ann.add(node.node_id, embedding)
+        if self.node_source is not None:
+            # Text and metadata are resolved from the tree or store when a hit is returned.
+            return
         self.metadata[node.node_id] = H2Node(
             node_id=node.node_id,
             parent=node.parent,
@@ -64,18 +403,282 @@ class VectorIndex:
             text=node.text,
             pages=node.pages,
             pdf_name=node.pdf_name,
-            embedding=embedding,
+            embedding=embedding if self.store is None else None,
         )
 
-    def search(self, query: str, scope: List[str], top_k: int = 5) -> List[Tuple[H2Node, float]]:
-        query_embedding = hash_embedding(query, dim=self.dim)
-        results: List[Tuple[H2Node, float]] = []
+    def remove(self, node_id: str) -> bool:
+        if self.store is not None:
+            removed = self.store.remove(node_id)
+        else:
+            removed = self.embeddings.pop(node_id, None) is not None
+        self.metadata.pop(node_id, None)
+        if self.ann is not None:
+            self.ann.remove(node_id)
+        if removed:
+            self.generation += 1
+        return removed
+
+    def remove_many(self, node_ids: Iterable[str]) -> int:
+        return sum(1 for node_id in node_ids if self.remove(node_id))
+
+    def node_ids(self) -> List[str]:
+        return list(self.store.ids) if self.store is not None else list(self.embeddings)
+
+    def subset(
+        self, node_ids: Iterable[str], node_source: Optional[Mapping[str, H2Node]] = None
+    ) -> VectorIndex:
+        node_ids = list(node_ids)
+        return VectorIndex(
+            embeddings={
+                node_id: self.embeddings[node_id] for node_id in node_ids if node_id in self.embeddings
+            },
+            metadata={
+                node_id: self.metadata[node_id] for node_id in node_ids if node_id in self.metadata
+            },
+            dim=self.dim,
+            backend=self.backend,
+            store=self.store.subset(node_ids) if self.store is not None else None,
+            embedder=self.embedder,
+            node_source=node_source,
+            ann_min_scope=self.ann_min_scope,
+            precision=self.precision,
+            rescore=self.rescore,
+        )
+
+    def build_ann(
+        self,
+        nlist: Optional[int] = None,
+        nprobe: int = 8,
+        iterations: int = 10,
+        seed: int = 0,
+        min_scope: Optional[int] = None,
+    ) -> IvfIndex:
+        node_ids = self.node_ids()
+        if not node_ids:
+            raise ValueError("build_ann needs at least one indexed vector")
+        if self.store is not None:
+            vectors = self.store.vectors()
+        else:
+            vectors = np.asarray([self.embeddings[node_id] for node_id in node_ids], dtype=np.float32)
+        ann = IvfIndex(
+            dim=self.dim,
+            nlist=nlist or default_nlist(len(node_ids)),
+            nprobe=nprobe,
+            iterations=iterations,
+            seed=seed,
+        )
+        ann.train(node_ids, vectors)
+        self.ann = ann
+        if min_scope is not None:
+            self.ann_min_scope = min_scope
+        self.generation += 1
+        return ann
+
+    def drop_ann(self) -> None:
+        if self.ann is not None:
+            self.ann = None
+            self.generation += 1
+
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        embed_queries = getattr(self.embedder, "embed_queries", None)
+        if embed_queries is not None:
+            return embed_queries(queries)
+        return self.embedder.embed_many(queries)
+
+    def node(self, node_id: str) -> H2Node:
+        node = self.metadata.get(node_id)
+        if node is None and self.node_source is not None:
+            node = self.node_source[node_id]
+        if node is None:
+            raise KeyError(node_id)
+        return node
+
+    def save(self, path: str) -> None:
+        sections = []
+        if isinstance(self.store, QuantizedVectorStore):
+            node_ids = list(self.store.ids)
+            codes, scales = self.store.codes()
+            sections.append(("codes", codes, "b" if self.precision == "int8" else "e"))
+            sections.append(("scales", scales, "f"))
+            if self.store.full is not None:
+                vectors = self.store.full.vectors().astype("<f4").tobytes()
+                sections.append(("vectors", vectors, "f"))
+        elif self.store is not None:
+            node_ids = list(self.store.ids)
+            sections.append(("vectors", self.store.vectors().astype("<f4").tobytes(), "f"))
+        else:
+            node_ids = list(self.embeddings)
+            block = array("f")
+            for node_id in node_ids:
+                block.extend(self.embeddings[node_id])
+            sections.append(("vectors", to_little_endian(block), "f"))
+        has_metadata = all(node_id in self.metadata for node_id in node_ids)
+        writer = SnapshotWriter(
+            VECTOR_MAGIC,
+            {
+                "dim": self.dim,
+                "count": len(node_ids),
+                "embedder": self.embedder.name,
+                "normalized": self.store is not None,
+                "metadata": has_metadata,
+                "precision": self.precision,
+            },
+        )
+        for name, payload, typecode in sections:
+            writer.add_bytes(name, payload, typecode=typecode)
+        writer.add_strings("node_ids", node_ids)
+        if has_metadata:
+            metadata = []
+            for node_id in node_ids:
+                node = self.metadata[node_id]
+                metadata.append(
+                    {
+                        "parent": node.parent,
+                        "level": node.level,
+                        "head": node.head,
+                        "text": node.text,
+                        "pages": node.pages,
+                        "pdf_name": node.pdf_name,
+                    }
+                )
+            writer.add_bytes("metadata", json.dumps(metadata).encode("utf-8"))
+        writer.write(path)
+
+    @classmethod
+    def load(
+        cls,
+        path: str,
+        backend: str = "python",
+        embedder: Optional[Embedder] = None,
+        verify: bool = True,
+        mmap: bool = False,
+        node_source: Optional[Mapping[str, H2Node]] = None,
+        precision: Optional[str] = None,
+        rescore: bool = False,
+    ) -> "VectorIndex":
+        if mmap and backend != "numpy":
+            raise ValueError("mmap loading requires the numpy backend")
+        reader = SnapshotReader(path, VECTOR_MAGIC, verify=verify)
+        dim = reader.header["dim"]
+        embedder = embedder or HashEmbedder(dim=dim)
+        reader.expect("embedder", embedder.name)
+        if node_source is None and not reader.header["metadata"]:
+            raise SnapshotError(f"{path}: snapshot has no node metadata, pass node_source")
+        node_ids = reader.strings("node_ids")
+        saved_precision = reader.header.get("precision", "float32")
+        if precision is None:
+            precision = saved_precision if backend == "numpy" else "float32"
+        has_vectors = "vectors" in reader.sections
+        if rescore and not has_vectors:
+            raise SnapshotError(f"{path}: snapshot has no full-precision vectors to re-score with")
+
+        index = cls(
+            dim=dim,
+            backend=backend,
+            embedder=embedder,
+            node_source=node_source,
+            precision=precision,
+            rescore=rescore,
+        )
+        quantized = isinstance(index.store, QuantizedVectorStore)
+        if quantized and precision == saved_precision and not rescore:
+            index.store.load_codes(node_ids, reader.raw("codes"), reader.raw("scales"))
+        else:
+            if has_vectors:
+                normalized = reader.header["normalized"]
+                vectors = reader.raw("vectors")
+            else:
+                # Compact snapshots only hold codes; wider targets get the dequantized rows.
+                normalized = True
+                block = decode(
+                    saved_precision, reader.raw("codes"), reader.raw("scales"), len(node_ids), dim
+                )
+                vectors = memoryview(block.astype("<f4").tobytes())
+            if index.store is not None:
+                index.store.load_block(node_ids, vectors, normalized=normalized, mapped=mmap)
+            else:
+                values = from_little_endian("f", vectors)
+                for row, node_id in enumerate(node_ids):
+                    index.embeddings[node_id] = values[row * dim : (row + 1) * dim].tolist()
+        if node_source is None:
+            metadata = json.loads(bytes(reader.raw("metadata")).decode("utf-8"))
+            for node_id, fields in zip(node_ids, metadata):
+                index.metadata[node_id] = H2Node(
+                    node_id=node_id, embedding=index.embeddings.get(node_id), **fields
+                )
+        return index
+
+    def search(
+        self,
+        query: str,
+        scope: Optional[List[str]],
+        top_k: int = 5,
+        nprobe: Optional[int] = None,
+    ) -> List[Tuple[H2Node, float]]:
+        return self._resolve(self.rank(self.embed_queries([query])[0], scope, top_k, nprobe))
+
+    def search_many(
+        self,
+        queries: Sequence[str],
+        scopes: Sequence[Optional[List[str]]],
+        top_k: int = 5,
+        nprobe: Optional[int] = None,
+    ) -> List[List[Tuple[H2Node, float]]]:
+        embeddings = self.embed_queries(list(queries))
+        scopes = [
+            self.candidates(embedding, scope, nprobe) for embedding, scope in zip(embeddings, scopes)
+        ]
+        hits: List[List[Tuple[str, float]]] = [[] for _ in embeddings]
+        if self.store is not None:
+            groups: Dict[Tuple[str, ...], List[int]] = {}
+            for position, scope in enumerate(scopes):
+                groups.setdefault(tuple(scope), []).append(position)
+            for scope, positions in groups.items():
+                # One matrix-matrix product per distinct scope.
+                ranked = self.store.search_many([embeddings[pos] for pos in positions], scope, top_k)
+                for position, result in zip(positions, ranked):
+                    hits[position] = result
+        else:
+            hits = [
+                self._rank(embedding, scope, top_k) for embedding, scope in zip(embeddings, scopes)
+            ]
+        return [self._resolve(result) for result in hits]
+
+    def rank(
+        self,
+        query_embedding: List[float],
+        scope: Optional[List[str]],
+        top_k: int = 5,
+        nprobe: Optional[int] = None,
+    ) -> List[Tuple[str, float]]:
+        return self._rank(query_embedding, self.candidates(query_embedding, scope, nprobe), top_k)
+
+    def candidates(
+        self, query_embedding: List[float], scope: Optional[List[str]], nprobe: Optional[int] = None
+    ) -> List[str]:
+        # None means the whole index; the IVF only takes over once a scope is wide enough
+        # that probing a few lists is cheaper than scoring every member.
+        if self.ann is not None and (scope is None or len(scope) >= self.ann_min_scope):
+            return self.ann.probe(query_embedding, nprobe, scope)
+        return self.node_ids() if scope is None else scope
+
+    def _rank(
+        self, query_embedding: List[float], scope: Sequence[str], top_k: int
+    ) -> List[Tuple[str, float]]:
+        if self.store is not None:
+            return self.store.search(query_embedding, scope, top_k)
+        results: List[Tuple[str, float]] = []
         for node_id in scope:
             embedding = self.embeddings.get(node_id)
             if embedding is None:
                 continue
             score = cosine_similarity(query_embedding, embedding)
-            results.append((self.metadata[node_id], score))
+            results.append((node_id, score))
         results.sort(key=lambda item: item[1], reverse=True)
         return results[:top_k]
 
+    def _resolve(self, hits: List[Tuple[str, float]]) -> List[Tuple[H2Node, float]]:
+        prefetch = getattr(self.node_source, "prefetch", None)
+        if prefetch is not None:
+            prefetch([node_id for node_id, _ in hits if node_id not in self.metadata])
+        return [(self.node(node_id), score) for node_id, score in hits]
@@ -1,11 +1,13 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Dict, List
+from typing import Any, Dict, List, Optional, Sequence
 
 from rag_pipeline.indexes import BM25Index, VectorIndex
-from rag_pipeline.retrieval import RetrievalAgent, RetrievedChunk
+from rag_pipeline.result_cache import ResultCache
+from rag_pipeline.retrieval import RetrievalAgent, RetrievalResult, RetrievedChunk
 from rag_pipeline.schemas import TreeIndex
+from rag_pipeline.tracing import Tracer, find_registry, span
 
 
 @dataclass(frozen=True)
@@ -16,11 +18,36 @@ class AnswerPayload:
 
 
 class InferencePipeline:
-    def __init__(self, tree: TreeIndex, bm25: BM25Index, vector: VectorIndex) -> None:
-        self.agent = RetrievalAgent(tree=tree, bm25=bm25, vector=vector)
+    def __init__(
+        self,
+        tree: TreeIndex,
+        bm25: BM25Index,
+        vector: VectorIndex,
+        result_cache: Optional[ResultCache] = None,
+        tracer: Optional[Tracer] = None,
+    ) -> None:
+        self.agent = RetrievalAgent(
+            tree=tree, bm25=bm25, vector=vector, result_cache=result_cache, tracer=tracer
+        )
+        self.tracer = tracer
 
     def answer(self, query: str) -> AnswerPayload:
-        result = self.agent.retrieve(query)
+        with span(self.tracer, "answer"):
+            return self.build_answer(self.agent.retrieve(query))
+
+    def answer_many(
+        self, queries: Sequence[str], workers: Optional[int] = None
+    ) -> List[AnswerPayload]:
+        return [
+            self.build_answer(result)
+            for result in self.agent.retrieve_many(queries, workers=workers)
+        ]
+
+    def build_answer(self, result: RetrievalResult) -> AnswerPayload:
+        with span(self.tracer, "format"):
+            return self._format_answer(result)
+
+    def _format_answer(self, result: RetrievalResult) -> AnswerPayload:
         answer_lines = [
             "Retrieved statutory context (no additional interpretation applied):"
         ]
@@ -33,6 +60,14 @@ class InferencePipeline:
         answer = "\n".join(answer_lines).strip()
         return AnswerPayload(answer=answer, citations=result.citations, chunks=result.chunks)
 
-    def debug_state(self) -> Dict[str, str]:
-        return {"policy": "BM25 routing -> scoped vector search -> citation-safe answer"}
+    def debug_state(self) -> Dict[str, Any]:
+        state: Dict[str, Any] = {
+            "policy": "BM25 routing -> scoped vector search -> citation-safe answer"
+        }
+        if self.agent.result_cache is not None:
+            state["result_cache"] = self.agent.result_cache.stats()
+        registry = find_registry(self.tracer)
+        if registry is not None:
+            state["metrics"] = registry.to_json()
+        return state
 
@@ -1,10 +1,12 @@
 from __future__ import annotations
 
 import re
-from dataclasses import dataclass
-from typing import List, Tuple
+from dataclasses import dataclass, replace
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence, Set, Tuple, Union
 
-from rag_pipeline.schemas import DocumentRoot, H1Node, H2Node, TreeIndex
+from rag_pipeline.llm import FallbackSummary, LlmSummarizer
+from rag_pipeline.schemas import H1Node, H2Node, TreeIndex
+from rag_pipeline.summary_cache import EXTRACTIVE_TEMPLATE, SummaryCache
 from rag_pipeline.utils import dedupe_preserve_order, summarize_text
 
 
@@ -17,84 +19,234 @@ class IngestionConfig:
     pdf_name: str
     h1_prefix: str = "h1"
     h2_prefix: str = "h2"
+    summarize_fn: Optional[Callable[[str], str]] = None
+    summarize_many_fn: Optional[Callable[[Sequence[str]], List[str]]] = None
+    summary_batch_size: int = 32
+    summary_cache: Optional[SummaryCache] = None
 
+    def __post_init__(self) -> None:
+        if self.summary_cache is not None:
+            _check_summary_cache(self)
 
-def _extract_pages(text: str) -> List[int]:
-    pages = [int(match.group(1)) for match in PAGE_MARKER_RE.finditer(text)]
-    return sorted(set(pages))
 
+def _check_summary_cache(config: IngestionConfig) -> None:
+    # The cache key names the summarizer, so it must be the one that fills the cache.
+    cache = config.summary_cache
+    cached = (cache.template, cache.model)
+    summarize = config.summarize_many_fn or config.summarize_fn
+    owner = getattr(summarize, "__self__", None)
+    if summarize is None or summarize is summarize_text:
+        expected = (EXTRACTIVE_TEMPLATE, "")
+    elif isinstance(owner, LlmSummarizer):
+        expected = (owner.config.summary_template, owner.config.model or "")
+    elif cached == (EXTRACTIVE_TEMPLATE, ""):
+        raise ValueError(
+            "summary_cache is keyed for extractive summaries; pass the custom summarizer's "
+            "template or model to SummaryCache"
+        )
+    else:
+        return
+    if cached != expected:
+        raise ValueError(
+            f"summary_cache is keyed for template={cache.template!r}, model={cache.model!r}, "
+            f"but the summarizer uses template={expected[0]!r}, model={expected[1]!r}; "
+            "build it with SummaryCache.for_summarizer"
+        )
 
-def _split_by_heading(lines: List[str], heading_marker: str) -> List[Tuple[str, List[str]]]:
-    sections: List[Tuple[str, List[str]]] = []
-    current_head = ""
-    current_lines: List[str] = []
-    for line in lines:
-        if line.startswith(heading_marker + " "):
-            if current_head or current_lines:
-                sections.append((current_head, current_lines))
-            current_head = line[len(heading_marker) + 1 :].strip()
-            current_lines = []
-        else:
-            current_lines.append(line)
-    sections.append((current_head, current_lines))
-    return sections
 
+def summarize_sections(texts: Sequence[str], config: IngestionConfig) -> List[str]:
+    cache = config.summary_cache
+    if cache is None:
+        return [str(summary) for summary in _summarize_uncached(texts, config)]
+    summaries = cache.get_many(texts)
+    missing = [idx for idx, summary in enumerate(summaries) if summary is None]
+    if missing:
+        computed = _summarize_uncached([texts[idx] for idx in missing], config)
+        # Fallbacks from a failed LLM call are not stored under the LLM's template and model.
+        answered = [
+            (texts[idx], summary)
+            for idx, summary in zip(missing, computed)
+            if not isinstance(summary, FallbackSummary)
+        ]
+        if answered:
+            cache.put_many([text for text, _ in answered], [summary for _, summary in answered])
+        for idx, summary in zip(missing, computed):
+            summaries[idx] = str(summary)
+    return summaries
 
-def parse_markdown_to_tree(markdown_text: str, config: IngestionConfig) -> TreeIndex:
-    lines = [line.rstrip() for line in markdown_text.splitlines()]
-    doc_root = DocumentRoot(pdf_name=config.pdf_name, doc_id=config.doc_id)
 
-    h1_sections = _split_by_heading(lines, "#")
-    h1_nodes = {}
-    h2_nodes = {}
-    lookup = {}
+def _summarize_uncached(texts: Sequence[str], config: IngestionConfig) -> List[str]:
+    if not texts:
+        return []
+    if config.summarize_many_fn is not None:
+        return list(config.summarize_many_fn(texts))
+    summarize_fn = config.summarize_fn or summarize_text
+    return [summarize_fn(text) for text in texts]
+
+
+class _PageTracker:
+    def __init__(self, carried_page: Optional[int]) -> None:
+        self.carried_page = carried_page
+        self.pages: Set[int] = set()
+        self.text_before_marker = False
+
+    def feed(self, line: str) -> None:
+        markers = [int(match.group(1)) for match in PAGE_MARKER_RE.finditer(line)]
+        if not markers:
+            if line.strip() and not self.pages:
+                self.text_before_marker = True
+            return
+        if not self.pages and PAGE_MARKER_RE.split(line)[0].strip():
+            self.text_before_marker = True
+        self.pages.update(markers)
+
+    def result(self) -> List[int]:
+        pages = set(self.pages)
+        # Text ahead of the first marker (or a section without markers) sits on the page
+        # the previous marker opened.
+        if self.carried_page is not None and (self.text_before_marker or not pages):
+            pages.add(self.carried_page)
+        return sorted(pages)
 
+
+def iter_markdown_nodes(
+    lines: Iterable[str], config: IngestionConfig
+) -> Iterator[Union[H1Node, H2Node]]:
+    current_page: Optional[int] = None
     h1_counter = 0
-    for h1_head, h1_lines in h1_sections:
-        if not h1_head:
-            continue
-        h1_counter += 1
-        h1_id = f"{config.h1_prefix}_{h1_counter:02d}"
+    h1_head: Optional[str] = None
+    h1_lines: List[str] = []
+    h1_pages = _PageTracker(None)
+    h2_ids: List[str] = []
+    h2_head: Optional[str] = None
+    h2_lines: List[str] = []
+    h2_pages = _PageTracker(None)
+    # H1 nodes wait here for their summaries, so cache lookups and summarize_many_fn run per batch.
+    pending: List[Tuple[str, H1Node]] = []
+    batched = config.summarize_many_fn is not None or config.summary_cache is not None
+    batch_size = max(config.summary_batch_size, 1) if batched else 1
+
+    def close_h2() -> Optional[H2Node]:
+        if h2_head is None:
+            return None
+        h2_id = f"{config.h2_prefix}_{h1_counter:02d}_{len(h2_ids) + 1:02d}"
+        h2_ids.append(h2_id)
+        return H2Node(
+            node_id=h2_id,
+            parent=f"{config.h1_prefix}_{h1_counter:02d}",
+            level="H2",
+            head=h2_head,
+            text="\n".join(h2_lines).strip(),
+            pages=h2_pages.result(),
+            pdf_name=config.pdf_name,
+        )
 
-        h2_sections = _split_by_heading(h1_lines, "##")
-        h2_ids = []
-        h2_counter = 0
+    def close_h1() -> Iterator[Union[H1Node, H2Node]]:
+        h2_node = close_h2()
+        if h2_node is not None:
+            yield h2_node
+        h1_id = f"{config.h1_prefix}_{h1_counter:02d}"
         h1_text = "\n".join(h1_lines).strip()
-        h1_pages = _extract_pages(h1_text)
-
-        for h2_head, h2_lines in h2_sections:
-            if not h2_head:
-                continue
-            h2_counter += 1
-            h2_id = f"{config.h2_prefix}_{h1_counter:02d}_{h2_counter:02d}"
-            h2_text = "\n".join(h2_lines).strip()
-            h2_pages = _extract_pages(h2_text) or h1_pages
-            h2_nodes[h2_id] = H2Node(
+        pages = h1_pages.result()
+        if not h2_ids:
+            # An H1 without H2 headings becomes a single H2 chunk so its text stays retrievable.
+            h2_id = f"{config.h2_prefix}_{h1_counter:02d}_01"
+            h2_ids.append(h2_id)
+            yield H2Node(
                 node_id=h2_id,
                 parent=h1_id,
                 level="H2",
-                head=h2_head,
-                text=h2_text,
-                pages=h2_pages,
-                pdf_name=doc_root.pdf_name,
+                head=h1_head,
+                text=h1_text,
+                pages=pages,
+                pdf_name=config.pdf_name,
+            )
+        pending.append(
+            (
+                h1_text,
+                H1Node(
+                    node_id=h1_id,
+                    level="H1",
+                    head=h1_head,
+                    summary="",
+                    pages=pages,
+                    pdf_name=config.pdf_name,
+                    children=list(h2_ids),
+                ),
             )
-            h2_ids.append(h2_id)
-
-        h1_summary = summarize_text(h1_text)
-        h1_nodes[h1_id] = H1Node(
-            node_id=h1_id,
-            level="H1",
-            head=h1_head,
-            summary=h1_summary,
-            pages=h1_pages,
-            pdf_name=doc_root.pdf_name,
-            children=h2_ids,
         )
-        lookup[h1_id] = {"summary": h1_summary, "children": h2_ids}
+        if len(pending) >= batch_size:
+            yield from flush_h1()
+
+    def flush_h1() -> Iterator[H1Node]:
+        summaries = summarize_sections([text for text, _ in pending], config)
+        for (_, node), summary in zip(pending, summaries):
+            yield replace(node, summary=summary)
+        pending.clear()
+
+    for raw_line in lines:
+        line = raw_line.rstrip()
+        if line.startswith("# "):
+            if h1_head is not None:
+                yield from close_h1()
+            h1_counter += 1
+            h1_head = line[2:].strip()
+            h1_lines = []
+            h1_pages = _PageTracker(current_page)
+            h2_ids = []
+            h2_head = None
+            h2_lines = []
+            continue
+        if h1_head is None:
+            current_page = _last_page(line, current_page)
+            continue
+        h1_lines.append(line)
+        h1_pages.feed(line)
+        if line.startswith("## "):
+            h2_node = close_h2()
+            if h2_node is not None:
+                yield h2_node
+            h2_head = line[3:].strip()
+            h2_lines = []
+            h2_pages = _PageTracker(current_page)
+        elif h2_head is not None:
+            h2_lines.append(line)
+            h2_pages.feed(line)
+        current_page = _last_page(line, current_page)
+
+    if h1_head is not None:
+        yield from close_h1()
+    if pending:
+        yield from flush_h1()
+
+
+def _last_page(line: str, current_page: Optional[int]) -> Optional[int]:
+    markers = PAGE_MARKER_RE.findall(line)
+    return int(markers[-1]) if markers else current_page
+
 
+def parse_markdown_stream(source: Iterable[str], config: IngestionConfig) -> TreeIndex:
+    h1_nodes = {}
+    h2_nodes = {}
+    lookup = {}
+    for node in iter_markdown_nodes(source, config):
+        if isinstance(node, H2Node):
+            h2_nodes[node.node_id] = node
+            continue
+        h1_nodes[node.node_id] = node
+        lookup[node.node_id] = {"summary": node.summary, "children": node.children}
     return TreeIndex(h1_nodes=h1_nodes, h2_nodes=h2_nodes, lookup=lookup)
 
 
+def parse_markdown_file(path: str, config: IngestionConfig) -> TreeIndex:
+    with open(path, "r", encoding="utf-8") as handle:
+        return parse_markdown_stream(handle, config)
+
+
+def parse_markdown_to_tree(markdown_text: str, config: IngestionConfig) -> TreeIndex:
+    return parse_markdown_stream(markdown_text.splitlines(), config)
+
+
 def combine_pages(h1_nodes: List[H1Node], h2_nodes: List[H2Node]) -> List[int]:
     pages = []
     for node in h1_nodes:
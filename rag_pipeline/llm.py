@@ -1,8 +1,12 @@
 from __future__ import annotations
 
 import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import Optional
+from typing import Any, Dict, List, Optional, Sequence
 
 from rag_pipeline.utils import summarize_text
 
@@ -16,44 +20,129 @@ class LlmConfig:
     summary_template: str = (
         "Summarize the following legal section in 1-2 sentences without adding new facts:\n\n{text}"
     )
+    max_concurrency: int = 8
+    max_retries: int = 3
+    backoff_s: float = 0.5
+    max_backoff_s: float = 30.0
+
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class FallbackSummary(str):
+    # The extractive summary returned when the LLM did not answer. Caches skip it, so the
+    # section is sent to the LLM again on the next ingestion.
+    pass
 
 
 class LlmSummarizer:
     def __init__(self, config: LlmConfig) -> None:
         self.config = config
+        self._session = None
+        self._session_lock = threading.Lock()
 
-    def summarize(self, text: str) -> str:
+    def __getstate__(self) -> Dict[str, Any]:
+        # Sessions and locks stay per process; a pickled summarizer reconnects lazily.
+        return {"config": self.config}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__init__(state["config"])
+
+    def session(self) -> Any:
+        if self._session is not None:
+            return self._session
         try:
             import requests
+            from requests.adapters import HTTPAdapter
         except ModuleNotFoundError:
-            return summarize_text(text)
-        prompt = self.config.summary_template.format(text=text)
-        headers = {"Content-Type": "application/json"}
-        if self.config.api_key:
-            headers["Authorization"] = f"Bearer {self.config.api_key}"
-        payload = {"prompt": prompt}
+            return None
+        with self._session_lock:
+            if self._session is None:
+                session = requests.Session()
+                pool_size = max(self.config.max_concurrency, 1)
+                adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                session.headers["Content-Type"] = "application/json"
+                if self.config.api_key:
+                    session.headers["Authorization"] = f"Bearer {self.config.api_key}"
+                self._session = session
+        return self._session
+
+    def close(self) -> None:
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+    def summarize(self, text: str) -> str:
+        session = self.session()
+        if session is None:
+            return FallbackSummary(summarize_text(text))
+        try:
+            summary = self._request_summary(session, text)
+        except Exception:
+            return FallbackSummary(summarize_text(text))
+        return summary if summary is not None else FallbackSummary(summarize_text(text))
+
+    def summarize_many(self, texts: Sequence[str]) -> List[str]:
+        workers = min(max(self.config.max_concurrency, 1), len(texts))
+        if workers <= 1:
+            return [self.summarize(text) for text in texts]
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(self.summarize, texts))
+
+    def _request_summary(self, session: Any, text: str) -> Optional[str]:
+        import requests
+
+        payload = {"prompt": self.config.summary_template.format(text=text)}
         if self.config.model:
             payload["model"] = self.config.model
-        response = requests.post(
-            self.config.api_url, json=payload, headers=headers, timeout=self.config.timeout_s
-        )
-        response.raise_for_status()
-        data = response.json()
-        if isinstance(data, dict):
-            for key in ("summary", "text", "output"):
-                if key in data and isinstance(data[key], str):
-                    return data[key].strip()
-            if "choices" in data and data["choices"]:
-                choice = data["choices"][0]
-                if isinstance(choice, dict):
-                    for key in ("text", "message"):
-                        if key in choice and isinstance(choice[key], str):
-                            return choice[key].strip()
-                    if "message" in choice and isinstance(choice["message"], dict):
-                        content = choice["message"].get("content")
-                        if isinstance(content, str):
-                            return content.strip()
-        return summarize_text(text)
+        attempt = 0
+        while True:
+            try:
+                response = session.post(
+                    self.config.api_url, json=payload, timeout=self.config.timeout_s
+                )
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.config.max_retries:
+                    raise
+                time.sleep(self._backoff(attempt, None))
+                attempt += 1
+                continue
+            if response.status_code in RETRYABLE_STATUS and attempt < self.config.max_retries:
+                time.sleep(self._backoff(attempt, response.headers.get("Retry-After")))
+                attempt += 1
+                continue
+            response.raise_for_status()
+            return _extract_summary(response.json())
+
+    def _backoff(self, attempt: int, retry_after: Optional[str]) -> float:
+        delay = self.config.backoff_s * (2**attempt)
+        if retry_after:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                pass
+        delay = min(delay, self.config.max_backoff_s)
+        return delay * (0.5 + random.random() / 2)
+
+
+def _extract_summary(data: Any) -> Optional[str]:
+    if isinstance(data, dict):
+        for key in ("summary", "text", "output"):
+            if key in data and isinstance(data[key], str):
+                return data[key].strip()
+        if "choices" in data and data["choices"]:
+            choice = data["choices"][0]
+            if isinstance(choice, dict):
+                for key in ("text", "message"):
+                    if key in choice and isinstance(choice[key], str):
+                        return choice[key].strip()
+                if "message" in choice and isinstance(choice["message"], dict):
+                    content = choice["message"].get("content")
+                    if isinstance(content, str):
+                        return content.strip()
+    return None
 
 
 def load_summarizer_from_env() -> Optional[LlmSummarizer]:
@@ -73,11 +162,15 @@ def load_summarizer_from_env() -> Optional[LlmSummarizer]:
         "Summarize the following legal section in 1-2 sentences without adding new facts:\n\n{text}",
     )
     timeout_s = int(os.getenv("LLM_TIMEOUT_S", "30"))
+    max_concurrency = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+    max_retries = int(os.getenv("LLM_MAX_RETRIES", "3"))
     config = LlmConfig(
         api_url=api_url,
         api_key=api_key,
         model=model,
         timeout_s=timeout_s,
         summary_template=template,
+        max_concurrency=max_concurrency,
+        max_retries=max_retries,
     )
     return LlmSummarizer(config)
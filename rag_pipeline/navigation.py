@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Dict, List, Tuple
+
+from rag_pipeline.utils import dedupe_preserve_order
+
+if TYPE_CHECKING:
+    from rag_pipeline.schemas import TreeIndex
+
+
+class TreeNavigation:
+    def __init__(self, tree: TreeIndex) -> None:
+        self.children: Dict[str, List[str]] = {}
+        self.parents: Dict[str, List[str]] = {}
+        self.positions: Dict[Tuple[str, str], int] = {}
+        self.pages: Dict[int, List[str]] = {}
+        for h1_id, h1_node in tree.h1_nodes.items():
+            self.children[h1_id] = list(h1_node.children)
+            for position, h2_id in enumerate(h1_node.children):
+                parents = self.parents.setdefault(h2_id, [])
+                if h1_id not in parents:
+                    parents.append(h1_id)
+                    self.positions[(h1_id, h2_id)] = position
+            for page in h1_node.pages:
+                self.pages.setdefault(page, []).append(h1_id)
+        # Lazily loaded trees expose text-free skeletons; pages are all that is needed here.
+        h2_nodes = getattr(tree.h2_nodes, "skeletons", tree.h2_nodes)
+        for h2_id, h2_node in h2_nodes.items():
+            for page in h2_node.pages:
+                self.pages.setdefault(page, []).append(h2_id)
+
+    def parent(self, h2_id: str) -> str:
+        return self.parents[h2_id][0]
+
+    def siblings(self, h2_id: str, window: int = 1) -> List[str]:
+        h2_ids: List[str] = []
+        for h1_id in self.parents.get(h2_id, ()):
+            children = self.children[h1_id]
+            idx = self.positions[(h1_id, h2_id)]
+            h2_ids.extend(children[max(0, idx - window) : idx + window + 1])
+        return dedupe_preserve_order(h2_ids)
+
+    def nodes_on_page(self, page: int) -> List[str]:
+        return list(self.pages.get(page, ()))
@@ -0,0 +1,165 @@
+from __future__ import annotations
+
+import sys
+from array import array
+from typing import Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+from rag_pipeline.schemas import H2Node
+
+
+class H2View:
+    __slots__ = ("table", "row")
+
+    def __init__(self, table: NodeTable, row: int) -> None:
+        self.table = table
+        self.row = row
+
+    @property
+    def node_id(self) -> str:
+        return self.table.ids[self.row]
+
+    @property
+    def parent(self) -> str:
+        return self.table.parents[self.row]
+
+    @property
+    def level(self) -> str:
+        return self.table.levels[self.table.level_index[self.row]]
+
+    @property
+    def head(self) -> str:
+        return self.table.heads[self.row]
+
+    @property
+    def text(self) -> str:
+        return self.table.texts[self.row]
+
+    @property
+    def pages(self) -> List[int]:
+        start, end = self.table.page_offsets[self.row], self.table.page_offsets[self.row + 1]
+        return self.table.pages[start:end].tolist()
+
+    @property
+    def pdf_name(self) -> str:
+        return self.table.pdf_names[self.table.pdf_index[self.row]]
+
+    @property
+    def embedding(self) -> Optional[List[float]]:
+        if not self.table.has_embedding[self.row]:
+            return None
+        dim = self.table.dim
+        return self.table.embeddings[self.row * dim : (self.row + 1) * dim].tolist()
+
+    def to_node(self) -> H2Node:
+        return H2Node(
+            node_id=self.node_id,
+            parent=self.parent,
+            level=self.level,
+            head=self.head,
+            text=self.text,
+            pages=self.pages,
+            pdf_name=self.pdf_name,
+            embedding=self.embedding,
+        )
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, H2View):
+            other = other.to_node()
+        if not isinstance(other, H2Node):
+            return NotImplemented
+        return self.to_node() == other
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def __repr__(self) -> str:
+        return f"H2View({self.node_id!r})"
+
+
+class NodeTable(Mapping[str, H2View]):
+    def __init__(self, dim: Optional[int] = None) -> None:
+        self.ids: List[str] = []
+        self.rows: Dict[str, int] = {}
+        self.parents: List[str] = []
+        self.heads: List[str] = []
+        self.texts: List[str] = []
+        self.levels: List[str] = []
+        self.level_index = array("B")
+        self.pdf_names: List[str] = []
+        self.pdf_index = array("H")
+        self.pdf_rows: Dict[str, int] = {}
+        self.page_offsets = array("I", [0])
+        self.pages = array("H")
+        self.dim = dim
+        self.embeddings = array("f")
+        self.has_embedding = array("B")
+
+    @classmethod
+    def from_nodes(cls, nodes: Iterable[H2Node], dim: Optional[int] = None) -> NodeTable:
+        table = cls(dim=dim)
+        for node in nodes:
+            table.append(node)
+        return table
+
+    def append(self, node: H2Node) -> None:
+        # Every column is converted before any is written, so a rejected node leaves no partial row.
+        if node.node_id in self.rows:
+            raise ValueError(f"duplicate node id: {node.node_id}")
+        dim = self.dim
+        embedding = None
+        if node.embedding is not None:
+            if dim is None:
+                dim = len(node.embedding)
+            elif len(node.embedding) != dim:
+                raise ValueError(f"expected embedding of dim {dim}, got {len(node.embedding)}")
+            embedding = array("f", node.embedding)
+        level_row = self.levels.index(node.level) if node.level in self.levels else len(self.levels)
+        level_index, level_rows = _fit(self.level_index, [level_row])
+        pdf_row = self.pdf_rows.get(node.pdf_name, len(self.pdf_names))
+        pdf_index, pdf_rows = _fit(self.pdf_index, [pdf_row])
+        pages, node_pages = _fit(self.pages, node.pages)
+
+        self.rows[node.node_id] = len(self.ids)
+        self.ids.append(node.node_id)
+        self.parents.append(sys.intern(node.parent))
+        self.heads.append(node.head)
+        self.texts.append(node.text)
+        if level_row == len(self.levels):
+            self.levels.append(sys.intern(node.level))
+        self.level_index = level_index
+        self.level_index.extend(level_rows)
+        if pdf_row == len(self.pdf_names):
+            self.pdf_rows[node.pdf_name] = pdf_row
+            self.pdf_names.append(sys.intern(node.pdf_name))
+        self.pdf_index = pdf_index
+        self.pdf_index.extend(pdf_rows)
+        self.pages = pages
+        self.pages.extend(node_pages)
+        self.page_offsets.append(len(self.pages))
+        self.has_embedding.append(embedding is not None)
+        self.dim = dim
+        if dim is not None:
+            # Rows stay aligned by padding earlier embedding-less rows once the dim is known.
+            missing = (len(self.ids) - 1) * dim - len(self.embeddings)
+            if missing > 0:
+                self.embeddings.extend([0.0] * missing)
+            self.embeddings.extend(embedding if embedding is not None else [0.0] * dim)
+
+    def __getitem__(self, node_id: str) -> H2View:
+        return H2View(self, self.rows[node_id])
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.ids)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, node_id: object) -> bool:
+        return node_id in self.rows
+
+
+def _fit(column: array, values: Iterable[int]) -> Tuple[array, array]:
+    # Values beyond a narrow column's range widen it instead of failing the load.
+    try:
+        return column, array(column.typecode, values)
+    except OverflowError:
+        return array("I", column), array("I", values)
@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+from typing import Optional, Sequence, Tuple
+
+from rag_pipeline.vector_store import NumpyVectorStore, normalize, np
+
+PRECISIONS = ("float32", "float16", "int8")
+CODE_TYPES = {"float16": "<f2", "int8": "i1"}
+INT8_LEVELS = 127
+CHUNK_ROWS = 16384
+
+
+def encode(precision: str, block: "np.ndarray") -> Tuple["np.ndarray", "np.ndarray"]:
+    if precision == "float16":
+        return block.astype(np.float16), np.ones(len(block), dtype=np.float32)
+    # Symmetric per-row scale: each row spends all 255 levels on its own range.
+    peaks = np.abs(block).max(axis=1) if block.size else np.zeros(len(block), dtype=np.float32)
+    scales = (np.where(peaks == 0.0, 1.0, peaks) / INT8_LEVELS).astype(np.float32)
+    codes = np.clip(np.rint(block / scales[:, None]), -INT8_LEVELS, INT8_LEVELS)
+    return codes.astype(np.int8), scales
+
+
+def decode(
+    precision: str, codes: memoryview, scales: memoryview, count: int, dim: int
+) -> "np.ndarray":
+    block = np.frombuffer(codes, dtype=CODE_TYPES[precision]).reshape(count, dim)
+    return block.astype(np.float32) * np.frombuffer(scales, dtype="<f4")[:, None]
+
+
+class QuantizedVectorStore(NumpyVectorStore):
+    def __init__(
+        self, dim: int, precision: str = "int8", capacity: int = 1024, rescore: bool = False
+    ) -> None:
+        if precision not in CODE_TYPES:
+            raise ValueError(f"unknown quantized precision: {precision}")
+        super().__init__(dim, capacity=1)
+        self.precision = precision
+        self.matrix = np.zeros((max(capacity, 1), dim), dtype=CODE_TYPES[precision])
+        self.scales = np.ones(max(capacity, 1), dtype=np.float32)
+        self.max_scale = 0.0
+        # Full-precision rows for re-scoring; after a mmap load they stay in the page cache.
+        self.full = NumpyVectorStore(dim, capacity) if rescore else None
+
+    def set(self, node_id: str, embedding: Sequence[float]) -> None:
+        if len(embedding) != self.dim:
+            raise ValueError(f"expected embedding of dim {self.dim}, got {len(embedding)}")
+        codes, scales = encode(self.precision, normalize(embedding)[None, :])
+        row = self._allocate(node_id)
+        self.matrix[row] = codes[0]
+        self.scales[row] = scales[0]
+        self.max_scale = max(self.max_scale, float(scales[0]))
+        if self.full is not None:
+            self.full.set(node_id, embedding)
+
+    def _grow(self, capacity: int) -> None:
+        super()._grow(capacity)
+        scales = np.ones(capacity, dtype=np.float32)
+        scales[: len(self.ids)] = self.scales[: len(self.ids)]
+        self.scales = scales
+
+    def load_block(
+        self,
+        node_ids: Sequence[str],
+        vectors: memoryview,
+        normalized: bool = False,
+        mapped: bool = False,
+    ) -> None:
+        block = np.frombuffer(vectors, dtype="<f4").reshape(len(node_ids), self.dim)
+        if not normalized:
+            norms = np.linalg.norm(block, axis=1, keepdims=True)
+            block = block / np.where(norms == 0.0, 1.0, norms)
+        self._load_codes(node_ids, *encode(self.precision, block))
+        if self.full is not None:
+            self.full.load_block(node_ids, vectors, normalized=normalized, mapped=mapped)
+
+    def load_codes(self, node_ids: Sequence[str], codes: memoryview, scales: memoryview) -> None:
+        block = np.frombuffer(codes, dtype=CODE_TYPES[self.precision])
+        self._load_codes(
+            node_ids,
+            block.reshape(len(node_ids), self.dim),
+            np.frombuffer(scales, dtype="<f4"),
+        )
+
+    def _load_codes(
+        self, node_ids: Sequence[str], codes: "np.ndarray", scales: "np.ndarray"
+    ) -> None:
+        self.ids = list(node_ids)
+        self.rows = {node_id: row for row, node_id in enumerate(self.ids)}
+        self.matrix = np.zeros((max(len(node_ids), 1), self.dim), dtype=CODE_TYPES[self.precision])
+        self.matrix[: len(node_ids)] = codes
+        self.scales = np.ones(max(len(node_ids), 1), dtype=np.float32)
+        self.scales[: len(node_ids)] = scales
+        self.max_scale = float(scales.max()) if len(node_ids) else 0.0
+
+    def subset(self, node_ids: Sequence[str]) -> QuantizedVectorStore:
+        kept = [node_id for node_id in node_ids if node_id in self.rows]
+        rows = np.array([self.rows[node_id] for node_id in kept], dtype=np.intp)
+        store = QuantizedVectorStore(self.dim, self.precision)
+        store._load_codes(kept, self.matrix[rows], self.scales[rows])
+        # The shortlist bound stays that of the full store, which is never narrower.
+        store.max_scale = self.max_scale
+        if self.full is not None:
+            store.full = self.full.subset(kept)
+        return store
+
+    def remove(self, node_id: str) -> bool:
+        row = self.rows.get(node_id)
+        if row is None:
+            return False
+        self.scales[row] = self.scales[len(self.ids) - 1]
+        super().remove(node_id)
+        if self.full is not None:
+            self.full.remove(node_id)
+        return True
+
+    def dequantize(self, rows: "np.ndarray") -> "np.ndarray":
+        return self.matrix[rows].astype(np.float32) * self.scales[rows, None]
+
+    def vectors(self) -> "np.ndarray":
+        return self.dequantize(np.arange(len(self.ids)))
+
+    def codes(self) -> Tuple[bytes, bytes]:
+        count = len(self.ids)
+        return (
+            self.matrix[:count].astype(CODE_TYPES[self.precision]).tobytes(),
+            self.scales[:count].astype("<f4").tobytes(),
+        )
+
+    def memory_bytes(self) -> int:
+        full = self.full.memory_bytes() if self.full is not None else 0
+        return self.matrix.nbytes + self.scales.nbytes + full
+
+    def approx_scores(self, rows: "np.ndarray", queries: "np.ndarray") -> "np.ndarray":
+        # Codes are widened a chunk at a time; numpy has no int8 or float16 BLAS kernels.
+        if rows.size * 4 >= len(self.ids):
+            count = len(self.ids)
+            approx = np.empty((count, queries.shape[0]), dtype=np.float32)
+            for start in range(0, count, CHUNK_ROWS):
+                block = self.matrix[start : min(start + CHUNK_ROWS, count)]
+                approx[start : start + len(block)] = block.astype(np.float32) @ queries.T
+            approx = approx[rows]
+        else:
+            approx = np.empty((rows.size, queries.shape[0]), dtype=np.float32)
+            for start in range(0, rows.size, CHUNK_ROWS):
+                chunk = rows[start : start + CHUNK_ROWS]
+                approx[start : start + chunk.size] = self.matrix[chunk].astype(np.float32) @ queries.T
+        approx *= self.scales[rows, None]
+        return approx
+
+    def exact_scores(self, rows: "np.ndarray", query: "np.ndarray") -> "np.ndarray":
+        if self.full is not None:
+            full_rows = np.fromiter(
+                (self.full.rows[self.ids[row]] for row in rows.tolist()),
+                dtype=np.intp,
+                count=rows.size,
+            )
+            return self.full.exact_scores(full_rows, query)
+        block = self.matrix[rows].astype(np.float64) * self.scales[rows, None].astype(np.float64)
+        return np.add.reduce(block * query.astype(np.float64), axis=1)
+
+    def error_bound(self, query: Optional["np.ndarray"] = None) -> float:
+        bound = super().error_bound()
+        if self.full is None or query is None:
+            return bound
+        # Full-precision re-scoring can reorder rows, so the shortlist also has to cover the
+        # worst-case quantization error on both the k-th row and each candidate.
+        if self.precision == "int8":
+            quantization = self.max_scale / 2 * float(np.abs(query).sum())
+        else:
+            quantization = 2.0 ** -11 + self.dim * 2.0 ** -25
+        return bound + 2 * quantization
+
+
+def make_store(dim: int, precision: str = "float32", rescore: bool = False) -> NumpyVectorStore:
+    if precision not in PRECISIONS:
+        raise ValueError(f"unknown precision: {precision}")
+    if precision == "float32":
+        return NumpyVectorStore(dim=dim)
+    return QuantizedVectorStore(dim=dim, precision=precision, rescore=rescore)
@@ -1,12 +1,27 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import Dict, List, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from typing import (
+    TYPE_CHECKING,
+    Collection,
+    Dict,
+    Hashable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
 
 from rag_pipeline.indexes import BM25Index, VectorIndex
-from rag_pipeline.schemas import H1Node, H2Node, TreeIndex
+from rag_pipeline.result_cache import ResultCache, normalize_query
+from rag_pipeline.schemas import DocFilter, H1Node, H2Node, TreeIndex
+from rag_pipeline.tracing import Tracer, span
 from rag_pipeline.utils import dedupe_preserve_order
 
+if TYPE_CHECKING:
+    from rag_pipeline.corpus import CorpusIndex
+
 
 @dataclass(frozen=True)
 class RetrievedChunk:
@@ -27,79 +42,239 @@ class RetrievalResult:
 
 
 class RetrievalAgent:
-    def __init__(self, tree: TreeIndex, bm25: BM25Index, vector: VectorIndex) -> None:
+    def __init__(
+        self,
+        tree: TreeIndex,
+        bm25: BM25Index,
+        vector: VectorIndex,
+        corpus: Optional[CorpusIndex] = None,
+        result_cache: Optional[ResultCache] = None,
+        tracer: Optional[Tracer] = None,
+    ) -> None:
         self.tree = tree
         self.bm25 = bm25
         self.vector = vector
+        self.corpus = corpus
+        self.result_cache = result_cache
+        self.tracer = tracer
+
+    def generation(self) -> Tuple[int, int]:
+        return (self.bm25.generation, self.vector.generation)
+
+    def cache_key(
+        self,
+        query: str,
+        top_h1: int,
+        top_h2: int,
+        doc_filter: Optional[DocFilter],
+        expand_window: int = 0,
+    ) -> Hashable:
+        scope = None
+        if doc_filter is not None:
+            scope = tuple(
+                frozenset(values) if values is not None else None
+                for values in (doc_filter.doc_ids, doc_filter.pdf_names)
+            )
+        return (normalize_query(query), top_h1, top_h2, scope, expand_window)
 
-    def bm25_search(self, query: str, top_k: int = 3) -> List[str]:
-        results = self.bm25.search(query, top_k=top_k)
+    def bm25_search(
+        self, query: str, top_k: int = 3, allowed: Optional[Collection[str]] = None
+    ) -> List[str]:
+        results = self.bm25.search(query, top_k=top_k, allowed=allowed)
         return [node_id for node_id, _ in results]
 
+    def resolve_filter(self, doc_filter: DocFilter) -> Collection[str]:
+        if self.corpus is None:
+            raise ValueError("doc_filter requires a RetrievalAgent built from a CorpusIndex")
+        return self.corpus.resolve_filter(doc_filter)
+
     def vector_search(self, query: str, h1_scope: List[str], top_k: int = 5) -> List[Tuple[H2Node, float]]:
+        return self.vector.search(query, self.h2_scope(h1_scope), top_k=top_k)
+
+    def h2_scope(self, h1_scope: List[str]) -> List[str]:
         scoped_h2_ids = []
         for h1_id in h1_scope:
             h1_node = self.tree.h1_nodes.get(h1_id)
             if not h1_node:
                 continue
             scoped_h2_ids.extend(h1_node.children)
-        scoped_h2_ids = dedupe_preserve_order(scoped_h2_ids)
-        return self.vector.search(query, scoped_h2_ids, top_k=top_k)
+        return dedupe_preserve_order(scoped_h2_ids)
 
     def tree_expand(self, node_id: str, window: int = 1) -> List[str]:
-        h2_ids = []
-        for h1_id, h1_node in self.tree.h1_nodes.items():
-            if node_id not in h1_node.children:
-                continue
-            children = h1_node.children
-            idx = children.index(node_id)
-            start = max(0, idx - window)
-            end = min(len(children), idx + window + 1)
-            h2_ids.extend(children[start:end])
-        return dedupe_preserve_order(h2_ids)
+        return self.tree.navigation.siblings(node_id, window)
+
+    def expand_hits(
+        self, h2_results: List[Tuple[H2Node, float]], window: int
+    ) -> List[Tuple[H2Node, float]]:
+        hit_scores = {node.node_id: score for node, score in h2_results}
+        hits = {node.node_id: node for node, _ in h2_results}
+        ordered = dedupe_preserve_order(
+            h2_id for node, _ in h2_results for h2_id in self.tree_expand(node.node_id, window)
+        )
+        neighbours = [h2_id for h2_id in ordered if h2_id not in hits]
+        prefetch = getattr(self.tree.h2_nodes, "prefetch", None)
+        if prefetch is not None:
+            prefetch(neighbours)
+        expanded = []
+        for h2_id in ordered:
+            node = hits.get(h2_id) or self.tree.h2_nodes.get(h2_id)
+            if node is not None:
+                # Neighbours are context, not matches, so they carry no similarity score.
+                expanded.append((node, hit_scores.get(h2_id, 0.0)))
+        return expanded
 
     def format_citations(self, chunks: List[RetrievedChunk]) -> List[str]:
-        citations = []
-        for chunk in chunks:
-            pages = ", ".join(str(page) for page in chunk.pages) if chunk.pages else "n/a"
-            citations.append(f"{chunk.pdf_name} p.{pages} [{chunk.node_id}]")
-        return dedupe_preserve_order(citations)
-
-    def retrieve(self, query: str, top_h1: int = 3, top_h2: int = 4) -> RetrievalResult:
-        h1_candidates = self.bm25_search(query, top_k=top_h1)
-
-        needs_detail = len(query.split()) > 3
-        chunks: List[RetrievedChunk] = []
-        if needs_detail:
-            h2_results = self.vector_search(query, h1_candidates, top_k=top_h2)
-            for node, score in h2_results:
-                chunks.append(
-                    RetrievedChunk(
-                        node_id=node.node_id,
-                        text=node.text,
-                        pdf_name=node.pdf_name,
-                        pages=node.pages,
-                        parent_h1=node.parent,
-                        score=score,
-                    )
-                )
-        else:
-            for h1_id in h1_candidates:
-                h1_node = self.tree.h1_nodes.get(h1_id)
-                if not h1_node:
-                    continue
-                chunks.append(
-                    RetrievedChunk(
-                        node_id=h1_node.node_id,
-                        text=f"{h1_node.head}\n{h1_node.summary}",
-                        pdf_name=h1_node.pdf_name,
-                        pages=h1_node.pages,
-                        parent_h1=h1_node.node_id,
-                        score=0.0,
-                    )
+        return format_citations(chunks)
+
+    def retrieve(
+        self,
+        query: str,
+        top_h1: int = 3,
+        top_h2: int = 4,
+        doc_filter: Optional[DocFilter] = None,
+        expand_window: int = 0,
+    ) -> RetrievalResult:
+        with span(self.tracer, "retrieve") as stage:
+            if self.result_cache is None:
+                return self._retrieve(query, top_h1, top_h2, doc_filter, expand_window)
+            key = self.cache_key(query, top_h1, top_h2, doc_filter, expand_window)
+            generation = self.generation()
+            cached = self.result_cache.get(key, generation)
+            stage.set(cache_hits=int(cached is not None))
+            if cached is not None:
+                return cached if cached.query == query else replace(cached, query=query)
+            result = self._retrieve(query, top_h1, top_h2, doc_filter, expand_window)
+            self.result_cache.put(key, generation, result)
+            return result
+
+    def retrieve_many(
+        self,
+        queries: Sequence[str],
+        top_h1: int = 3,
+        top_h2: int = 4,
+        doc_filter: Optional[DocFilter] = None,
+        workers: Optional[int] = None,
+        expand_window: int = 0,
+    ) -> List[RetrievalResult]:
+        queries = list(queries)
+        with span(self.tracer, "retrieve_many") as stage:
+            stage.set(queries=len(queries))
+            if self.result_cache is None:
+                return self._retrieve_many(
+                    queries, top_h1, top_h2, doc_filter, workers, expand_window
                 )
+            generation = self.generation()
+            keys = [
+                self.cache_key(query, top_h1, top_h2, doc_filter, expand_window)
+                for query in queries
+            ]
+            results: List[Optional[RetrievalResult]] = []
+            for query, key in zip(queries, keys):
+                cached = self.result_cache.get(key, generation)
+                if cached is not None and cached.query != query:
+                    cached = replace(cached, query=query)
+                results.append(cached)
+            missing = [position for position, result in enumerate(results) if result is None]
+            stage.set(cache_hits=len(queries) - len(missing))
+            computed = self._retrieve_many(
+                [queries[position] for position in missing],
+                top_h1,
+                top_h2,
+                doc_filter,
+                workers,
+                expand_window,
+            )
+            for position, result in zip(missing, computed):
+                results[position] = result
+                self.result_cache.put(keys[position], generation, result)
+            return results
 
-        citations = self.format_citations(chunks)
+    def _retrieve(
+        self,
+        query: str,
+        top_h1: int,
+        top_h2: int,
+        doc_filter: Optional[DocFilter],
+        expand_window: int = 0,
+    ) -> RetrievalResult:
+        with span(self.tracer, "bm25") as stage:
+            allowed = self.resolve_filter(doc_filter) if doc_filter is not None else None
+            h1_candidates = self.bm25_search(query, top_k=top_h1, allowed=allowed)
+            stage.set(candidates=len(h1_candidates))
+            if allowed is not None:
+                stage.set(allowed=len(allowed))
+        h2_results = None
+        if needs_detail(query):
+            with span(self.tracer, "vector") as stage:
+                scope = self.h2_scope(h1_candidates)
+                h2_results = self.vector.search(query, scope, top_k=top_h2)
+                stage.set(scope_size=len(scope), hits=len(h2_results))
+        return self.build_result(query, h1_candidates, h2_results, expand_window)
+
+    def _retrieve_many(
+        self,
+        queries: List[str],
+        top_h1: int,
+        top_h2: int,
+        doc_filter: Optional[DocFilter],
+        workers: Optional[int],
+        expand_window: int = 0,
+    ) -> List[RetrievalResult]:
+        allowed = self.resolve_filter(doc_filter) if doc_filter is not None else None
+        if not workers or workers <= 1 or len(queries) <= workers:
+            return self._retrieve_batch(queries, top_h1, top_h2, allowed, expand_window)
+        size = -(-len(queries) // workers)
+        batches = [queries[start : start + size] for start in range(0, len(queries), size)]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # numpy releases the GIL inside the matrix products, so slices overlap usefully.
+            parts = executor.map(
+                lambda batch: self._retrieve_batch(batch, top_h1, top_h2, allowed, expand_window),
+                batches,
+            )
+            return [result for part in parts for result in part]
+
+    def _retrieve_batch(
+        self,
+        queries: List[str],
+        top_h1: int,
+        top_h2: int,
+        allowed: Optional[Collection[str]],
+        expand_window: int = 0,
+    ) -> List[RetrievalResult]:
+        with span(self.tracer, "bm25") as stage:
+            h1_candidates = [
+                [node_id for node_id, _ in hits]
+                for hits in self.bm25.search_many(queries, top_k=top_h1, allowed=allowed)
+            ]
+            stage.set(queries=len(queries), candidates=sum(map(len, h1_candidates)))
+        detailed = [position for position, query in enumerate(queries) if needs_detail(query)]
+        h2_results: List[Optional[List[Tuple[H2Node, float]]]] = [None] * len(queries)
+        with span(self.tracer, "vector") as stage:
+            scopes = [self.h2_scope(h1_candidates[position]) for position in detailed]
+            ranked = self.vector.search_many(
+                [queries[position] for position in detailed], scopes, top_k=top_h2
+            )
+            stage.set(queries=len(detailed), scope_size=sum(map(len, scopes)))
+        for position, hits in zip(detailed, ranked):
+            h2_results[position] = hits
+        return [
+            self.build_result(query, candidates, hits, expand_window)
+            for query, candidates, hits in zip(queries, h1_candidates, h2_results)
+        ]
+
+    def build_result(
+        self,
+        query: str,
+        h1_candidates: List[str],
+        h2_results: Optional[List[Tuple[H2Node, float]]],
+        expand_window: int = 0,
+    ) -> RetrievalResult:
+        with span(self.tracer, "chunks") as stage:
+            chunks = self.build_chunks(h1_candidates, h2_results, expand_window)
+            stage.set(chunks=len(chunks))
+        with span(self.tracer, "citations") as stage:
+            citations = self.format_citations(chunks)
+            stage.set(citations=len(citations))
         return RetrievalResult(
             query=query,
             h1_candidates=h1_candidates,
@@ -107,3 +282,49 @@ class RetrievalAgent:
             citations=citations,
         )
 
+    def build_chunks(
+        self,
+        h1_candidates: List[str],
+        h2_results: Optional[List[Tuple[H2Node, float]]],
+        expand_window: int = 0,
+    ) -> List[RetrievedChunk]:
+        if h2_results is not None and expand_window > 0:
+            h2_results = self.expand_hits(h2_results, expand_window)
+        if h2_results is not None:
+            return [h2_chunk(node, score) for node, score in h2_results]
+        h1_nodes = (self.tree.h1_nodes.get(h1_id) for h1_id in h1_candidates)
+        return [h1_chunk(h1_node) for h1_node in h1_nodes if h1_node]
+
+
+def needs_detail(query: str) -> bool:
+    return len(query.split()) > 3
+
+
+def h2_chunk(node: H2Node, score: float) -> RetrievedChunk:
+    return RetrievedChunk(
+        node_id=node.node_id,
+        text=node.text,
+        pdf_name=node.pdf_name,
+        pages=node.pages,
+        parent_h1=node.parent,
+        score=score,
+    )
+
+
+def h1_chunk(node: H1Node) -> RetrievedChunk:
+    return RetrievedChunk(
+        node_id=node.node_id,
+        text=f"{node.head}\n{node.summary}",
+        pdf_name=node.pdf_name,
+        pages=node.pages,
+        parent_h1=node.node_id,
+        score=0.0,
+    )
+
+
+def format_citations(chunks: List[RetrievedChunk]) -> List[str]:
+    citations = []
+    for chunk in chunks:
+        pages = ", ".join(str(page) for page in chunk.pages) if chunk.pages else "n/a"
+        citations.append(f"{chunk.pdf_name} p.{pages} [{chunk.node_id}]")
+    return dedupe_preserve_order(citations)
@@ -1,7 +1,11 @@
 from __future__ import annotations
 
+import sys
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional
+from typing import TYPE_CHECKING, Collection, Dict, List, Optional
+
+if TYPE_CHECKING:
+    from rag_pipeline.navigation import TreeNavigation
 
 
 @dataclass(frozen=True)
@@ -10,7 +14,7 @@ class DocumentRoot:
     doc_id: str
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class H1Node:
     node_id: str
     level: str
@@ -20,8 +24,12 @@ class H1Node:
     pdf_name: str
     children: List[str] = field(default_factory=list)
 
+    def __post_init__(self) -> None:
+        object.__setattr__(self, "level", sys.intern(self.level))
+        object.__setattr__(self, "pdf_name", sys.intern(self.pdf_name))
 
-@dataclass(frozen=True)
+
+@dataclass(frozen=True, slots=True)
 class H2Node:
     node_id: str
     parent: str
@@ -32,10 +40,35 @@ class H2Node:
     pdf_name: str
     embedding: Optional[List[float]] = None
 
+    def __post_init__(self) -> None:
+        # Millions of nodes share a handful of level and pdf names; keep one copy of each.
+        object.__setattr__(self, "parent", sys.intern(self.parent))
+        object.__setattr__(self, "level", sys.intern(self.level))
+        object.__setattr__(self, "pdf_name", sys.intern(self.pdf_name))
+
 
 @dataclass(frozen=True)
 class TreeIndex:
     h1_nodes: Dict[str, H1Node]
     h2_nodes: Dict[str, H2Node]
     lookup: Dict[str, Dict[str, List[str]]]
+    _navigation: Optional[TreeNavigation] = field(
+        default=None, init=False, repr=False, compare=False
+    )
 
+    @property
+    def navigation(self) -> TreeNavigation:
+        if self._navigation is None:
+            from rag_pipeline.navigation import TreeNavigation
+
+            object.__setattr__(self, "_navigation", TreeNavigation(self))
+        return self._navigation
+
+    def invalidate_navigation(self) -> None:
+        object.__setattr__(self, "_navigation", None)
+
+
+@dataclass(frozen=True)
+class DocFilter:
+    doc_ids: Optional[Collection[str]] = None
+    pdf_names: Optional[Collection[str]] = None
@@ -0,0 +1,468 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import gc
+import json
+import os
+import signal
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, replace
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from rag_pipeline.corpus import CorpusIndex, ingest_corpus
+from rag_pipeline.indexes import BM25Index, VectorIndex
+from rag_pipeline.inference import AnswerPayload, InferencePipeline
+from rag_pipeline.result_cache import ResultCache
+from rag_pipeline.snapshot import SnapshotError
+from rag_pipeline.tracing import MetricsRegistry, Tracer, span
+
+REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+    504: "Gateway Timeout",
+}
+
+
+@dataclass(frozen=True)
+class ServeConfig:
+    host: str = "127.0.0.1"
+    port: int = 8080
+    max_batch_size: int = 32
+    max_wait_ms: float = 5.0
+    max_queue: int = 256
+    max_body_bytes: int = 64 * 1024
+    request_timeout_s: float = 30.0
+    cache_entries: int = 0
+
+
+class Overloaded(RuntimeError):
+    pass
+
+
+class PayloadTooLarge(ValueError):
+    pass
+
+
+class MicroBatcher:
+    def __init__(
+        self,
+        handler: Callable[[List[str]], List[Any]],
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0,
+        max_queue: int = 256,
+        tracer: Optional[Tracer] = None,
+    ) -> None:
+        self.handler = handler
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_s = max_wait_ms / 1000.0
+        self.max_queue = max_queue
+        self.tracer = tracer
+        self.submitted = 0
+        self.rejected = 0
+        self.batches = 0
+        self.failed_batches = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        # One batch at a time: the indexes are read-only here, but batches already fan out.
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rag-batch")
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def start(self) -> None:
+        if self._task is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        while self._queue is not None and not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(Overloaded("server is shutting down"))
+        self._executor.shutdown(wait=True)
+
+    async def submit(self, query: str) -> Any:
+        if self._queue is None:
+            raise RuntimeError("MicroBatcher.start() must be called before submit()")
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((query, future))
+        except asyncio.QueueFull:
+            # Shed load at the door instead of letting latency grow without bound.
+            self.rejected += 1
+            raise Overloaded(f"queue is full ({self.max_queue} pending queries)") from None
+        self.submitted += 1
+        return await future
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait_s
+            while len(batch) < self.max_batch_size:
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                getter = loop.create_task(self._queue.get())
+                try:
+                    await asyncio.wait({getter}, timeout=remaining)
+                finally:
+                    timed_out = not getter.done()
+                    if timed_out:
+                        # A cancelled get() leaves any item it was woken for in the queue.
+                        getter.cancel()
+                if timed_out:
+                    break
+                batch.append(getter.result())
+            batch = [(query, future) for query, future in batch if not future.cancelled()]
+            if batch:
+                await self._dispatch(loop, batch)
+
+    async def _dispatch(
+        self, loop: asyncio.AbstractEventLoop, batch: List[Tuple[str, asyncio.Future]]
+    ) -> None:
+        self.batches += 1
+        queries = [query for query, _ in batch]
+        try:
+            with span(self.tracer, "serve_batch") as stage:
+                stage.set(queries=len(queries))
+                results = await loop.run_in_executor(self._executor, self.handler, queries)
+        except Exception as exc:
+            self.failed_batches += 1
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self.depth,
+            "max_queue": self.max_queue,
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+            "batches": self.batches,
+            "failed_batches": self.failed_batches,
+        }
+
+
+class QueryServer:
+    def __init__(
+        self,
+        pipeline: InferencePipeline,
+        config: ServeConfig,
+        registry: Optional[MetricsRegistry] = None,
+    ) -> None:
+        self.pipeline = pipeline
+        self.config = config
+        self.registry = registry
+        self.started = time.time()
+        self.batcher = MicroBatcher(
+            pipeline.answer_many,
+            max_batch_size=config.max_batch_size,
+            max_wait_ms=config.max_wait_ms,
+            max_queue=config.max_queue,
+            tracer=registry,
+        )
+        self.server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self, sock: Optional[socket.socket] = None) -> None:
+        self.batcher.start()
+        if sock is not None:
+            self.server = await asyncio.start_server(self.handle, sock=sock)
+        else:
+            self.server = await asyncio.start_server(
+                self.handle, self.config.host, self.config.port
+            )
+
+    @property
+    def port(self) -> int:
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        await self.batcher.stop()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                request = await self.read_request(reader)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                status, content_type, payload = await self.route(method, path, body)
+                keep_alive = headers.get("connection", "").lower() != "close"
+                self.write_response(writer, status, content_type, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except PayloadTooLarge:
+            self.write_response(writer, *self.error(413, "request body too large"), False)
+        except ValueError:
+            self.write_response(writer, *self.error(400, "malformed request"), False)
+        finally:
+            writer.close()
+
+    async def read_request(
+        self, reader: asyncio.StreamReader
+    ) -> Optional[Tuple[str, str, Dict[str, str], bytes]]:
+        line = await reader.readline()
+        if not line:
+            return None
+        parts = line.decode("latin-1").split()
+        if len(parts) != 3:
+            raise ValueError("malformed request line")
+        method, path, _ = parts
+        headers: Dict[str, str] = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get("content-length", "0") or 0)
+        if length > self.config.max_body_bytes:
+            raise PayloadTooLarge()
+        body = await reader.readexactly(length) if length else b""
+        return method, path.split("?", 1)[0], headers, body
+
+    def write_response(
+        self,
+        writer: asyncio.StreamWriter,
+        status: int,
+        content_type: str,
+        payload: bytes,
+        keep_alive: bool,
+    ) -> None:
+        head = [
+            f"HTTP/1.1 {status} {REASONS.get(status, 'Error')}",
+            f"Content-Type: {content_type}",
+            f"Content-Length: {len(payload)}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}",
+        ]
+        if status == 503:
+            head.append("Retry-After: 1")
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + payload)
+
+    async def route(self, method: str, path: str, body: bytes) -> Tuple[int, str, bytes]:
+        if path == "/health":
+            if method != "GET":
+                return self.error(405, "use GET")
+            return self.json(200, self.health())
+        if path == "/metrics":
+            if method != "GET":
+                return self.error(405, "use GET")
+            text = self.registry.to_prometheus() if self.registry is not None else ""
+            return 200, "text/plain; version=0.0.4", text.encode("utf-8")
+        if path == "/answer":
+            if method != "POST":
+                return self.error(405, "use POST")
+            return await self.answer(body)
+        return self.error(404, f"no route for {path}")
+
+    async def answer(self, body: bytes) -> Tuple[int, str, bytes]:
+        try:
+            query = json.loads(body.decode("utf-8"))["query"]
+        except (ValueError, KeyError, TypeError):
+            return self.error(400, 'expected a JSON body like {"query": "..."}')
+        if not isinstance(query, str) or not query.strip():
+            return self.error(400, "query must be a non-empty string")
+        try:
+            payload = await asyncio.wait_for(
+                self.batcher.submit(query), self.config.request_timeout_s
+            )
+        except Overloaded as exc:
+            return self.error(503, str(exc))
+        except asyncio.TimeoutError:
+            return self.error(504, "query timed out")
+        except Exception as exc:
+            return self.error(500, f"{type(exc).__name__}: {exc}")
+        return self.json(200, answer_json(payload))
+
+    def health(self) -> Dict[str, Any]:
+        return {
+            "status": "ok",
+            "pid": os.getpid(),
+            "uptime_s": round(time.time() - self.started, 3),
+            "batcher": self.batcher.stats(),
+            "pipeline": self.pipeline.debug_state(),
+        }
+
+    def json(self, status: int, value: Any) -> Tuple[int, str, bytes]:
+        return status, "application/json", json.dumps(value).encode("utf-8")
+
+    def error(self, status: int, message: str) -> Tuple[int, str, bytes]:
+        return self.json(status, {"error": message})
+
+
+def answer_json(payload: AnswerPayload) -> Dict[str, Any]:
+    return asdict(payload)
+
+
+def build_pipeline(
+    corpus: CorpusIndex, config: ServeConfig
+) -> Tuple[InferencePipeline, MetricsRegistry]:
+    registry = MetricsRegistry()
+    cache = ResultCache(max_entries=config.cache_entries) if config.cache_entries > 0 else None
+    pipeline = InferencePipeline(
+        corpus.tree, corpus.bm25, corpus.vector, result_cache=cache, tracer=registry
+    )
+    return pipeline, registry
+
+
+async def run_server(corpus: CorpusIndex, config: ServeConfig, sock: socket.socket) -> None:
+    pipeline, registry = build_pipeline(corpus, config)
+    server = QueryServer(pipeline, config, registry)
+    await server.start(sock=sock)
+    stopped = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(signum, stopped.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+    await stopped.wait()
+    await server.stop()
+
+
+def serve(corpus: CorpusIndex, config: ServeConfig, workers: int = 1) -> None:
+    sock = socket.create_server((config.host, config.port), backlog=max(config.max_queue, 128))
+    if workers <= 1:
+        asyncio.run(run_server(corpus, config, sock))
+        return
+    if not hasattr(os, "fork"):
+        raise ValueError("multiple workers need os.fork; run one worker per process instead")
+    # Frozen objects are skipped by the collector, so forked workers do not dirty the pages
+    # holding the indexes just by scanning them; mmap-loaded vectors share the page cache.
+    gc.collect()
+    gc.freeze()
+    children = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                asyncio.run(run_server(corpus, config, sock))
+            finally:
+                os._exit(0)
+        children.append(pid)
+    sock.close()
+
+    def forward(signum: int, _frame: object) -> None:
+        for child in children:
+            try:
+                os.kill(child, signum)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, forward)
+    signal.signal(signal.SIGTERM, forward)
+    for child in children:
+        os.waitpid(child, 0)
+
+
+def load_corpus(
+    source: str,
+    vectors: Optional[str] = None,
+    bm25: Optional[str] = None,
+    backend: str = "numpy",
+    precision: Optional[str] = None,
+) -> CorpusIndex:
+    # Snapshots replace the indexes outright, so only the tree is rebuilt for them.
+    corpus = ingest_corpus(
+        source,
+        vector=VectorIndex(backend=backend, precision=precision or "float32"),
+        index_bm25=bm25 is None,
+        index_vectors=vectors is None,
+    ).index
+    if backend == "numpy":
+        # The matrix holds the vectors; per-node float lists would only bloat every worker.
+        for node_id, node in corpus.tree.h2_nodes.items():
+            corpus.tree.h2_nodes[node_id] = replace(node, embedding=None)
+    if bm25 is not None:
+        corpus.bm25 = BM25Index.load(bm25)
+        _check_snapshot_ids(bm25, corpus.bm25.documents, corpus.tree.h1_nodes)
+    if vectors is not None:
+        # Mapped vectors resolve text through the tree, so every worker shares one copy.
+        corpus.vector = VectorIndex.load(
+            vectors,
+            backend=backend,
+            mmap=backend == "numpy",
+            node_source=corpus.tree.h2_nodes,
+            precision=precision,
+        )
+        _check_snapshot_ids(vectors, corpus.vector.node_ids(), corpus.tree.h2_nodes)
+    return corpus
+
+
+def _check_snapshot_ids(path: str, snapshot_ids: Iterable[str], tree_ids: Iterable[str]) -> None:
+    snapshot_ids, tree_ids = set(snapshot_ids), set(tree_ids)
+    if snapshot_ids != tree_ids:
+        missing = sorted(tree_ids - snapshot_ids)
+        unknown = sorted(snapshot_ids - tree_ids)
+        raise SnapshotError(
+            f"{path}: snapshot does not match the corpus "
+            f"({len(missing)} nodes missing, e.g. {missing[:3]}; "
+            f"{len(unknown)} unknown, e.g. {unknown[:3]})"
+        )
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Serve /answer over HTTP with micro-batching.")
+    parser.add_argument("corpus", help="directory of Markdown files or a JSONL manifest")
+    parser.add_argument("--host", default=ServeConfig.host)
+    parser.add_argument("--port", type=int, default=ServeConfig.port)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--max-batch-size", type=int, default=ServeConfig.max_batch_size)
+    parser.add_argument("--max-wait-ms", type=float, default=ServeConfig.max_wait_ms)
+    parser.add_argument("--max-queue", type=int, default=ServeConfig.max_queue)
+    parser.add_argument("--request-timeout-s", type=float, default=ServeConfig.request_timeout_s)
+    parser.add_argument("--cache-entries", type=int, default=ServeConfig.cache_entries)
+    parser.add_argument("--backend", choices=["python", "numpy"], default="numpy")
+    parser.add_argument("--vectors", help="VectorIndex snapshot to memory-map")
+    parser.add_argument("--bm25", help="BM25Index snapshot to load")
+    parser.add_argument("--precision", choices=["float32", "float16", "int8"])
+    args = parser.parse_args(argv)
+    if args.backend == "python" and args.precision not in (None, "float32"):
+        parser.error(f"--precision {args.precision} requires --backend numpy")
+
+    corpus = load_corpus(args.corpus, args.vectors, args.bm25, args.backend, args.precision)
+    config = ServeConfig(
+        host=args.host,
+        port=args.port,
+        max_batch_size=args.max_batch_size,
+        max_wait_ms=args.max_wait_ms,
+        max_queue=args.max_queue,
+        request_timeout_s=args.request_timeout_s,
+        cache_entries=args.cache_entries,
+    )
+    print(f"serving {len(corpus.tree.h2_nodes)} sections on http://{args.host}:{args.port}")
+    serve(corpus, config, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
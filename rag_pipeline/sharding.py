@@ -0,0 +1,351 @@
+from __future__ import annotations
+
+import heapq
+import multiprocessing
+import os
+from dataclasses import dataclass
+from typing import Any, Collection, Dict, List, Optional, Sequence, Set, Tuple
+
+from rag_pipeline.analysis import analyze_query
+from rag_pipeline.corpus import CorpusIndex
+from rag_pipeline.indexes import BM25Index, CollectionStats, VectorIndex
+from rag_pipeline.retrieval import (
+    RetrievalResult,
+    format_citations,
+    h1_chunk,
+    h2_chunk,
+    needs_detail,
+)
+from rag_pipeline.schemas import DocFilter, H1Node, H2Node, TreeIndex
+from rag_pipeline.utils import dedupe_preserve_order
+
+# (score, rank of the parent H1 among the candidates, position among its children, node)
+VectorHit = Tuple[float, int, int, H2Node]
+
+
+class ShardError(RuntimeError):
+    pass
+
+
+@dataclass(frozen=True)
+class ShardSpec:
+    tree: TreeIndex
+    ordinals: Dict[str, int]
+    k1: float
+    b: float
+    vector: VectorIndex
+
+
+class Shard:
+    def __init__(self, spec: ShardSpec) -> None:
+        self.tree = spec.tree
+        self.bm25 = BM25Index(k1=spec.k1, b=spec.b)
+        self.bm25.add_many(
+            sorted(spec.tree.h1_nodes.values(), key=lambda node: spec.ordinals[node.node_id])
+        )
+        # Global insertion ordinals keep tie-breaking identical to the unsharded index.
+        self.bm25.doc_order = dict(spec.ordinals)
+        self.vector = spec.vector
+
+    def stats(self, _: Any) -> Tuple[Dict[str, int], int, int]:
+        return self.bm25.doc_freqs, len(self.bm25.documents), self.bm25.total_doc_len
+
+    def bm25_search(
+        self, payload: Tuple[List[str], int, Optional[Set[str]], CollectionStats]
+    ) -> List[List[Tuple[float, int, str]]]:
+        queries, top_k, allowed, stats = payload
+        self.bm25.stats = stats
+        ordinals = self.bm25.doc_order
+        return [
+            [(score, ordinals[node_id], node_id) for node_id, score in hits]
+            for hits in self.bm25.search_many(queries, top_k=top_k, allowed=allowed)
+        ]
+
+    def detail(
+        self, payload: Tuple[List[str], List[List[str]], List[bool], int]
+    ) -> List[Tuple[Dict[str, H1Node], List[VectorHit]]]:
+        queries, candidates, detailed, top_k = payload
+        h1_nodes = self.tree.h1_nodes
+        results: List[Tuple[Dict[str, H1Node], List[VectorHit]]] = []
+        scopes = []
+        places = []
+        for h1_ids, flag in zip(candidates, detailed):
+            local = {h1_id: h1_nodes[h1_id] for h1_id in h1_ids if h1_id in h1_nodes}
+            # H1 nodes only travel back for queries that are answered at the H1 level.
+            results.append(({} if flag else local, []))
+            place: Dict[str, Tuple[int, int]] = {}
+            for rank, h1_id in enumerate(h1_ids):
+                if h1_id in local:
+                    for position, h2_id in enumerate(local[h1_id].children):
+                        place.setdefault(h2_id, (rank, position))
+            scopes.append(list(place))
+            places.append(place)
+        positions = [position for position, flag in enumerate(detailed) if flag]
+        ranked = self.vector.search_many(
+            [queries[position] for position in positions],
+            [scopes[position] for position in positions],
+            top_k=top_k,
+        )
+        for position, hits in zip(positions, ranked):
+            place = places[position]
+            results[position][1].extend(
+                (score, *place[node.node_id], node) for node, score in hits
+            )
+        return results
+
+    def expand(self, payload: Tuple[List[List[str]], int]) -> List[Dict[str, List[H2Node]]]:
+        hit_ids, window = payload
+        navigation = self.tree.navigation
+        h2_nodes = self.tree.h2_nodes
+        return [
+            {
+                h2_id: [
+                    h2_nodes[sibling]
+                    for sibling in navigation.siblings(h2_id, window)
+                    if sibling in h2_nodes
+                ]
+                for h2_id in ids
+            }
+            for ids in hit_ids
+        ]
+
+
+def _serve_shard(connection: Any, spec: ShardSpec) -> None:
+    shard = Shard(spec)
+    handlers = {
+        "stats": shard.stats,
+        "bm25": shard.bm25_search,
+        "detail": shard.detail,
+        "expand": shard.expand,
+    }
+    while True:
+        op, payload = connection.recv()
+        if op == "close":
+            connection.close()
+            return
+        try:
+            connection.send((True, handlers[op](payload)))
+        except Exception as exc:
+            connection.send((False, f"{type(exc).__name__}: {exc}"))
+
+
+def partition(corpus: CorpusIndex, shards: int) -> List[TreeIndex]:
+    parts = [TreeIndex(h1_nodes={}, h2_nodes={}, lookup={}) for _ in range(shards)]
+    order = corpus.bm25.doc_order
+    h1_ids = sorted(corpus.tree.h1_nodes, key=lambda h1_id: order.get(h1_id, len(order)))
+    for position, h1_id in enumerate(h1_ids):
+        # Each H1 travels with its H2 children, so navigation stays shard-local.
+        part = parts[position % shards]
+        h1 = corpus.tree.h1_nodes[h1_id]
+        part.h1_nodes[h1_id] = h1
+        if h1_id in corpus.tree.lookup:
+            part.lookup[h1_id] = corpus.tree.lookup[h1_id]
+        for h2_id in h1.children:
+            if h2_id in corpus.tree.h2_nodes:
+                part.h2_nodes[h2_id] = corpus.tree.h2_nodes[h2_id]
+    return parts
+
+
+class ShardedRetrievalAgent:
+    def __init__(
+        self,
+        corpus: CorpusIndex,
+        shards: Optional[int] = None,
+        start_method: Optional[str] = None,
+    ) -> None:
+        shards = max(1, shards or os.cpu_count() or 1)
+        self.corpus = corpus
+        context = multiprocessing.get_context(start_method)
+        ordinals = corpus.bm25.doc_order
+        self.owner: Dict[str, int] = {}
+        self.connections = []
+        self.processes = []
+        for shard_id, tree in enumerate(partition(corpus, shards)):
+            for h1_id in tree.h1_nodes:
+                self.owner[h1_id] = shard_id
+            spec = ShardSpec(
+                tree=tree,
+                ordinals={h1_id: ordinals[h1_id] for h1_id in tree.h1_nodes},
+                k1=corpus.bm25.k1,
+                b=corpus.bm25.b,
+                # Stored rows are copied rather than re-embedded, so shard scores match exactly.
+                vector=corpus.vector.subset(
+                    tree.h2_nodes,
+                    node_source=tree.h2_nodes if corpus.vector.node_source is not None else None,
+                ),
+            )
+            parent, child = context.Pipe()
+            process = context.Process(target=_serve_shard, args=(child, spec), daemon=True)
+            process.start()
+            child.close()
+            self.connections.append(parent)
+            self.processes.append(process)
+
+        self.doc_freqs: Dict[str, int] = {}
+        self.doc_count = 0
+        self.total_doc_len = 0
+        for doc_freqs, doc_count, total_doc_len in self.broadcast("stats", [None] * shards):
+            for token, df in doc_freqs.items():
+                self.doc_freqs[token] = self.doc_freqs.get(token, 0) + df
+            self.doc_count += doc_count
+            self.total_doc_len += total_doc_len
+
+    @property
+    def shards(self) -> int:
+        return len(self.connections)
+
+    def broadcast(self, op: str, payloads: Sequence[Any]) -> List[Any]:
+        # Every shard gets its request before any reply is read, so the shards work in parallel.
+        for connection, payload in zip(self.connections, payloads):
+            connection.send((op, payload))
+        replies = [connection.recv() for connection in self.connections]
+        failures = [reply for ok, reply in replies if not ok]
+        if failures:
+            raise ShardError(f"{op} failed on {len(failures)} shard(s): {failures[0]}")
+        return [reply for _, reply in replies]
+
+    def close(self) -> None:
+        for connection, process in zip(self.connections, self.processes):
+            try:
+                connection.send(("close", None))
+            except (BrokenPipeError, OSError):
+                pass
+            connection.close()
+            process.join(timeout=5)
+        self.connections = []
+        self.processes = []
+
+    def __enter__(self) -> ShardedRetrievalAgent:
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def query_stats(self, queries: Sequence[str]) -> CollectionStats:
+        tokens = {token for query in queries for token in analyze_query(query).tokens}
+        return CollectionStats(
+            doc_count=self.doc_count,
+            total_doc_len=self.total_doc_len,
+            doc_freqs={token: self.doc_freqs[token] for token in tokens if token in self.doc_freqs},
+        )
+
+    def retrieve(
+        self,
+        query: str,
+        top_h1: int = 3,
+        top_h2: int = 4,
+        doc_filter: Optional[DocFilter] = None,
+        expand_window: int = 0,
+    ) -> RetrievalResult:
+        return self.retrieve_many([query], top_h1, top_h2, doc_filter, expand_window)[0]
+
+    def retrieve_many(
+        self,
+        queries: Sequence[str],
+        top_h1: int = 3,
+        top_h2: int = 4,
+        doc_filter: Optional[DocFilter] = None,
+        expand_window: int = 0,
+    ) -> List[RetrievalResult]:
+        queries = list(queries)
+        if not queries:
+            return []
+        allowed = self.corpus.resolve_filter(doc_filter) if doc_filter is not None else None
+        h1_candidates = self.search_h1(queries, top_h1, allowed)
+        detailed = [needs_detail(query) for query in queries]
+        replies = self.broadcast(
+            "detail", [(queries, h1_candidates, detailed, top_h2)] * self.shards
+        )
+        h2_results: List[Optional[List[Tuple[H2Node, float]]]] = []
+        for position, flag in enumerate(detailed):
+            if not flag:
+                h2_results.append(None)
+                continue
+            best: Dict[str, VectorHit] = {}
+            for reply in replies:
+                for hit in reply[position][1]:
+                    # A child shared by H1s on different shards keeps its earliest scope position.
+                    seen = best.get(hit[3].node_id)
+                    if seen is None or hit[1:3] < seen[1:3]:
+                        best[hit[3].node_id] = hit
+            hits = heapq.nsmallest(
+                top_h2, best.values(), key=lambda hit: (-hit[0], hit[1], hit[2])
+            )
+            h2_results.append([(node, score) for score, _, _, node in hits])
+        if expand_window > 0:
+            h2_results = self.expand(h2_results, expand_window)
+
+        results = []
+        for position, query in enumerate(queries):
+            if h2_results[position] is not None:
+                chunks = [h2_chunk(node, score) for node, score in h2_results[position]]
+            else:
+                h1_nodes: Dict[str, H1Node] = {}
+                for reply in replies:
+                    h1_nodes.update(reply[position][0])
+                chunks = [
+                    h1_chunk(h1_nodes[h1_id])
+                    for h1_id in h1_candidates[position]
+                    if h1_id in h1_nodes
+                ]
+            results.append(
+                RetrievalResult(
+                    query=query,
+                    h1_candidates=h1_candidates[position],
+                    chunks=chunks,
+                    citations=format_citations(chunks),
+                )
+            )
+        return results
+
+    def search_h1(
+        self, queries: List[str], top_k: int, allowed: Optional[Collection[str]]
+    ) -> List[List[str]]:
+        if allowed is None:
+            scoped: List[Optional[Set[str]]] = [None] * self.shards
+        else:
+            scoped = [set() for _ in range(self.shards)]
+            for h1_id in allowed:
+                shard_id = self.owner.get(h1_id)
+                if shard_id is not None:
+                    scoped[shard_id].add(h1_id)
+        stats = self.query_stats(queries)
+        replies = self.broadcast(
+            "bm25", [(queries, top_k, shard_allowed, stats) for shard_allowed in scoped]
+        )
+        merged = []
+        for position in range(len(queries)):
+            hits = heapq.nsmallest(
+                top_k,
+                (hit for reply in replies for hit in reply[position]),
+                key=lambda hit: (-hit[0], hit[1]),
+            )
+            merged.append([node_id for _, _, node_id in hits])
+        return merged
+
+    def expand(
+        self, h2_results: List[Optional[List[Tuple[H2Node, float]]]], window: int
+    ) -> List[Optional[List[Tuple[H2Node, float]]]]:
+        requests: List[List[List[str]]] = [[[] for _ in h2_results] for _ in range(self.shards)]
+        for position, hits in enumerate(h2_results):
+            for node, _ in hits or ():
+                requests[self.owner[node.parent]][position].append(node.node_id)
+        replies = self.broadcast("expand", [(ids, window) for ids in requests])
+        expanded: List[Optional[List[Tuple[H2Node, float]]]] = []
+        for position, hits in enumerate(h2_results):
+            if hits is None:
+                expanded.append(None)
+                continue
+            siblings: Dict[str, List[H2Node]] = {}
+            for reply in replies:
+                siblings.update(reply[position])
+            scores = {node.node_id: score for node, score in hits}
+            nodes = {node.node_id: node for node, _ in hits}
+            for node, _ in hits:
+                for sibling in siblings[node.node_id]:
+                    nodes.setdefault(sibling.node_id, sibling)
+            ordered = dedupe_preserve_order(
+                sibling.node_id for node, _ in hits for sibling in siblings[node.node_id]
+            )
+            expanded.append([(nodes[h2_id], scores.get(h2_id, 0.0)) for h2_id in ordered])
+        return expanded
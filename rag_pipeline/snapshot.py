@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import json
+import mmap
+import os
+import struct
+import sys
+import zlib
+from array import array
+from typing import Any, Dict, List, Sequence, Tuple
+
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+PREFIX = struct.Struct("<8sIIQI")
+
+
+class SnapshotError(ValueError):
+    pass
+
+
+def to_little_endian(values: array) -> bytes:
+    if sys.byteorder == "little":
+        return values.tobytes()
+    swapped = array(values.typecode, values)
+    swapped.byteswap()
+    return swapped.tobytes()
+
+
+def from_little_endian(typecode: str, payload: bytes) -> array:
+    values = array(typecode)
+    values.frombytes(payload)
+    if sys.byteorder != "little":
+        values.byteswap()
+    return values
+
+
+def _pad(size: int) -> int:
+    return (-size) % ALIGNMENT
+
+
+class SnapshotWriter:
+    def __init__(self, magic: bytes, header: Dict[str, Any]) -> None:
+        self.magic = magic.ljust(8, b"\0")
+        self.header = dict(header)
+        self.sections: List[Tuple[str, str, bytes]] = []
+
+    def add_array(self, name: str, values: array) -> None:
+        self.sections.append((name, values.typecode, to_little_endian(values)))
+
+    def add_bytes(self, name: str, payload: bytes, typecode: str = "B") -> None:
+        self.sections.append((name, typecode, payload))
+
+    def add_strings(self, name: str, values: Sequence[str]) -> None:
+        encoded = [value.encode("utf-8") for value in values]
+        self.add_array(f"{name}.lengths", array("I", (len(item) for item in encoded)))
+        self.add_bytes(f"{name}.data", b"".join(encoded))
+
+    def write(self, path: str) -> None:
+        table = {}
+        offset = 0
+        for name, typecode, payload in self.sections:
+            table[name] = [offset, len(payload), typecode]
+            offset += len(payload) + _pad(len(payload))
+        header = dict(self.header, sections=table)
+        header_bytes = json.dumps(header, sort_keys=True).encode("utf-8")
+        body_start = PREFIX.size + len(header_bytes)
+        body_start += _pad(body_start)
+
+        checksum = zlib.crc32(header_bytes)
+        for _, _, payload in self.sections:
+            checksum = zlib.crc32(payload, checksum)
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as handle:
+            handle.write(
+                PREFIX.pack(self.magic, FORMAT_VERSION, len(header_bytes), body_start, checksum)
+            )
+            handle.write(header_bytes)
+            handle.write(b"\0" * (body_start - PREFIX.size - len(header_bytes)))
+            for _, _, payload in self.sections:
+                handle.write(payload)
+                handle.write(b"\0" * _pad(len(payload)))
+        os.replace(tmp_path, path)
+
+
+class SnapshotReader:
+    def __init__(self, path: str, magic: bytes, verify: bool = True) -> None:
+        self.path = path
+        with open(path, "rb") as handle:
+            if os.fstat(handle.fileno()).st_size < PREFIX.size:
+                raise SnapshotError(f"{path}: truncated snapshot")
+            # Mapped read-only: worker processes share the pages through the OS page cache.
+            self.buffer = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        file_magic, version, header_len, body_start, checksum = PREFIX.unpack_from(self.buffer)
+        if file_magic != magic.ljust(8, b"\0"):
+            raise SnapshotError(f"{path}: not a {magic.decode().rstrip(chr(0))} snapshot")
+        if version != FORMAT_VERSION:
+            raise SnapshotError(
+                f"{path}: snapshot format version {version}, expected {FORMAT_VERSION}"
+            )
+        header_bytes = self.buffer[PREFIX.size : PREFIX.size + header_len]
+        self.header: Dict[str, Any] = json.loads(header_bytes.decode("utf-8"))
+        self.body_start = body_start
+        self.sections: Dict[str, List[Any]] = self.header["sections"]
+        if verify:
+            actual = zlib.crc32(header_bytes)
+            for name in sorted(self.sections, key=lambda item: self.sections[item][0]):
+                actual = zlib.crc32(self.raw(name), actual)
+            if actual != checksum:
+                raise SnapshotError(f"{path}: checksum mismatch, snapshot is corrupt or stale")
+
+    def offset(self, name: str) -> int:
+        try:
+            return self.body_start + self.sections[name][0]
+        except KeyError:
+            raise SnapshotError(f"{self.path}: missing section {name!r}") from None
+
+    def raw(self, name: str) -> memoryview:
+        start = self.offset(name)
+        end = start + self.sections[name][1]
+        if end > len(self.buffer):
+            raise SnapshotError(f"{self.path}: truncated section {name!r}")
+        return memoryview(self.buffer)[start:end]
+
+    def array(self, name: str) -> array:
+        return from_little_endian(self.sections[name][2], self.raw(name))
+
+    def strings(self, name: str) -> List[str]:
+        lengths = self.array(f"{name}.lengths")
+        data = bytes(self.raw(f"{name}.data"))
+        values = []
+        position = 0
+        for length in lengths:
+            values.append(data[position : position + length].decode("utf-8"))
+            position += length
+        return values
+
+    def expect(self, key: str, value: Any) -> None:
+        if self.header.get(key) != value:
+            raise SnapshotError(
+                f"{self.path}: snapshot {key} is {self.header.get(key)!r}, expected {value!r}"
+            )
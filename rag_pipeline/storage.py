@@ -1,81 +1,304 @@
 from __future__ import annotations
 
-from dataclasses import asdict
-from typing import Dict, List
+from array import array
+from collections import OrderedDict
+from dataclasses import asdict, replace
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    MutableMapping,
+    Optional,
+    Sequence,
+    Tuple,
+)
 
-from pymongo import MongoClient
+from bson import Binary
+from pymongo import MongoClient, UpdateOne
 
 from rag_pipeline.schemas import DocumentRoot, H1Node, H2Node, TreeIndex
+from rag_pipeline.snapshot import from_little_endian, to_little_endian
+
+if TYPE_CHECKING:
+    from rag_pipeline.incremental import TreeChangeset
+
+_MISSING = object()
+
+
+class MissingTextError(LookupError):
+    pass
 
 
 class MongoTreeStore:
-    def __init__(self, uri: str, db_name: str = "legal_rag") -> None:
-        self.client = MongoClient(uri)
+    def __init__(
+        self,
+        uri: str,
+        db_name: str = "legal_rag",
+        client: Optional[Any] = None,
+        batch_size: int = 1000,
+    ) -> None:
+        self.client = client if client is not None else MongoClient(uri)
         self.db = self.client[db_name]
         self.documents = self.db.documents
         self.h1_nodes = self.db.h1_nodes
         self.h2_nodes = self.db.h2_nodes
         self.lookup = self.db.lookup
+        self.batch_size = batch_size
+        self.indexes_ready = False
 
     def ensure_indexes(self) -> None:
+        if self.indexes_ready:
+            return
         self.documents.create_index("doc_id", unique=True)
         self.h1_nodes.create_index([("doc_id", 1), ("node_id", 1)], unique=True)
         self.h2_nodes.create_index([("doc_id", 1), ("node_id", 1)], unique=True)
         self.h2_nodes.create_index([("doc_id", 1), ("parent", 1)])
         self.lookup.create_index([("doc_id", 1), ("h1_id", 1)], unique=True)
+        self.indexes_ready = True
 
     def save_tree(self, doc_root: DocumentRoot, tree: TreeIndex) -> None:
+        self.save_trees([(doc_root, tree)])
+
+    def save_trees(self, trees: Iterable[Tuple[DocumentRoot, TreeIndex]]) -> None:
         self.ensure_indexes()
-        self.documents.update_one(
-            {"doc_id": doc_root.doc_id},
-            {"$set": {"doc_id": doc_root.doc_id, "pdf_name": doc_root.pdf_name}},
-            upsert=True,
-        )
-        for h1 in tree.h1_nodes.values():
-            payload = asdict(h1)
-            payload["doc_id"] = doc_root.doc_id
-            self.h1_nodes.update_one(
-                {"doc_id": doc_root.doc_id, "node_id": h1.node_id},
-                {"$set": payload},
-                upsert=True,
-            )
-        for h2 in tree.h2_nodes.values():
-            payload = asdict(h2)
-            payload["doc_id"] = doc_root.doc_id
-            self.h2_nodes.update_one(
-                {"doc_id": doc_root.doc_id, "node_id": h2.node_id},
-                {"$set": payload},
-                upsert=True,
+        documents: List[UpdateOne] = []
+        h1_ops: List[UpdateOne] = []
+        h2_ops: List[UpdateOne] = []
+        lookup_ops: List[UpdateOne] = []
+        for doc_root, tree in trees:
+            doc_id = doc_root.doc_id
+            documents.append(
+                UpdateOne(
+                    {"doc_id": doc_id},
+                    {"$set": {"doc_id": doc_id, "pdf_name": doc_root.pdf_name}},
+                    upsert=True,
+                )
             )
-        for h1_id, entry in tree.lookup.items():
-            self.lookup.update_one(
-                {"doc_id": doc_root.doc_id, "h1_id": h1_id},
-                {"$set": {"doc_id": doc_root.doc_id, "h1_id": h1_id, **entry}},
-                upsert=True,
+            h1_ops.extend(_h1_upsert(doc_id, h1) for h1 in tree.h1_nodes.values())
+            h2_ops.extend(_h2_upsert(doc_id, h2) for h2 in tree.h2_nodes.values())
+            lookup_ops.extend(
+                _lookup_upsert(doc_id, h1_id, entry) for h1_id, entry in tree.lookup.items()
             )
+        self._bulk(self.documents, documents)
+        self._bulk(self.h1_nodes, h1_ops)
+        self._bulk(self.h2_nodes, h2_ops)
+        self._bulk(self.lookup, lookup_ops)
+
+    def apply_changeset(self, doc_root: DocumentRoot, changeset: TreeChangeset) -> None:
+        self.ensure_indexes()
+        doc_id = doc_root.doc_id
+        if changeset.removed_h1:
+            self.h1_nodes.delete_many({"doc_id": doc_id, "node_id": {"$in": changeset.removed_h1}})
+            self.lookup.delete_many({"doc_id": doc_id, "h1_id": {"$in": changeset.removed_h1}})
+        if changeset.removed_h2:
+            self.h2_nodes.delete_many({"doc_id": doc_id, "node_id": {"$in": changeset.removed_h2}})
+        self._bulk(self.h1_nodes, [_h1_upsert(doc_id, h1) for h1 in changeset.upserted_h1])
+        self._bulk(
+            self.lookup,
+            [
+                _lookup_upsert(doc_id, h1.node_id, {"summary": h1.summary, "children": h1.children})
+                for h1 in changeset.upserted_h1
+            ],
+        )
+        self._bulk(self.h2_nodes, [_h2_upsert(doc_id, h2) for h2 in changeset.upserted_h2])
 
-    def load_tree(self, doc_id: str) -> TreeIndex:
-        h1_nodes: Dict[str, H1Node] = {}
-        h2_nodes: Dict[str, H2Node] = {}
-        lookup: Dict[str, Dict[str, List[str]]] = {}
+    def _bulk(self, collection: Any, operations: List[UpdateOne]) -> None:
+        for start in range(0, len(operations), self.batch_size):
+            collection.bulk_write(operations[start : start + self.batch_size], ordered=False)
 
-        for record in self.h1_nodes.find({"doc_id": doc_id}):
-            record.pop("_id", None)
-            record.pop("doc_id", None)
+    def load_tree(self, doc_id: str, lazy: bool = False, cache_size: int = 1024) -> TreeIndex:
+        return self.load_trees([doc_id], lazy=lazy, cache_size=cache_size)[doc_id]
+
+    def load_trees(
+        self, doc_ids: Sequence[str], lazy: bool = False, cache_size: int = 1024
+    ) -> Dict[str, TreeIndex]:
+        doc_ids = list(doc_ids)
+        h2_nodes: Dict[str, Dict[str, H2Node]] = {doc_id: {} for doc_id in doc_ids}
+        trees = {
+            doc_id: TreeIndex(h1_nodes={}, h2_nodes=h2_nodes[doc_id], lookup={})
+            for doc_id in doc_ids
+        }
+        query = {"doc_id": {"$in": doc_ids}}
+
+        for record in self.h1_nodes.find(query, {"_id": 0}):
+            doc_id = record.pop("doc_id")
             h1_node = H1Node(**record)
-            h1_nodes[h1_node.node_id] = h1_node
+            trees[doc_id].h1_nodes[h1_node.node_id] = h1_node
 
-        for record in self.h2_nodes.find({"doc_id": doc_id}):
-            record.pop("_id", None)
-            record.pop("doc_id", None)
-            h2_node = H2Node(**record)
-            h2_nodes[h2_node.node_id] = h2_node
+        projection = {"_id": 0, "text": 0} if lazy else {"_id": 0}
+        for record in self.h2_nodes.find(query, projection):
+            doc_id = record.pop("doc_id")
+            record["embedding"] = _decode_embedding(record.get("embedding"))
+            h2_node = H2Node(text=record.pop("text", ""), **record)
+            h2_nodes[doc_id][h2_node.node_id] = h2_node
 
-        for record in self.lookup.find({"doc_id": doc_id}):
-            record.pop("_id", None)
-            record.pop("doc_id", None)
+        for record in self.lookup.find(query, {"_id": 0}):
+            doc_id = record.pop("doc_id")
             h1_id = record.pop("h1_id")
-            lookup[h1_id] = record
+            trees[doc_id].lookup[h1_id] = record
+
+        if lazy:
+            trees = {
+                doc_id: replace(
+                    tree, h2_nodes=LazyH2Nodes(self, doc_id, h2_nodes[doc_id], cache_size)
+                )
+                for doc_id, tree in trees.items()
+            }
+        return trees
+
+    def fetch_texts(self, doc_id: str, node_ids: Sequence[str]) -> Dict[str, str]:
+        query = {"doc_id": doc_id, "node_id": {"$in": list(node_ids)}}
+        return {
+            record["node_id"]: record["text"]
+            for record in self.h2_nodes.find(query, {"_id": 0, "node_id": 1, "text": 1})
+        }
+
+
+class LazyH2Nodes(MutableMapping[str, H2Node]):
+    def __init__(
+        self,
+        store: MongoTreeStore,
+        doc_id: str,
+        skeletons: Dict[str, H2Node],
+        cache_size: int = 1024,
+    ) -> None:
+        self.store = store
+        self.doc_id = doc_id
+        self.skeletons = skeletons
+        self.cache_size = max(1, cache_size)
+        self.texts: OrderedDict[str, str] = OrderedDict()
+        self.pinned: Dict[str, H2Node] = {}
+        self.fetches = 0
+
+    def __getitem__(self, node_id: str) -> H2Node:
+        node = self.pinned.get(node_id)
+        if node is not None:
+            return node
+        skeleton = self.skeletons[node_id]
+        text = self.texts.get(node_id)
+        if text is None:
+            text = self._fetch([node_id]).get(node_id)
+            if text is None:
+                raise self._missing_text(node_id)
+        else:
+            self.texts.move_to_end(node_id)
+        return replace(skeleton, text=text)
+
+    def __setitem__(self, node_id: str, node: H2Node) -> None:
+        self.pinned[node_id] = node
+        self.skeletons[node_id] = replace(node, text="")
+        self.texts.pop(node_id, None)
+
+    def __delitem__(self, node_id: str) -> None:
+        del self.skeletons[node_id]
+        self.pinned.pop(node_id, None)
+        self.texts.pop(node_id, None)
+
+    def __contains__(self, node_id: object) -> bool:
+        # Membership is answered from the skeletons; Mapping's default would fetch the text.
+        return node_id in self.skeletons
+
+    def pop(self, node_id: str, default: Any = _MISSING) -> Any:
+        # Removal never needs the text, so an uncached section comes back as its skeleton.
+        if node_id not in self.skeletons:
+            if default is _MISSING:
+                raise KeyError(node_id)
+            return default
+        skeleton = self.skeletons.pop(node_id)
+        node = self.pinned.pop(node_id, None)
+        text = self.texts.pop(node_id, None)
+        if node is not None:
+            return node
+        return skeleton if text is None else replace(skeleton, text=text)
+
+    def get(self, node_id: str, default: Optional[H2Node] = None) -> Optional[H2Node]:
+        if node_id not in self.skeletons:
+            return default
+        return self[node_id]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.skeletons)
+
+    def __len__(self) -> int:
+        return len(self.skeletons)
+
+    def prefetch(self, node_ids: Iterable[str]) -> None:
+        missing = [
+            node_id
+            for node_id in node_ids
+            if node_id in self.skeletons and node_id not in self.pinned and node_id not in self.texts
+        ]
+        if missing:
+            self._fetch(missing)
+
+    def values(self) -> List[H2Node]:  # type: ignore[override]
+        return [node for _, node in self.items()]
+
+    def items(self) -> List[Tuple[str, H2Node]]:  # type: ignore[override]
+        node_ids = list(self.skeletons)
+        items = []
+        for start in range(0, len(node_ids), self.store.batch_size):
+            batch = node_ids[start : start + self.store.batch_size]
+            fetched = self._fetch([node_id for node_id in batch if node_id not in self.pinned])
+            for node_id in batch:
+                node = self.pinned.get(node_id)
+                if node is None:
+                    if node_id not in fetched:
+                        raise self._missing_text(node_id)
+                    node = replace(self.skeletons[node_id], text=fetched[node_id])
+                items.append((node_id, node))
+        return items
+
+    def _missing_text(self, node_id: str) -> MissingTextError:
+        return MissingTextError(
+            f"{self.doc_id}: H2 node {node_id!r} has no text in the store, reload the tree"
+        )
+
+    def _fetch(self, node_ids: List[str]) -> Dict[str, str]:
+        if not node_ids:
+            return {}
+        self.fetches += 1
+        fetched = self.store.fetch_texts(self.doc_id, node_ids)
+        for node_id, text in fetched.items():
+            self.texts[node_id] = text
+            self.texts.move_to_end(node_id)
+        while len(self.texts) > self.cache_size:
+            self.texts.popitem(last=False)
+        return fetched
+
+
+def _h1_upsert(doc_id: str, h1: H1Node) -> UpdateOne:
+    payload = asdict(h1)
+    payload["doc_id"] = doc_id
+    return UpdateOne({"doc_id": doc_id, "node_id": h1.node_id}, {"$set": payload}, upsert=True)
+
+
+def _h2_upsert(doc_id: str, h2: H2Node) -> UpdateOne:
+    payload = asdict(h2)
+    payload["doc_id"] = doc_id
+    payload["embedding"] = _encode_embedding(h2.embedding)
+    return UpdateOne({"doc_id": doc_id, "node_id": h2.node_id}, {"$set": payload}, upsert=True)
+
+
+def _lookup_upsert(doc_id: str, h1_id: str, entry: Dict[str, Any]) -> UpdateOne:
+    return UpdateOne(
+        {"doc_id": doc_id, "h1_id": h1_id},
+        {"$set": {"doc_id": doc_id, "h1_id": h1_id, **entry}},
+        upsert=True,
+    )
+
+
+def _encode_embedding(embedding: Optional[List[float]]) -> Optional[Binary]:
+    if embedding is None:
+        return None
+    return Binary(to_little_endian(array("f", embedding)))
 
-        return TreeIndex(h1_nodes=h1_nodes, h2_nodes=h2_nodes, lookup=lookup)
 
+def _decode_embedding(value: Any) -> Optional[List[float]]:
+    if value is None or isinstance(value, list):
+        # Documents written before embeddings were packed still hold arrays of doubles.
+        return value
+    return from_little_endian("f", bytes(value)).tolist()
@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import hashlib
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Sequence
+
+from rag_pipeline.llm import LlmSummarizer
+
+EXTRACTIVE_TEMPLATE = "extractive:summarize_text"
+
+
+def summary_key(text: str, template: str, model: str) -> str:
+    digest = hashlib.sha256()
+    for part in (template, model, text):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class SummaryCache:
+    def __init__(
+        self,
+        path: str,
+        template: str = EXTRACTIVE_TEMPLATE,
+        model: str = "",
+        max_entries: int = 100_000,
+    ) -> None:
+        self.path = path
+        self.template = template
+        self.model = model
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS summaries ("
+                "key TEXT PRIMARY KEY, summary TEXT NOT NULL, last_used INTEGER NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS summaries_last_used ON summaries (last_used)"
+            )
+
+    @classmethod
+    def for_summarizer(
+        cls, path: str, summarizer: Optional[LlmSummarizer], max_entries: int = 100_000
+    ) -> "SummaryCache":
+        if summarizer is None:
+            return cls(path, max_entries=max_entries)
+        return cls(
+            path,
+            template=summarizer.config.summary_template,
+            model=summarizer.config.model or "",
+            max_entries=max_entries,
+        )
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Connections are per process; workers reopen the same database file.
+        return {
+            "path": self.path,
+            "template": self.template,
+            "model": self.model,
+            "max_entries": self.max_entries,
+        }
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__init__(**state)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM summaries").fetchone()[0]
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+    def key(self, text: str) -> str:
+        return summary_key(text, self.template, self.model)
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[str]]:
+        keys = [self.key(text) for text in texts]
+        found: Dict[str, str] = {}
+        with self._lock, self._conn:
+            for start in range(0, len(keys), 500):
+                chunk = keys[start : start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, summary FROM summaries WHERE key IN ({placeholders})", chunk
+                )
+                found.update(rows)
+            if found:
+                tick = self._next_tick()
+                self._conn.executemany(
+                    "UPDATE summaries SET last_used = ? WHERE key = ?",
+                    [(tick, key) for key in found],
+                )
+        results = [found.get(key) for key in keys]
+        hits = sum(1 for result in results if result is not None)
+        self.hits += hits
+        self.misses += len(results) - hits
+        return results
+
+    def put_many(self, texts: Sequence[str], summaries: Sequence[str]) -> None:
+        with self._lock, self._conn:
+            tick = self._next_tick()
+            rows = [(self.key(text), summary, tick) for text, summary in zip(texts, summaries)]
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO summaries (key, summary, last_used) VALUES (?, ?, ?)", rows
+            )
+            count = self._conn.execute("SELECT COUNT(*) FROM summaries").fetchone()[0]
+            overflow = count - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM summaries WHERE key IN "
+                    "(SELECT key FROM summaries ORDER BY last_used ASC LIMIT ?)",
+                    (overflow,),
+                )
+                self.evictions += overflow
+
+    def _next_tick(self) -> int:
+        # A logical clock keeps LRU order exact even when wall-clock timestamps collide.
+        current = self._conn.execute("SELECT MAX(last_used) FROM summaries").fetchone()[0]
+        return (current or 0) + 1
+
+    def close(self) -> None:
+        self._conn.close()
@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+import bisect
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Protocol, Sequence, Tuple
+
+SECONDS_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+    0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 5000, 10000)
+
+
+class Tracer(Protocol):
+    def on_span(self, stage: str, seconds: float, attributes: Dict[str, Any]) -> None:
+        ...
+
+
+class Span:
+    __slots__ = ("tracer", "stage", "attributes", "started")
+
+    def __init__(self, tracer: Tracer, stage: str) -> None:
+        self.tracer = tracer
+        self.stage = stage
+        self.attributes: Dict[str, Any] = {}
+        self.started = 0.0
+
+    def __enter__(self) -> Span:
+        self.started = time.perf_counter()
+        return self
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def __exit__(self, *exc_info: object) -> None:
+        seconds = time.perf_counter() - self.started
+        if exc_info[0] is not None:
+            self.attributes["error"] = exc_info[0].__name__
+        self.tracer.on_span(self.stage, seconds, self.attributes)
+
+
+class NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> NoopSpan:
+        return self
+
+    def set(self, **attributes: Any) -> None:
+        pass
+
+    def __exit__(self, *exc_info: object) -> None:
+        pass
+
+
+NOOP_SPAN = NoopSpan()
+
+
+def span(tracer: Optional[Tracer], stage: str) -> Any:
+    # Disabled tracing hands back one shared no-op span: no clock reads, no allocation.
+    if tracer is None:
+        return NOOP_SPAN
+    return Span(tracer, stage)
+
+
+class CallbackTracer:
+    def __init__(self, callback: Callable[[str, float, Dict[str, Any]], None]) -> None:
+        self.callback = callback
+
+    def on_span(self, stage: str, seconds: float, attributes: Dict[str, Any]) -> None:
+        self.callback(stage, seconds, dict(attributes))
+
+
+class FanoutTracer:
+    def __init__(self, *tracers: Tracer) -> None:
+        self.tracers = tracers
+
+    def on_span(self, stage: str, seconds: float, attributes: Dict[str, Any]) -> None:
+        for tracer in self.tracers:
+            tracer.on_span(stage, seconds, attributes)
+
+
+class Histogram:
+    def __init__(self, buckets: Sequence[float]) -> None:
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        running = 0
+        rows = []
+        for bound, count in zip(self.buckets, self.counts):
+            running += count
+            rows.append((format_bound(bound), running))
+        rows.append(("+Inf", self.count))
+        return rows
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "buckets": dict(self.cumulative()),
+        }
+
+
+class MetricsRegistry:
+    def __init__(
+        self,
+        namespace: str = "rag",
+        seconds_buckets: Sequence[float] = SECONDS_BUCKETS,
+        count_buckets: Sequence[float] = COUNT_BUCKETS,
+    ) -> None:
+        self.namespace = namespace
+        self.seconds_buckets = seconds_buckets
+        self.count_buckets = count_buckets
+        self.histograms: Dict[Tuple[str, str], Histogram] = {}
+        self.errors: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def on_span(self, stage: str, seconds: float, attributes: Dict[str, Any]) -> None:
+        with self._lock:
+            self._histogram("stage_seconds", stage, self.seconds_buckets).observe(seconds)
+            for name, value in attributes.items():
+                if name == "error":
+                    self.errors[stage] = self.errors.get(stage, 0) + 1
+                elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                    self._histogram(name, stage, self.count_buckets).observe(value)
+
+    def _histogram(self, metric: str, stage: str, buckets: Sequence[float]) -> Histogram:
+        key = (metric, stage)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram(buckets)
+        return histogram
+
+    def to_json(self) -> Dict[str, Any]:
+        with self._lock:
+            metrics: Dict[str, Any] = {}
+            for (metric, stage), histogram in sorted(self.histograms.items()):
+                metrics.setdefault(metric, {})[stage] = histogram.to_json()
+            if self.errors:
+                metrics["errors"] = dict(self.errors)
+            return metrics
+
+    def to_prometheus(self) -> str:
+        with self._lock:
+            lines: List[str] = []
+            by_metric: Dict[str, List[Tuple[str, Histogram]]] = {}
+            for (metric, stage), histogram in sorted(self.histograms.items()):
+                by_metric.setdefault(metric, []).append((stage, histogram))
+            for metric, series in by_metric.items():
+                name = f"{self.namespace}_{metric}"
+                lines.append(f"# TYPE {name} histogram")
+                for stage, histogram in series:
+                    for bound, count in histogram.cumulative():
+                        lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {count}')
+                    lines.append(f'{name}_sum{{stage="{stage}"}} {histogram.total!r}')
+                    lines.append(f'{name}_count{{stage="{stage}"}} {histogram.count}')
+            if self.errors:
+                name = f"{self.namespace}_stage_errors_total"
+                lines.append(f"# TYPE {name} counter")
+                for stage, count in sorted(self.errors.items()):
+                    lines.append(f'{name}{{stage="{stage}"}} {count}')
+            return "\n".join(lines) + "\n"
+
+
+def find_registry(tracer: Optional[Tracer]) -> Optional[MetricsRegistry]:
+    if isinstance(tracer, MetricsRegistry):
+        return tracer
+    if isinstance(tracer, FanoutTracer):
+        for child in tracer.tracers:
+            registry = find_registry(child)
+            if registry is not None:
+                return registry
+    return None
+
+
+def format_bound(bound: float) -> str:
+    return repr(float(bound)) if bound != int(bound) else f"{bound:g}"
@@ -1,8 +1,10 @@
 from __future__ import annotations
 
+import hashlib
 import math
 import re
 from collections import Counter
+from functools import lru_cache
 from typing import Iterable, List
 
 
@@ -24,11 +26,17 @@ def cosine_similarity(a: List[float], b: List[float]) -> float:
     return dot / (norm_a * norm_b)
 
 
+@lru_cache(maxsize=65536)
+def stable_hash(token: str) -> int:
+    # Built-in hash() is salted per process; embeddings must agree across workers and restarts.
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+
+
 def hash_embedding(text: str, dim: int = 256) -> List[float]:
     counts = Counter(tokenize(text))
     vector = [0.0] * dim
     for token, count in counts.items():
-        slot = hash(token) % dim
+        slot = stable_hash(token) % dim
         vector[slot] += float(count)
     return vector
 
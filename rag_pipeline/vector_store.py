@@ -0,0 +1,217 @@
+from __future__ import annotations
+
+from operator import itemgetter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ModuleNotFoundError:
+    np = None
+
+
+def require_numpy() -> None:
+    if np is None:
+        raise ModuleNotFoundError("numpy is required for the matrix-backed VectorIndex")
+
+
+def normalize(vector: Sequence[float]) -> "np.ndarray":
+    array = np.asarray(vector, dtype=np.float32)
+    norm = float(np.linalg.norm(array))
+    if norm == 0.0:
+        return array
+    return array / norm
+
+
+class NumpyVectorStore:
+    def __init__(self, dim: int, capacity: int = 1024) -> None:
+        require_numpy()
+        self.dim = dim
+        self.matrix = np.zeros((max(capacity, 1), dim), dtype=np.float32)
+        self.rows: Dict[str, int] = {}
+        self.ids: List[str] = []
+        self.row_scale: Optional["np.ndarray"] = None
+        self.mapped = False
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, node_id: str) -> bool:
+        return node_id in self.rows
+
+    def set(self, node_id: str, embedding: Sequence[float]) -> None:
+        if len(embedding) != self.dim:
+            raise ValueError(f"expected embedding of dim {self.dim}, got {len(embedding)}")
+        self.materialize()
+        row = self._allocate(node_id)
+        self.matrix[row] = normalize(embedding)
+
+    def _allocate(self, node_id: str) -> int:
+        row = self.rows.get(node_id)
+        if row is None:
+            row = len(self.ids)
+            if row == self.matrix.shape[0]:
+                self._grow(row * 2)
+            self.rows[node_id] = row
+            self.ids.append(node_id)
+        return row
+
+    def _grow(self, capacity: int) -> None:
+        grown = np.zeros((capacity, self.dim), dtype=self.matrix.dtype)
+        grown[: len(self.ids)] = self.matrix[: len(self.ids)]
+        self.matrix = grown
+
+    def load_block(
+        self,
+        node_ids: Sequence[str],
+        vectors: memoryview,
+        normalized: bool = False,
+        mapped: bool = False,
+    ) -> None:
+        block = np.frombuffer(vectors, dtype="<f4").reshape(len(node_ids), self.dim)
+        self.ids = list(node_ids)
+        self.rows = {node_id: row for row, node_id in enumerate(self.ids)}
+        self.row_scale = None
+        if mapped:
+            # Keep the read-only view over the snapshot mapping; unnormalized rows get a
+            # per-row scale instead of a normalized in-memory copy.
+            self.matrix = block
+            self.mapped = True
+            if not normalized:
+                norms = np.linalg.norm(block, axis=1)
+                self.row_scale = (1.0 / np.where(norms == 0.0, 1.0, norms)).astype(np.float32)
+            return
+        self.mapped = False
+        self.matrix = np.zeros((max(len(node_ids), 1), self.dim), dtype=np.float32)
+        self.matrix[: len(node_ids)] = block
+        if not normalized:
+            norms = np.linalg.norm(block, axis=1, keepdims=True)
+            self.matrix[: len(node_ids)] /= np.where(norms == 0.0, 1.0, norms)
+
+    def materialize(self) -> None:
+        if not self.mapped and self.row_scale is None:
+            return
+        count = len(self.ids)
+        matrix = np.zeros((max(count * 2, 1), self.dim), dtype=np.float32)
+        matrix[:count] = self.matrix[:count]
+        if self.row_scale is not None:
+            matrix[:count] *= self.row_scale[:, None]
+        self.matrix = matrix
+        self.row_scale = None
+        self.mapped = False
+
+    def subset(self, node_ids: Sequence[str]) -> NumpyVectorStore:
+        kept = [node_id for node_id in node_ids if node_id in self.rows]
+        rows = np.array([self.rows[node_id] for node_id in kept], dtype=np.intp)
+        store = NumpyVectorStore(self.dim, capacity=len(kept))
+        # Rows are copied as stored, so the subset scores them bit-for-bit like this store.
+        store.matrix[: len(kept)] = self.matrix[rows]
+        if self.row_scale is not None:
+            store.row_scale = self.row_scale[rows]
+        store.ids = kept
+        store.rows = {node_id: row for row, node_id in enumerate(kept)}
+        return store
+
+    def remove(self, node_id: str) -> bool:
+        if node_id not in self.rows:
+            return False
+        self.materialize()
+        row = self.rows.pop(node_id)
+        last = len(self.ids) - 1
+        last_id = self.ids.pop()
+        if row != last:
+            self.matrix[row] = self.matrix[last]
+            self.ids[row] = last_id
+            self.rows[last_id] = row
+        self.matrix[last] = 0.0
+        return True
+
+    def scope_rows(self, scope: Sequence[str]) -> Tuple["np.ndarray", "np.ndarray"]:
+        if not scope:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+        try:
+            rows = itemgetter(*scope)(self.rows)
+        except KeyError:
+            positions = [pos for pos, node_id in enumerate(scope) if node_id in self.rows]
+            rows = [self.rows[scope[pos]] for pos in positions]
+            return np.asarray(rows, dtype=np.intp), np.asarray(positions, dtype=np.intp)
+        if len(scope) == 1:
+            rows = (rows,)
+        return np.asarray(rows, dtype=np.intp), np.arange(len(scope), dtype=np.intp)
+
+    def search(
+        self, query_embedding: Sequence[float], scope: Sequence[str], top_k: int
+    ) -> List[Tuple[str, float]]:
+        return self.search_many([query_embedding], scope, top_k)[0]
+
+    def search_many(
+        self, query_embeddings: Sequence[Sequence[float]], scope: Sequence[str], top_k: int
+    ) -> List[List[Tuple[str, float]]]:
+        rows, positions = self.scope_rows(scope)
+        if top_k <= 0 or rows.size == 0 or not query_embeddings:
+            return [[] for _ in query_embeddings]
+        queries = np.stack([normalize(query) for query in query_embeddings])
+        approx = self.approx_scores(rows, queries)
+        return [
+            self._rank(approx[:, col], queries[col], rows, positions, scope, top_k)
+            for col in range(queries.shape[0])
+        ]
+
+    def approx_scores(self, rows: "np.ndarray", queries: "np.ndarray") -> "np.ndarray":
+        if rows.size * 4 >= len(self.ids):
+            # Wide scopes: one pass over the live block beats copying most of it in a gather.
+            approx = (self.matrix[: len(self.ids)] @ queries.T)[rows]
+        else:
+            approx = self.matrix[rows] @ queries.T
+        if self.row_scale is not None:
+            approx = approx * self.row_scale[rows, None]
+        return approx
+
+    def vectors(self) -> "np.ndarray":
+        block = self.matrix[: len(self.ids)]
+        if self.row_scale is not None:
+            block = block * self.row_scale[:, None]
+        return block
+
+    def memory_bytes(self) -> int:
+        # Mapped rows live in the page cache, not on the heap.
+        matrix = 0 if self.mapped else self.matrix.nbytes
+        return matrix + (self.row_scale.nbytes if self.row_scale is not None else 0)
+
+    def _rank(
+        self,
+        approx: "np.ndarray",
+        query: "np.ndarray",
+        rows: "np.ndarray",
+        positions: "np.ndarray",
+        scope: Sequence[str],
+        top_k: int,
+    ) -> List[Tuple[str, float]]:
+        if top_k < approx.size:
+            # BLAS rounding depends on the kernel and batch shape, so the float32 scores only
+            # shortlist rows. Anything within twice the dot-product error bound of the k-th
+            # score is rescored exactly, which makes results independent of batching.
+            kth = np.partition(approx, approx.size - top_k)[approx.size - top_k]
+            candidates = np.flatnonzero(approx >= kth - self.error_bound(query))
+        else:
+            candidates = np.arange(approx.size)
+        scores = self.exact_scores(rows[candidates], query)
+        # Ties on the float64 rescored value keep scope order. Rows are stored normalized in
+        # float32, so these scores can differ from the python backend's float64 cosine in the
+        # last bits, and near-tied rows may order differently there.
+        order = candidates[np.lexsort((positions[candidates], -scores))][:top_k]
+        exact = dict(zip(candidates.tolist(), scores.tolist()))
+        return [(scope[positions[idx]], exact[idx]) for idx in order.tolist()]
+
+    def exact_scores(self, rows: "np.ndarray", query: "np.ndarray") -> "np.ndarray":
+        # Row-wise pairwise summation in float64 gives the same value for a row no matter
+        # which other rows share the block.
+        block = self.matrix[rows].astype(np.float64)
+        scores = np.add.reduce(block * query.astype(np.float64), axis=1)
+        if self.row_scale is not None:
+            scores = scores * self.row_scale[rows].astype(np.float64)
+        return scores
+
+    def error_bound(self, query: Optional["np.ndarray"] = None) -> float:
+        unit = float(np.finfo(np.float32).eps) / 2
+        gamma = self.dim * unit / max(1.0 - self.dim * unit, unit)
+        return 2.0 * (gamma + 2 * unit) + 1e-9
@@ -0,0 +1,81 @@
+import threading
+import unittest
+
+from rag_pipeline.analysis import ANALYZER, Analyzer, analyze_query
+from rag_pipeline.embeddings import HashEmbedder
+from rag_pipeline.utils import hash_embedding, tokenize
+
+TEXTS = [
+    "The Cantonment Board shall levy taxes and tolls.",
+    "Appeals lie to the Collector within 30 days; the board's order is final.",
+    "Rückgabe der Grundstücke – Section 12(3) applies to KELVIN K ratings.",
+    "",
+]
+
+
+class AnalyzerTests(unittest.TestCase):
+    def test_tokens_match_the_tokenizer(self) -> None:
+        analyzer = Analyzer()
+        for text in TEXTS:
+            with self.subTest(text=text):
+                analysis = analyzer.analyze(text)
+                self.assertEqual(list(analysis.tokens), tokenize(text))
+                self.assertEqual(
+                    [analyzer.vocabulary.tokens[token_id] for token_id in analysis.token_ids],
+                    tokenize(text),
+                )
+
+    def test_vocabulary_interns_each_token_once(self) -> None:
+        analyzer = Analyzer()
+        first = analyzer.analyze("board levy board").token_ids
+        second = analyzer.analyze("Levy BOARD tolls").token_ids
+        self.assertEqual(first, (0, 1, 0))
+        self.assertEqual(second, (1, 0, 2))
+        self.assertEqual(len(analyzer.vocabulary), 3)
+        self.assertIn("tolls", analyzer.vocabulary)
+
+    def test_concurrent_interning_keeps_ids_consistent(self) -> None:
+        analyzer = Analyzer()
+        words = [f"term{idx}" for idx in range(2000)]
+        threads = [
+            threading.Thread(target=analyzer.analyze, args=(" ".join(words[offset::3]),))
+            for offset in range(3)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        vocabulary = analyzer.vocabulary
+        self.assertEqual(sorted(vocabulary.tokens), sorted(words))
+        self.assertTrue(all(vocabulary.tokens[vocabulary.ids[word]] == word for word in words))
+
+    def test_query_analysis_is_memoized(self) -> None:
+        query = "can the board levy taxes on tolls"
+        self.assertIs(analyze_query(query), analyze_query(query))
+        self.assertEqual(analyze_query(query), ANALYZER.analyze(query, intern=False))
+
+    def test_queries_do_not_grow_the_vocabulary(self) -> None:
+        analyzer = Analyzer(query_cache_size=8)
+        analyzer.analyze("the board may levy taxes")
+        analyzer.slots(32)
+        for idx in range(500):
+            analysis = analyzer.analyze_query(f"board levy unseen{idx}")
+            self.assertEqual(analysis.token_ids[-1], None)
+            expected = hash_embedding(f"board levy unseen{idx}", dim=32)
+            self.assertEqual(analyzer.term_vector(analysis, 32), expected)
+        self.assertEqual(len(analyzer.vocabulary), 5)
+        self.assertEqual(len(analyzer.slots(32)), 5)
+
+
+class HashEmbedderTests(unittest.TestCase):
+    def test_vectors_match_hash_embedding(self) -> None:
+        embedder = HashEmbedder(dim=32)
+        self.assertEqual(embedder.embed_many(TEXTS), [hash_embedding(text, dim=32) for text in TEXTS])
+        self.assertEqual(embedder.embed_queries(TEXTS), embedder.embed_many(TEXTS))
+        unseen = ["zygomorphic board quorum xylophonic"]
+        self.assertEqual(embedder.embed_queries(unseen), [hash_embedding(unseen[0], dim=32)])
+        self.assertNotIn("zygomorphic", ANALYZER.vocabulary)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+import unittest
+
+from benchmarks.ann_recall import build_index, clustered_vectors, measure_recall
+from rag_pipeline.ann import IvfIndex
+from rag_pipeline.schemas import H2Node
+from rag_pipeline.vector_store import np
+
+
+@unittest.skipIf(np is None, "numpy is not installed")
+class IvfIndexTests(unittest.TestCase):
+    def setUp(self) -> None:
+        vectors = clustered_vectors(1220, dim=32, clusters=16, seed=3)
+        self.vectors = vectors[:1200]
+        self.queries = vectors[1200:]
+        self.index = build_index(vectors[:1200], dim=32)
+        self.ann = self.index.build_ann(nlist=16, nprobe=4, seed=3, min_scope=0)
+
+    def test_probing_every_list_matches_exact_search(self) -> None:
+        for query in self.queries:
+            exact = self.index._rank(query, self.index.node_ids(), 10)
+            self.assertEqual(self.index.rank(query, None, 10, nprobe=16), exact)
+
+    def test_recall_on_clustered_vectors(self) -> None:
+        results = measure_recall(self.index, self.queries, [1, 4], top_k=10)
+        self.assertGreaterEqual(results[1].recall, 0.95)
+        self.assertGreaterEqual(results[1].recall, results[0].recall)
+        self.assertEqual(results[1].probed, 0.25)
+
+    def test_scope_filter_is_respected(self) -> None:
+        scope = self.index.node_ids()[::3]
+        allowed = set(scope)
+        for query in self.queries:
+            hits = self.index.rank(query, scope, 10)
+            self.assertTrue(hits)
+            self.assertTrue(all(node_id in allowed for node_id, _ in hits))
+
+    def test_small_scopes_stay_exact(self) -> None:
+        self.index.ann_min_scope = 100
+        scope = self.index.node_ids()[:50]
+        query = self.queries[0]
+        self.assertEqual(self.index.candidates(query, scope), scope)
+        self.assertEqual(len(self.index.candidates(query, None)), len(self.ann.probe(query)))
+
+    def test_incremental_insert_and_remove(self) -> None:
+        query = self.queries[0]
+        generation = self.index.generation
+        self.index.add(
+            H2Node(
+                node_id="h2_new",
+                parent="h1_new",
+                level="H2",
+                head="New",
+                text="",
+                pages=[1],
+                pdf_name="synthetic.pdf",
+                embedding=list(query),
+            )
+        )
+        self.assertGreater(self.index.generation, generation)
+        self.assertEqual(len(self.ann), 1201)
+        self.assertEqual(self.index.rank(query, None, 1)[0][0], "h2_new")
+
+        self.index.remove("h2_new")
+        self.assertEqual(len(self.ann), 1200)
+        self.assertNotIn("h2_new", [node_id for node_id, _ in self.index.rank(query, None, 10)])
+
+    def test_python_backend_builds_the_same_partitions(self) -> None:
+        python = build_index(self.vectors, dim=32, backend="python")
+        ann = python.build_ann(nlist=16, nprobe=4, seed=3)
+        self.assertEqual(ann.assignments, self.ann.assignments)
+
+    def test_untrained_index_rejects_inserts(self) -> None:
+        with self.assertRaises(ValueError):
+            IvfIndex(dim=4).add("h2_x", [1.0, 0.0, 0.0, 0.0])
+
+
+if __name__ == "__main__":
+    unittest.main()
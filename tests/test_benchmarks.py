@@ -0,0 +1,34 @@
+import unittest
+
+from benchmarks.suite import BenchResult, compare, run_suite, to_baseline
+from benchmarks.synthetic import CorpusSpec, generate_markdown
+from rag_pipeline.ingestion import IngestionConfig, parse_markdown_to_tree
+
+
+class BenchmarkSuiteTests(unittest.TestCase):
+    def test_generator_honours_spec(self) -> None:
+        spec = CorpusSpec(h1_count=4, h2_per_h1=3, words_per_section=24, sections_per_page=2)
+        markdown = generate_markdown(spec)
+        tree = parse_markdown_to_tree(markdown, IngestionConfig(doc_id="synthetic", pdf_name="s.pdf"))
+
+        self.assertEqual(markdown, generate_markdown(spec))
+        self.assertEqual(len(tree.h1_nodes), 4)
+        self.assertEqual(len(tree.h2_nodes), 12)
+        self.assertEqual(tree.h2_nodes["h2_04_03"].pages, [6])
+
+    def test_compare_flags_regressions_beyond_tolerance(self) -> None:
+        baseline = to_baseline([BenchResult("search", 100, 1.0, 1.0, 2.0, 100.0)])
+        steady = BenchResult("search", 100, 1.2, 1.1, 2.4, 120.0)
+        slower = BenchResult("search", 100, 2.5, 2.0, 4.0, 400.0)
+
+        self.assertEqual(compare([steady], baseline, tolerance=0.5), [])
+        self.assertEqual(len(compare([slower], baseline, tolerance=0.5)), 3)
+
+    def test_tiny_suite_runs(self) -> None:
+        names = [result.name for result in run_suite("tiny")]
+        self.assertIn("agent.retrieve", names)
+        self.assertIn("parse_markdown_to_tree", names)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,127 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from rag_pipeline.corpus import CorpusEntry, CorpusIndex, discover_corpus, ingest_corpus
+from rag_pipeline.ingestion import IngestionConfig, parse_markdown_to_tree
+from rag_pipeline.schemas import DocFilter
+
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+class CorpusIngestionTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        for name in ("doc1.md", "doc2.md"):
+            shutil.copy(os.path.join(FIXTURES, name), self.tmpdir)
+
+    def test_directory_ingestion_builds_shared_indexes(self) -> None:
+        result = ingest_corpus(self.tmpdir, workers=2, chunksize=1)
+
+        self.assertEqual(result.failures, {})
+        self.assertEqual(sorted(result.trees), ["doc1", "doc2"])
+        self.assertEqual(len(result.bm25.documents), 2)
+        self.assertEqual(len(result.vector.metadata), 3)
+        self.assertIn("doc1:h1_01", result.trees["doc1"].h1_nodes)
+        self.assertTrue(all(node.embedding for node in result.trees["doc1"].h2_nodes.values()))
+
+    def test_manifest_failures_do_not_abort_batch(self) -> None:
+        manifest = os.path.join(self.tmpdir, "manifest.jsonl")
+        with open(manifest, "w", encoding="utf-8") as handle:
+            for record in (
+                {"path": "doc1.md", "doc_id": "act_1", "pdf_name": "Act 1.pdf"},
+                {"path": "missing.md", "doc_id": "act_2", "pdf_name": "Act 2.pdf"},
+                {"path": "doc2.md", "doc_id": "act_1", "pdf_name": "Act 1 copy.pdf"},
+            ):
+                handle.write(json.dumps(record) + "\n")
+
+        result = ingest_corpus(manifest, workers=1)
+
+        self.assertEqual(sorted(result.trees), ["act_1"])
+        missing = os.path.join(self.tmpdir, "missing.md")
+        duplicate = os.path.join(self.tmpdir, "doc2.md")
+        self.assertEqual(sorted(result.failures), sorted([missing, duplicate]))
+        self.assertIn("FileNotFoundError", result.failures[missing])
+        self.assertEqual(
+            next(iter(result.trees["act_1"].h1_nodes.values())).pdf_name, "Act 1.pdf"
+        )
+
+    def test_discover_corpus_uses_file_stems(self) -> None:
+        entries = discover_corpus(self.tmpdir)
+        self.assertEqual(
+            entries[0], CorpusEntry(os.path.join(self.tmpdir, "doc1.md"), "doc1", "doc1.pdf")
+        )
+
+
+def parse(markdown: str, doc_id: str, pdf_name: str):
+    return parse_markdown_to_tree(markdown, IngestionConfig(doc_id=doc_id, pdf_name=pdf_name))
+
+
+class CorpusIndexTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.corpus = CorpusIndex()
+        self.corpus.add_tree(
+            "act_a",
+            parse(
+                "# Cantonment Board\n[[PAGE 1]]\n## Taxes\nThe board may levy taxes on land.\n",
+                "act_a",
+                "Act A.pdf",
+            ),
+        )
+        self.corpus.add_tree(
+            "act_b",
+            parse(
+                "# Municipal Board\n[[PAGE 3]]\n## Taxes\nThe municipal board may levy taxes.\n",
+                "act_b",
+                "Act B.pdf",
+            ),
+        )
+
+    def test_same_local_ids_do_not_collide(self) -> None:
+        self.assertEqual(sorted(self.corpus.bm25.documents), ["act_a:h1_01", "act_b:h1_01"])
+        self.assertEqual(
+            self.corpus.tree.h1_nodes["act_b:h1_01"].children, ["act_b:h2_01_01"]
+        )
+        self.assertEqual(self.corpus.tree.h2_nodes["act_b:h2_01_01"].parent, "act_b:h1_01")
+
+    def test_doc_filter_is_applied_before_ranking(self) -> None:
+        agent = self.corpus.agent()
+        query = "Which taxes can the municipal board levy?"
+
+        unfiltered = agent.retrieve(query, top_h1=1)
+        by_doc = agent.retrieve(query, top_h1=1, doc_filter=DocFilter(doc_ids=["act_a"]))
+        by_pdf = agent.retrieve(query, top_h1=1, doc_filter=DocFilter(pdf_names=["Act A.pdf"]))
+
+        self.assertEqual(unfiltered.h1_candidates, ["act_b:h1_01"])
+        self.assertEqual(by_doc.h1_candidates, ["act_a:h1_01"])
+        self.assertEqual([chunk.node_id for chunk in by_doc.chunks], ["act_a:h2_01_01"])
+        self.assertEqual(by_pdf.h1_candidates, ["act_a:h1_01"])
+
+    def test_readding_a_document_evicts_old_nodes(self) -> None:
+        self.corpus.add_tree("act_a", parse("# Elections\nMembers are elected.\n", "act_a", "A.pdf"))
+
+        self.assertEqual(self.corpus.doc_h1["act_a"], {"act_a:h1_01"})
+        self.assertNotIn("Act A.pdf", self.corpus.pdf_h1)
+        self.assertEqual(self.corpus.tree.h1_nodes["act_a:h1_01"].head, "Elections")
+        self.assertEqual(len(self.corpus.vector.metadata), 2)
+        self.assertTrue(self.corpus.remove_document("act_a"))
+        self.assertEqual(sorted(self.corpus.bm25.documents), ["act_b:h1_01"])
+
+    def test_update_moves_a_changed_h1_to_its_new_pdf(self) -> None:
+        markdown = "# Cantonment Board\n[[PAGE 1]]\n## Taxes\nThe board may levy taxes on land.\n"
+        changeset = self.corpus.update_tree("act_a", parse(markdown, "act_a", "Act A 2024.pdf"))
+
+        self.assertEqual([h1.node_id for h1 in changeset.changed_h1], ["act_a:h1_01"])
+        self.assertNotIn("Act A.pdf", self.corpus.pdf_h1)
+        self.assertEqual(self.corpus.pdf_h1["Act A 2024.pdf"], {"act_a:h1_01"})
+        self.assertEqual(self.corpus.doc_h1["act_a"], {"act_a:h1_01"})
+        self.assertEqual(self.corpus.h1_doc["act_a:h1_01"], "act_a")
+        self.assertEqual(self.corpus.resolve_filter(DocFilter(pdf_names=["Act A.pdf"])), set())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,157 @@
+import unittest
+
+from rag_pipeline.corpus import CorpusIndex
+from rag_pipeline.incremental import align_tree, apply_changeset, diff_trees, incremental_update
+from rag_pipeline.indexes import BM25Index, VectorIndex
+from rag_pipeline.ingestion import IngestionConfig, parse_markdown_to_tree
+from rag_pipeline.schemas import DocumentRoot, TreeIndex
+from rag_pipeline.storage import MongoTreeStore
+
+try:
+    import mongomock
+except ModuleNotFoundError:
+    mongomock = None
+
+
+ORIGINAL = (
+    "# Board\n[[PAGE 1]]\n"
+    "## Powers\nThe board may levy taxes.\n"
+    "## Duties\nThe board shall meet.\n"
+    "# Appeals\n[[PAGE 2]]\n"
+    "## Filing\nAppeals lie to the officer.\n"
+    "## Limitation\nWithin 30 days.\n"
+    "# Penalties\n[[PAGE 3]]\nFines may be imposed.\n"
+)
+AMENDED = (
+    "# Board\n[[PAGE 1]]\n"
+    "## Powers\nThe board may levy taxes and tolls.\n"
+    "## Duties\nThe board shall meet.\n"
+    "# Appeals\n[[PAGE 2]]\n"
+    "## Filing\nAppeals lie to the officer.\n"
+    "# Penalties\n[[PAGE 3]]\nFines may be imposed.\n"
+)
+CONFIG = IngestionConfig(doc_id="code", pdf_name="code.pdf")
+CHAPTERS = "".join(
+    f"# Chapter {idx}\n[[PAGE {idx}]]\n## Scope {idx}\nRule {idx} applies.\n"
+    f"## Penalty {idx}\nFine of {idx} rupees.\n"
+    for idx in range(1, 31)
+)
+PREAMBLE = "# Preamble\nWhereas it is expedient.\n"
+
+
+def build_indexes(tree: TreeIndex):
+    bm25 = BM25Index()
+    bm25.add_many(tree.h1_nodes.values())
+    vector = VectorIndex()
+    vector.add_many(tree.h2_nodes.values())
+    return bm25, vector
+
+
+class IncrementalUpdateTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.old = parse_markdown_to_tree(ORIGINAL, CONFIG)
+        self.new = parse_markdown_to_tree(AMENDED, CONFIG)
+
+    def test_diff_reports_only_amended_sections(self) -> None:
+        changeset = diff_trees(self.old, self.new)
+
+        self.assertEqual(changeset.added_h1, [])
+        self.assertEqual([node.node_id for node in changeset.changed_h1], ["h1_01", "h1_02"])
+        self.assertEqual([node.node_id for node in changeset.changed_h2], ["h2_01_01"])
+        self.assertEqual(changeset.removed_h2, ["h2_02_02"])
+        self.assertEqual(len(diff_trees(self.new, self.new)), 0)
+
+    def test_apply_matches_full_rebuild(self) -> None:
+        bm25, vector = build_indexes(self.old)
+        tree = TreeIndex(
+            h1_nodes=dict(self.old.h1_nodes),
+            h2_nodes=dict(self.old.h2_nodes),
+            lookup=dict(self.old.lookup),
+        )
+
+        apply_changeset(diff_trees(self.old, self.new), tree=tree, bm25=bm25, vector=vector)
+
+        expected_bm25, expected_vector = build_indexes(self.new)
+        self.assertEqual(tree, self.new)
+        self.assertEqual(bm25.doc_freqs, expected_bm25.doc_freqs)
+        self.assertEqual(
+            bm25.search("levy tolls", top_k=3), expected_bm25.search("levy tolls", top_k=3)
+        )
+        self.assertEqual(vector.embeddings, expected_vector.embeddings)
+
+    def test_inserted_section_does_not_renumber_the_rest(self) -> None:
+        old = parse_markdown_to_tree(CHAPTERS, CONFIG)
+        new = parse_markdown_to_tree(PREAMBLE + CHAPTERS, CONFIG)
+
+        changeset = diff_trees(old, new)
+
+        self.assertEqual(len(changeset), 2)
+        self.assertEqual([node.head for node in changeset.added_h1], ["Preamble"])
+        self.assertEqual(changeset.added_h2[0].parent, changeset.added_h1[0].node_id)
+        self.assertNotIn(changeset.added_h1[0].node_id, old.h1_nodes)
+        self.assertNotIn(changeset.added_h2[0].node_id, old.h2_nodes)
+        aligned = align_tree(old, new)
+        self.assertEqual(len(diff_trees(aligned, new)), 0)
+        self.assertEqual(list(aligned.h1_nodes)[1:], list(old.h1_nodes))
+
+    def test_incremental_update_patches_the_tree(self) -> None:
+        old = parse_markdown_to_tree(CHAPTERS, CONFIG)
+        new = parse_markdown_to_tree(PREAMBLE + CHAPTERS.replace("Rule 7 ", "Rule 7a "), CONFIG)
+        tree = TreeIndex(
+            h1_nodes=dict(old.h1_nodes), h2_nodes=dict(old.h2_nodes), lookup=dict(old.lookup)
+        )
+        bm25, vector = build_indexes(old)
+
+        changeset = incremental_update(old, new, tree=tree, bm25=bm25, vector=vector)
+
+        self.assertEqual([node.node_id for node in changeset.changed_h2], ["h2_07_01"])
+        self.assertEqual([node.node_id for node in changeset.changed_h1], ["h1_07"])
+        self.assertEqual(len(changeset), 4)
+        self.assertEqual(tree, align_tree(old, new))
+        self.assertIn("7a", tree.h2_nodes["h2_07_01"].text)
+        expected_bm25, expected_vector = build_indexes(tree)
+        self.assertEqual(bm25.doc_freqs, expected_bm25.doc_freqs)
+        self.assertEqual(vector.embeddings, expected_vector.embeddings)
+
+    @unittest.skipIf(mongomock is None, "mongomock is not installed")
+    def test_store_deletes_removed_sections(self) -> None:
+        store = MongoTreeStore(uri="mongodb://stub", client=mongomock.MongoClient())
+        doc_root = DocumentRoot(pdf_name="code.pdf", doc_id="code")
+        store.save_tree(doc_root, self.old)
+
+        changeset = incremental_update(
+            store.load_tree("code"), self.new, store=store, doc_root=doc_root
+        )
+
+        self.assertEqual(len(changeset), 4)
+        self.assertEqual(store.load_tree("code"), self.new)
+        self.assertEqual(store.h2_nodes.count_documents({"doc_id": "code"}), 4)
+
+    def test_corpus_update_touches_changed_nodes(self) -> None:
+        corpus = CorpusIndex()
+        corpus.add_tree("code", self.old)
+
+        changeset = corpus.update_tree("code", self.new)
+
+        self.assertEqual(changeset.removed_h2, ["code:h2_02_02"])
+        self.assertNotIn("code:h2_02_02", corpus.tree.h2_nodes)
+        self.assertNotIn("code:h2_02_02", corpus.vector.embeddings)
+        self.assertIn("tolls", corpus.tree.h2_nodes["code:h2_01_01"].text)
+        self.assertEqual(corpus.doc_h1["code"], {"code:h1_01", "code:h1_02", "code:h1_03"})
+
+    def test_corpus_insertion_adds_only_the_new_section(self) -> None:
+        corpus = CorpusIndex()
+        corpus.add_tree("code", parse_markdown_to_tree(CHAPTERS, CONFIG))
+
+        changeset = corpus.update_tree("code", parse_markdown_to_tree(PREAMBLE + CHAPTERS, CONFIG))
+
+        self.assertEqual(len(changeset), 2)
+        self.assertEqual(len(corpus.doc_h1["code"]), 31)
+        preamble = changeset.added_h1[0]
+        self.assertEqual(corpus.h1_doc[preamble.node_id], "code")
+        self.assertIn(preamble.children[0], corpus.vector.embeddings)
+        self.assertEqual(corpus.tree.h1_nodes["code:h1_01"].head, "Chapter 1")
+
+
+if __name__ == "__main__":
+    unittest.main()
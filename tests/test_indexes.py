@@ -0,0 +1,367 @@
+import math
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from benchmarks.synthetic import WORDS
+from rag_pipeline.embeddings import CachedEmbedder, EmbeddingCache, HashEmbedder
+from rag_pipeline.indexes import BM25Index, VectorIndex
+from rag_pipeline.schemas import H1Node, H2Node
+from rag_pipeline.snapshot import SnapshotError, SnapshotReader
+from rag_pipeline.utils import tokenize
+from rag_pipeline.vector_store import np
+
+
+def make_h1(node_id: str, head: str, summary: str, pdf_name: str = "code.pdf") -> H1Node:
+    return H1Node(
+        node_id=node_id,
+        level="H1",
+        head=head,
+        summary=summary,
+        pages=[1],
+        pdf_name=pdf_name,
+        children=[],
+    )
+
+
+def random_h1_nodes(count: int, seed: int = 7) -> list:
+    rng = random.Random(seed)
+    nodes = []
+    for idx in range(count):
+        head = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 4)))
+        summary = " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 20)))
+        nodes.append(make_h1(f"h1_{idx:03d}", head, summary))
+    return nodes
+
+
+def random_h2_nodes(count: int, seed: int = 11) -> list:
+    rng = random.Random(seed)
+    nodes = []
+    for idx in range(count):
+        text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 40)))
+        nodes.append(
+            H2Node(
+                node_id=f"h2_{idx:03d}",
+                parent=f"h1_{idx // 10:03d}",
+                level="H2",
+                head=f"Section {idx}",
+                text=text,
+                pages=[idx // 10 + 1],
+                pdf_name="code.pdf",
+            )
+        )
+    return nodes
+
+
+def reference_bm25(index: BM25Index, query: str, top_k: int) -> list:
+    scores = []
+    query_tokens = tokenize(query)
+    total_docs = len(index.documents)
+    for doc_id, text in index.documents.items():
+        doc_tokens = tokenize(text)
+        doc_len = index.doc_lengths.get(doc_id, 1)
+        token_counts = {token: doc_tokens.count(token) for token in set(doc_tokens)}
+        score = 0.0
+        for token in query_tokens:
+            if token not in token_counts:
+                continue
+            df = index.doc_freqs.get(token, 0)
+            idf = math.log(1 + (total_docs - df + 0.5) / (df + 0.5))
+            tf = token_counts[token]
+            denom = tf + index.k1 * (1 - index.b + index.b * doc_len / max(index.avg_doc_len, 1))
+            score += idf * (tf * (index.k1 + 1) / denom)
+        scores.append((doc_id, score))
+    return sorted(scores, key=lambda item: item[1], reverse=True)[:top_k]
+
+
+class BM25IndexTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.index = BM25Index()
+        for node in random_h1_nodes(200):
+            self.index.add(node)
+        self.queries = [
+            "board powers",
+            "tax levy tax",
+            "appeal against penalty notice",
+            "water",
+            "unrelated words only",
+            "election of members to the board fund",
+        ]
+
+    def test_search_matches_reference_scoring(self) -> None:
+        for query in self.queries:
+            for top_k in (1, 3, 10, 250):
+                with self.subTest(query=query, top_k=top_k):
+                    self.assertEqual(
+                        self.index.search(query, top_k=top_k),
+                        reference_bm25(self.index, query, top_k),
+                    )
+
+    def test_pruned_search_matches_exhaustive(self) -> None:
+        for query in self.queries:
+            for top_k in (1, 3, 10):
+                with self.subTest(query=query, top_k=top_k):
+                    self.assertEqual(
+                        self.index.search(query, top_k=top_k, prune=True),
+                        self.index.search(query, top_k=top_k),
+                    )
+
+    def test_allowed_filter_matches_post_filtered_ranking(self) -> None:
+        narrow = {f"h1_{idx:03d}" for idx in range(0, 200, 37)}
+        wide = {f"h1_{idx:03d}" for idx in range(200) if idx % 5}
+        for allowed in (narrow, wide):
+            for query in self.queries:
+                full = self.index.search(query, top_k=len(self.index.documents))
+                expected = [item for item in full if item[0] in allowed][:5]
+                with self.subTest(query=query, size=len(allowed)):
+                    self.assertEqual(self.index.search(query, top_k=5, allowed=allowed), expected)
+                    self.assertEqual(
+                        self.index.search(query, top_k=5, prune=True, allowed=allowed), expected
+                    )
+
+    def test_unmatched_documents_fill_remaining_slots(self) -> None:
+        index = BM25Index()
+        index.add(make_h1("h1_01", "Board", "Powers of the board."))
+        index.add(make_h1("h1_02", "Taxes", "Levy of taxes."))
+        index.add(make_h1("h1_03", "Appeals", "Appeals to the officer."))
+
+        results = index.search("taxes", top_k=3)
+
+        self.assertEqual([node_id for node_id, _ in results], ["h1_02", "h1_01", "h1_03"])
+        self.assertEqual(results[1][1], 0.0)
+
+    def test_bulk_build_matches_incremental_adds(self) -> None:
+        bulk = BM25Index()
+        bulk.add_many(random_h1_nodes(200))
+
+        self.assertEqual(bulk.doc_freqs, self.index.doc_freqs)
+        self.assertEqual(bulk.total_doc_len, sum(bulk.doc_lengths.values()))
+        self.assertAlmostEqual(bulk.avg_doc_len, self.index.avg_doc_len)
+        for query in self.queries:
+            self.assertEqual(bulk.search(query, top_k=5), self.index.search(query, top_k=5))
+
+    def test_remove_evicts_node_and_statistics(self) -> None:
+        nodes = random_h1_nodes(200)
+        removed_ids = [node.node_id for node in nodes[::3]]
+        expected = BM25Index()
+        expected.add_many(node for node in nodes if node.node_id not in removed_ids)
+
+        self.assertEqual(self.index.remove_many(removed_ids), len(removed_ids))
+        self.assertFalse(self.index.remove(removed_ids[0]))
+
+        self.assertEqual(self.index.doc_freqs, expected.doc_freqs)
+        self.assertEqual(set(self.index.postings), set(expected.postings))
+        self.assertEqual(self.index.total_doc_len, expected.total_doc_len)
+        self.assertAlmostEqual(self.index.avg_doc_len, expected.avg_doc_len)
+        for query in self.queries:
+            results = self.index.search(query, top_k=len(nodes))
+            self.assertFalse(set(removed_ids) & {node_id for node_id, _ in results})
+
+    def test_update_replaces_previous_text(self) -> None:
+        index = BM25Index()
+        index.add(make_h1("h1_01", "Board", "Powers of the board."))
+        index.add(make_h1("h1_02", "Taxes", "Levy of taxes."))
+
+        index.update(make_h1("h1_01", "Elections", "Election of members."))
+
+        self.assertEqual(len(index.documents), 2)
+        self.assertNotIn("board", index.doc_freqs)
+        self.assertEqual(index.search("election", top_k=1)[0][0], "h1_01")
+        self.assertEqual(index.search("board", top_k=2), [("h1_01", 0.0), ("h1_02", 0.0)])
+
+
+@unittest.skipIf(np is None, "numpy is not installed")
+class NumpyVectorIndexTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.nodes = random_h2_nodes(300)
+        self.python = VectorIndex()
+        self.matrix = VectorIndex(backend="numpy")
+        for node in self.nodes:
+            self.python.add(node)
+            self.matrix.add(node)
+        self.queries = ["board tax levy", "appeal notice penalty", "water building license"]
+
+    def assert_same_results(self, expected: list, actual: list) -> None:
+        self.assertEqual(len(expected), len(actual))
+        expected_scores = {node.node_id: score for node, score in expected}
+        for (_, expected_score), (node, score) in zip(expected, actual):
+            self.assertAlmostEqual(expected_score, score, places=5)
+            if node.node_id in expected_scores:
+                self.assertAlmostEqual(expected_scores[node.node_id], score, places=5)
+
+    def test_scoped_search_matches_python_backend(self) -> None:
+        scope = [node.node_id for node in self.nodes[40:260]] + ["missing_id"]
+        for query in self.queries:
+            for top_k in (1, 4, 500):
+                with self.subTest(query=query, top_k=top_k):
+                    self.assert_same_results(
+                        self.python.search(query, scope, top_k=top_k),
+                        self.matrix.search(query, scope, top_k=top_k),
+                    )
+
+    def test_rows_are_unit_normalized(self) -> None:
+        store = self.matrix.store
+        norms = np.linalg.norm(store.matrix[: len(store)], axis=1)
+        self.assertTrue(np.allclose(norms[norms > 0], 1.0, atol=1e-5))
+
+    def test_remove_keeps_row_map_consistent(self) -> None:
+        store = self.matrix.store
+        self.assertTrue(store.remove(self.nodes[0].node_id))
+        self.assertFalse(store.remove(self.nodes[0].node_id))
+        for node_id, row in store.rows.items():
+            self.assertEqual(store.ids[row], node_id)
+        self.assertEqual(len(store), len(self.nodes) - 1)
+
+
+class EmbedderTests(unittest.TestCase):
+    def test_hash_embedding_is_stable_across_processes(self) -> None:
+        script = (
+            "from rag_pipeline.utils import hash_embedding;"
+            "print(hash_embedding('The Cantonment Board shall levy taxes', dim=32))"
+        )
+        outputs = set()
+        for seed in ("1", "2"):
+            env = dict(os.environ, PYTHONHASHSEED=seed)
+            completed = subprocess.run(
+                [sys.executable, "-c", script],
+                capture_output=True,
+                text=True,
+                env=env,
+                check=True,
+                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            )
+            outputs.add(completed.stdout)
+        self.assertEqual(len(outputs), 1)
+
+    def test_cached_embedder_reuses_vectors_on_disk(self) -> None:
+        texts = ["Powers of the board.", "Levy of taxes.", "Powers of the board."]
+        with tempfile.TemporaryDirectory() as root:
+            first = CachedEmbedder(HashEmbedder(dim=64), EmbeddingCache(root))
+            vectors = first.embed_many(texts)
+            self.assertEqual(vectors, HashEmbedder(dim=64).embed_many(texts))
+
+            second = CachedEmbedder(HashEmbedder(dim=64), EmbeddingCache(root))
+            self.assertEqual(second.embed_many(texts), vectors)
+            self.assertEqual((second.hits, second.misses), (3, 0))
+
+    def test_vector_index_uses_configured_embedder(self) -> None:
+        nodes = random_h2_nodes(20)
+        index = VectorIndex(embedder=HashEmbedder(dim=32))
+        index.add_many(nodes)
+
+        self.assertEqual(index.dim, 32)
+        self.assertEqual(len(index.embeddings[nodes[0].node_id]), 32)
+        scope = [node.node_id for node in nodes]
+        self.assertEqual(len(index.search("board tax", scope, top_k=3)), 3)
+
+
+class SnapshotTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.tmpdir.name, name)
+
+    def test_bm25_round_trip_preserves_search(self) -> None:
+        index = BM25Index(k1=1.2, b=0.7)
+        index.add_many(random_h1_nodes(150))
+        index.remove("h1_010")
+        index.save(self.path("bm25.snap"))
+
+        loaded = BM25Index.load(self.path("bm25.snap"))
+
+        self.assertEqual(loaded.doc_freqs, index.doc_freqs)
+        self.assertEqual(loaded.postings, index.postings)
+        self.assertEqual(loaded.avg_doc_len, index.avg_doc_len)
+        for query in ("board powers", "tax levy tax", "appeal notice"):
+            self.assertEqual(loaded.search(query, top_k=10), index.search(query, top_k=10))
+
+    def test_vector_round_trip_preserves_search(self) -> None:
+        index = VectorIndex()
+        index.add_many(random_h2_nodes(80))
+        index.save(self.path("vectors.snap"))
+        scope = list(index.metadata)
+
+        loaded = VectorIndex.load(self.path("vectors.snap"))
+
+        self.assertEqual(loaded.embeddings, index.embeddings)
+        self.assertEqual(loaded.metadata, index.metadata)
+        self.assertEqual(
+            loaded.search("board tax", scope, top_k=5), index.search("board tax", scope, top_k=5)
+        )
+
+    @unittest.skipIf(np is None, "numpy is not installed")
+    def test_vector_snapshot_loads_into_numpy_backend(self) -> None:
+        index = VectorIndex()
+        index.add_many(random_h2_nodes(80))
+        index.save(self.path("vectors.snap"))
+        scope = list(index.metadata)
+
+        loaded = VectorIndex.load(self.path("vectors.snap"), backend="numpy")
+
+        expected = index.search("board tax", scope, top_k=5)
+        actual = loaded.search("board tax", scope, top_k=5)
+        for (_, expected_score), (_, score) in zip(expected, actual):
+            self.assertAlmostEqual(expected_score, score, places=5)
+
+    @unittest.skipIf(np is None, "numpy is not installed")
+    def test_mmap_load_resolves_text_from_node_source(self) -> None:
+        nodes = {node.node_id: node for node in random_h2_nodes(80)}
+        for backend in ("python", "numpy"):
+            with self.subTest(backend=backend):
+                index = VectorIndex(backend=backend, node_source=nodes)
+                index.add_many(nodes.values())
+                self.assertEqual(index.metadata, {})
+                index.save(self.path(f"{backend}.snap"))
+                scope = list(nodes)
+
+                mapped = VectorIndex.load(
+                    self.path(f"{backend}.snap"), backend="numpy", mmap=True, node_source=nodes
+                )
+
+                self.assertTrue(mapped.store.mapped)
+                self.assertFalse(mapped.store.matrix.flags.writeable)
+                self.assertEqual(mapped.metadata, {})
+                expected = index.search("board tax", scope, top_k=5)
+                actual = mapped.search("board tax", scope, top_k=5)
+                self.assertEqual(
+                    [node.node_id for node, _ in actual], [node.node_id for node, _ in expected]
+                )
+                self.assertIs(actual[0][0], nodes[actual[0][0].node_id])
+
+                mapped.add(random_h2_nodes(81)[80])
+                self.assertFalse(mapped.store.mapped)
+                self.assertEqual(len(mapped.store), 81)
+
+        with self.assertRaises(SnapshotError):
+            VectorIndex.load(self.path("numpy.snap"))
+
+    def test_corrupt_snapshot_is_rejected(self) -> None:
+        index = BM25Index()
+        index.add_many(random_h1_nodes(20))
+        index.save(self.path("bm25.snap"))
+        offset = SnapshotReader(self.path("bm25.snap"), b"RAGBM25").offset("posting_tfs")
+        with open(self.path("bm25.snap"), "r+b") as handle:
+            handle.seek(offset)
+            handle.write(b"\xff")
+
+        with self.assertRaises(SnapshotError):
+            BM25Index.load(self.path("bm25.snap"))
+
+    def test_snapshot_from_other_embedder_is_rejected(self) -> None:
+        index = VectorIndex(embedder=HashEmbedder(dim=64))
+        index.add_many(random_h2_nodes(5))
+        index.save(self.path("vectors.snap"))
+
+        with self.assertRaises(SnapshotError):
+            VectorIndex.load(self.path("vectors.snap"), embedder=HashEmbedder(dim=32))
+        with self.assertRaises(SnapshotError):
+            BM25Index.load(self.path("vectors.snap"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,8 +1,16 @@
 import os
+import tempfile
 import unittest
 
-from rag_pipeline.ingestion import IngestionConfig, parse_markdown_to_tree
+from rag_pipeline.ingestion import (
+    IngestionConfig,
+    iter_markdown_nodes,
+    parse_markdown_file,
+    parse_markdown_to_tree,
+)
 from rag_pipeline.llm import load_summarizer_from_env
+from rag_pipeline.schemas import H1Node, H2Node
+from rag_pipeline.summary_cache import SummaryCache
 
 
 class IngestionTests(unittest.TestCase):
@@ -61,6 +69,85 @@ class IngestionTests(unittest.TestCase):
         self.assertEqual(sections["Section B"], [2])
         self.assertEqual(sections["Section C"], [2])
 
+    def test_pages_carry_into_text_before_first_marker(self) -> None:
+        markdown = (
+            "[[PAGE 4]]\n"
+            "# Title\n"
+            "## Section A\n"
+            "A text.\n"
+            "[[PAGE 5]]\n"
+            "More A text.\n"
+            "## Section B\n"
+            "[[PAGE 6]]\n"
+            "B text.\n"
+        )
+        tree = parse_markdown_to_tree(
+            markdown,
+            IngestionConfig(doc_id="doc_04", pdf_name="doc.pdf"),
+        )
+
+        sections = {node.head: node.pages for node in tree.h2_nodes.values()}
+        self.assertEqual(sections["Section A"], [4, 5])
+        self.assertEqual(sections["Section B"], [6])
+        self.assertEqual(tree.h1_nodes["h1_01"].pages, [4, 5, 6])
+
+    def test_stream_yields_nodes_as_sections_close(self) -> None:
+        consumed = []
+
+        def lines():
+            for line in ["# One", "## A", "A text.", "## B", "B text.", "# Two", "Body."]:
+                consumed.append(line)
+                yield line
+
+        nodes = iter_markdown_nodes(lines(), IngestionConfig(doc_id="doc_05", pdf_name="doc.pdf"))
+
+        first = next(nodes)
+        self.assertIsInstance(first, H2Node)
+        self.assertEqual(first.head, "A")
+        self.assertEqual(consumed[-1], "## B")
+        remaining = list(nodes)
+        self.assertEqual([type(node) for node in remaining], [H2Node, H1Node, H2Node, H1Node])
+        self.assertEqual(remaining[1].children, ["h2_01_01", "h2_01_02"])
+
+    def test_summary_cache_skips_summarizer_for_unchanged_sections(self) -> None:
+        calls = []
+
+        def summarize_many(texts):
+            calls.append(len(texts))
+            return [f"summary of {text.split()[0]}" for text in texts]
+
+        markdown = "".join(f"# Part {idx}\nPart{idx} body text.\n" for idx in range(50))
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = SummaryCache(os.path.join(tmpdir, "summaries.db"), model="stub")
+            config = IngestionConfig(
+                doc_id="doc_06",
+                pdf_name="doc.pdf",
+                summarize_many_fn=summarize_many,
+                summary_cache=cache,
+            )
+            first = parse_markdown_to_tree(markdown, config)
+            second = parse_markdown_to_tree(markdown, config)
+            amended = parse_markdown_to_tree(markdown + "# Part 50\nPart50 body text.\n", config)
+            cache.close()
+
+        self.assertEqual(first, second)
+        self.assertEqual(sum(calls), 51)
+        self.assertEqual(cache.stats()["hits"], 100)
+        self.assertEqual(amended.h1_nodes["h1_51"].summary, "summary of Part50")
+
+    def test_summary_cache_evicts_least_recently_used(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = SummaryCache(os.path.join(tmpdir, "summaries.db"), max_entries=2)
+            cache.put_many(["a"], ["A"])
+            cache.put_many(["b"], ["B"])
+            cache.get_many(["a"])
+            cache.put_many(["c"], ["C"])
+
+            self.assertEqual(cache.get_many(["a", "b", "c"]), ["A", None, "C"])
+            self.assertEqual(cache.evictions, 1)
+            self.assertEqual(len(cache), 2)
+            cache.close()
+
     def test_load_summarizer_from_env_none_without_url(self) -> None:
         original = dict(os.environ)
         try:
@@ -91,6 +178,10 @@ class IngestionTests(unittest.TestCase):
         self.assertEqual(len(tree1.h2_nodes), 2)
         self.assertEqual(len(tree2.h1_nodes), 1)
         self.assertEqual(len(tree2.h2_nodes), 1)
+        self.assertEqual(
+            parse_markdown_file(doc1, IngestionConfig(doc_id="doc_fixture_1", pdf_name="doc1.pdf")),
+            tree1,
+        )
 
 
 if __name__ == "__main__":
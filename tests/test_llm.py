@@ -0,0 +1,165 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from rag_pipeline.ingestion import IngestionConfig, parse_markdown_to_tree
+from rag_pipeline.llm import FallbackSummary, LlmConfig, LlmSummarizer
+from rag_pipeline.summary_cache import SummaryCache
+from rag_pipeline.utils import summarize_text
+
+try:
+    import requests
+except ModuleNotFoundError:
+    requests = None
+
+
+class StubLlmHandler(BaseHTTPRequestHandler):
+    def do_POST(self) -> None:
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        text = body["prompt"].rsplit("\n\n", 1)[-1]
+        with server.lock:
+            server.requests += 1
+            server.in_flight += 1
+            server.peak_in_flight = max(server.peak_in_flight, server.in_flight)
+            attempts = server.attempts.get(text, 0) + 1
+            server.attempts[text] = attempts
+        try:
+            server.release.wait(timeout=0.05)
+            if text.startswith("flaky") and attempts == 1:
+                self.send_response(503)
+                self.end_headers()
+                return
+            if text.startswith("broken"):
+                self.send_response(400)
+                self.end_headers()
+                return
+            payload = json.dumps({"summary": f"LLM: {text[:20]}"}).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def log_message(self, format: str, *args: object) -> None:
+        pass
+
+
+@unittest.skipIf(requests is None, "requests is not installed")
+class LlmSummarizerTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StubLlmHandler)
+        self.server.lock = threading.Lock()
+        self.server.release = threading.Event()
+        self.server.requests = 0
+        self.server.in_flight = 0
+        self.server.peak_in_flight = 0
+        self.server.attempts = {}
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        host, port = self.server.server_address
+        self.summarizer = LlmSummarizer(
+            LlmConfig(api_url=f"http://{host}:{port}/v1", max_concurrency=4, backoff_s=0.01)
+        )
+        self.addCleanup(self.summarizer.close)
+
+    def test_summarize_many_runs_concurrently_with_bounded_pool(self) -> None:
+        texts = [f"Section {idx} text." for idx in range(12)]
+
+        summaries = self.summarizer.summarize_many(texts)
+
+        self.assertEqual(summaries, [f"LLM: {text[:20]}" for text in texts])
+        self.assertGreater(self.server.peak_in_flight, 1)
+        self.assertLessEqual(self.server.peak_in_flight, 4)
+
+    def test_retries_transient_errors_and_falls_back_per_item(self) -> None:
+        texts = ["flaky section text.", "broken section text.", "plain section text."]
+
+        summaries = self.summarizer.summarize_many(texts)
+
+        self.assertEqual(summaries[0], "LLM: flaky section text.")
+        self.assertEqual(self.server.attempts["flaky section text."], 2)
+        self.assertEqual(summaries[1], summarize_text(texts[1]))
+        self.assertEqual(self.server.attempts["broken section text."], 1)
+        self.assertEqual(summaries[2], "LLM: plain section text.")
+
+    def test_ingestion_summarizes_h1_sections_in_batches(self) -> None:
+        markdown = "".join(f"# Part {idx}\nPart {idx} body.\n" for idx in range(5))
+        tree = parse_markdown_to_tree(
+            markdown,
+            IngestionConfig(
+                doc_id="doc_llm",
+                pdf_name="doc.pdf",
+                summarize_many_fn=self.summarizer.summarize_many,
+                summary_batch_size=2,
+            ),
+        )
+
+        self.assertEqual(
+            [node.summary for node in tree.h1_nodes.values()],
+            [f"LLM: Part {idx} body." for idx in range(5)],
+        )
+        self.assertEqual(list(tree.h1_nodes), [f"h1_{idx:02d}" for idx in range(1, 6)])
+
+    def test_summary_cache_must_match_the_summarizer(self) -> None:
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        extractive = SummaryCache(os.path.join(tmpdir.name, "extractive.db"))
+        llm = SummaryCache.for_summarizer(os.path.join(tmpdir.name, "llm.db"), self.summarizer)
+        self.addCleanup(extractive.close)
+        self.addCleanup(llm.close)
+
+        with self.assertRaisesRegex(ValueError, "for_summarizer"):
+            IngestionConfig(
+                doc_id="doc_llm",
+                pdf_name="doc.pdf",
+                summarize_many_fn=self.summarizer.summarize_many,
+                summary_cache=extractive,
+            )
+        with self.assertRaisesRegex(ValueError, "for_summarizer"):
+            IngestionConfig(doc_id="doc_llm", pdf_name="doc.pdf", summary_cache=llm)
+        with self.assertRaisesRegex(ValueError, "custom summarizer"):
+            IngestionConfig(
+                doc_id="doc_llm",
+                pdf_name="doc.pdf",
+                summarize_many_fn=lambda texts: list(texts),
+                summary_cache=extractive,
+            )
+        IngestionConfig(doc_id="doc_llm", pdf_name="doc.pdf", summary_cache=extractive)
+
+    def test_fallback_summaries_are_not_cached(self) -> None:
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        cache = SummaryCache.for_summarizer(os.path.join(tmpdir.name, "s.db"), self.summarizer)
+        self.addCleanup(cache.close)
+        markdown = "# Broken\nbroken section body.\n# Plain\nplain section body.\n"
+        config = IngestionConfig(
+            doc_id="doc_llm",
+            pdf_name="doc.pdf",
+            summarize_many_fn=self.summarizer.summarize_many,
+            summary_cache=cache,
+        )
+
+        tree = parse_markdown_to_tree(markdown, config)
+        summaries = [node.summary for node in tree.h1_nodes.values()]
+        self.assertIs(type(summaries[0]), str)
+        self.assertEqual(summaries[1], "LLM: plain section body.")
+        self.assertIsInstance(self.summarizer.summarize("broken again."), FallbackSummary)
+
+        requests_before = self.server.requests
+        parse_markdown_to_tree(markdown, config)
+        # Only the section whose LLM call failed is requested again; the other is a cache hit.
+        self.assertEqual(self.server.requests - requests_before, 1)
+        self.assertEqual(self.server.attempts["broken section body."], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
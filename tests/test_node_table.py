@@ -0,0 +1,95 @@
+import pickle
+import unittest
+
+from rag_pipeline.embeddings import HashEmbedder, attach_embeddings
+from rag_pipeline.indexes import VectorIndex
+from rag_pipeline.ingestion import IngestionConfig, parse_markdown_to_tree
+from rag_pipeline.node_table import NodeTable
+from rag_pipeline.schemas import H1Node, H2Node
+
+MARKDOWN = (
+    "# Board\n[[PAGE 1]]\n"
+    "## Powers\nThe board may levy taxes and tolls.\n"
+    "## Duties\n[[PAGE 2]]\nThe board shall meet monthly.\n"
+    "# Appeals\n[[PAGE 3]]\n"
+    "## Filing\nAppeals lie to the collector within 30 days.\n"
+)
+
+
+class CompactNodeTests(unittest.TestCase):
+    def setUp(self) -> None:
+        tree = parse_markdown_to_tree(MARKDOWN, IngestionConfig(doc_id="code", pdf_name="code.pdf"))
+        self.tree = attach_embeddings(tree, HashEmbedder(dim=8))
+
+    def test_nodes_are_slotted_and_interned(self) -> None:
+        first, second = (
+            H2Node("a", "h1", "H2", "A", "text", [1], "".join(["code", ".pdf"])) for _ in range(2)
+        )
+        self.assertFalse(hasattr(first, "__dict__"))
+        self.assertIs(first.pdf_name, second.pdf_name)
+        self.assertEqual(pickle.loads(pickle.dumps(first)), first)
+        h1 = H1Node("h1", "H1", "Head", "Summary", [1, 2], "code.pdf", ["a"])
+        self.assertEqual(pickle.loads(pickle.dumps(h1)), h1)
+
+    def test_table_views_match_nodes(self) -> None:
+        nodes = list(self.tree.h2_nodes.values())
+        nodes.append(H2Node("big", "h1_02", "H2", "Annex", "Annex.", [70000], "other.pdf"))
+        table = NodeTable.from_nodes(nodes)
+
+        self.assertEqual(list(table), [node.node_id for node in nodes])
+        self.assertEqual(table.pdf_names, ["code.pdf", "other.pdf"])
+        for node in nodes:
+            view = table[node.node_id]
+            self.assertEqual(view.pages, node.pages)
+            self.assertEqual(view.to_node().text, node.text)
+            if node.embedding is None:
+                self.assertIsNone(view.embedding)
+            else:
+                for stored, expected in zip(view.embedding, node.embedding):
+                    self.assertAlmostEqual(stored, expected, places=6)
+        self.assertEqual(table["h2_01_02"].pages, [2])
+
+    def test_many_pdf_names_widen_the_index(self) -> None:
+        nodes = [
+            H2Node(f"h2_{idx}", "h1", "H2", "Head", "text", [1], f"act_{idx}.pdf")
+            for idx in range(65540)
+        ]
+        table = NodeTable.from_nodes(nodes)
+
+        self.assertEqual(table.pdf_index.typecode, "I")
+        self.assertEqual(table["h2_65539"].pdf_name, "act_65539.pdf")
+        self.assertEqual(table["h2_0"].pdf_name, "act_0.pdf")
+
+    def test_rejected_node_leaves_no_partial_row(self) -> None:
+        table = NodeTable.from_nodes(self.tree.h2_nodes.values())
+        snapshot = lambda: (
+            list(table.ids), table.pdf_index.tolist(), table.pages.tolist(), len(table.embeddings)
+        )
+        before = snapshot()
+        bad_nodes = [
+            H2Node("bad", "h1_01", "H2", "Bad", "text", [2**40], "new.pdf"),
+            H2Node("bad", "h1_01", "H3", "Bad", "text", [1], "new.pdf", embedding=[0.0] * 3),
+        ]
+        for node in bad_nodes:
+            with self.assertRaises((OverflowError, ValueError)):
+                table.append(node)
+
+        self.assertEqual(snapshot(), before)
+        self.assertNotIn("bad", table)
+        self.assertEqual(table.pdf_names, ["code.pdf"])
+        self.assertEqual(table.levels, ["H2"])
+        self.assertEqual(len(table.page_offsets), len(table) + 1)
+
+    def test_table_serves_as_vector_node_source(self) -> None:
+        table = NodeTable.from_nodes(self.tree.h2_nodes.values())
+        vector = VectorIndex(embedder=HashEmbedder(dim=8), node_source=table)
+        vector.add_many(self.tree.h2_nodes.values())
+
+        node, _ = vector.search("board levy tolls", list(table), top_k=1)[0]
+        self.assertEqual(node.node_id, "h2_01_01")
+        self.assertEqual(node.parent, "h1_01")
+        self.assertEqual(vector.metadata, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import os
+import tempfile
+import unittest
+
+from benchmarks.ann_recall import build_index, clustered_vectors
+from rag_pipeline.indexes import VectorIndex
+from rag_pipeline.snapshot import SnapshotError
+from rag_pipeline.vector_store import np
+
+
+@unittest.skipIf(np is None, "numpy is not installed")
+class QuantizedVectorIndexTests(unittest.TestCase):
+    def setUp(self) -> None:
+        vectors = clustered_vectors(640, dim=64, clusters=8, seed=5)
+        self.vectors = vectors[:600]
+        self.queries = vectors[600:]
+        self.reference = build_index(self.vectors, dim=64)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.tmp.name, name)
+
+    def ranked_ids(self, index: VectorIndex, query: list, top_k: int = 10) -> list:
+        return [node_id for node_id, _ in index.rank(query, None, top_k)]
+
+    def test_int8_uses_a_quarter_of_the_memory(self) -> None:
+        int8 = build_index(self.vectors, dim=64, precision="int8")
+        float16 = build_index(self.vectors, dim=64, precision="float16")
+        full = self.reference.store.memory_bytes()
+        self.assertLessEqual(int8.store.memory_bytes(), full * 0.27)
+        self.assertLessEqual(float16.store.memory_bytes(), full * 0.52)
+
+    def test_rescoring_reproduces_float32_ranking(self) -> None:
+        index = build_index(self.vectors, dim=64, precision="int8", rescore=True)
+        for query in self.queries:
+            self.assertEqual(index.rank(query, None, 10), self.reference.rank(query, None, 10))
+
+    def test_approximate_scores_keep_recall_high(self) -> None:
+        for precision, floor in (("float16", 0.99), ("int8", 0.9)):
+            index = build_index(self.vectors, dim=64, precision=precision)
+            found = sum(
+                len(set(self.ranked_ids(index, query)) & set(self.ranked_ids(self.reference, query)))
+                for query in self.queries
+            )
+            with self.subTest(precision=precision):
+                self.assertGreaterEqual(found / (10 * len(self.queries)), floor)
+
+    def test_batched_search_matches_single_queries(self) -> None:
+        index = build_index(self.vectors, dim=64, precision="int8")
+        scope = index.node_ids()[::2]
+        queries = ["board tax levy", "appeal notice", "water building license fund"]
+        batched = index.search_many(queries, [scope] * len(queries), top_k=5)
+        self.assertEqual(batched, [index.search(query, scope, top_k=5) for query in queries])
+
+    def test_remove_keeps_codes_and_scales_aligned(self) -> None:
+        index = build_index(self.vectors, dim=64, precision="int8", rescore=True)
+        removed = index.node_ids()[:50]
+        index.remove_many(removed)
+        self.reference.remove_many(removed)
+        for query in self.queries:
+            self.assertEqual(index.rank(query, None, 10), self.reference.rank(query, None, 10))
+
+    def test_compact_snapshot_round_trip(self) -> None:
+        index = build_index(self.vectors, dim=64, precision="int8")
+        index.save(self.path("int8.snap"))
+        self.reference.save(self.path("float32.snap"))
+        self.assertLess(
+            os.path.getsize(self.path("int8.snap")), os.path.getsize(self.path("float32.snap")) * 0.6
+        )
+
+        loaded = VectorIndex.load(self.path("int8.snap"), backend="numpy")
+        self.assertEqual(loaded.precision, "int8")
+        for query in self.queries:
+            self.assertEqual(loaded.rank(query, None, 10), index.rank(query, None, 10))
+        widened = VectorIndex.load(self.path("int8.snap"))
+        self.assertEqual(len(widened.embeddings), len(self.vectors))
+        with self.assertRaises(SnapshotError):
+            VectorIndex.load(self.path("int8.snap"), backend="numpy", rescore=True)
+
+    def test_mapped_rescoring_snapshot(self) -> None:
+        index = build_index(self.vectors, dim=64, precision="int8", rescore=True)
+        index.save(self.path("rescore.snap"))
+
+        mapped = VectorIndex.load(self.path("rescore.snap"), backend="numpy", mmap=True, rescore=True)
+        self.assertTrue(mapped.store.full.mapped)
+        self.assertEqual(mapped.store.full.memory_bytes(), 0)
+        for query in self.queries:
+            self.assertEqual(
+                self.ranked_ids(mapped, query), self.ranked_ids(self.reference, query)
+            )
+
+    def test_precision_is_validated(self) -> None:
+        with self.assertRaises(ValueError):
+            VectorIndex(precision="int4", backend="numpy")
+        with self.assertRaises(ValueError):
+            VectorIndex(precision="int8")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,208 @@
+import random
+import unittest
+
+from benchmarks.synthetic import SAMPLE_MARKDOWN, WORDS
+from rag_pipeline.corpus import CorpusIndex
+from rag_pipeline.indexes import BM25Index, VectorIndex
+from rag_pipeline.inference import InferencePipeline
+from rag_pipeline.ingestion import IngestionConfig, parse_markdown_to_tree
+from rag_pipeline.result_cache import ResultCache
+from rag_pipeline.retrieval import RetrievalAgent
+from rag_pipeline.schemas import H1Node
+from rag_pipeline.vector_store import np
+
+
+def random_markdown(sections: int, seed: int = 3) -> str:
+    rng = random.Random(seed)
+    parts = []
+    for h1 in range(sections):
+        parts.append(f"# {' '.join(rng.sample(WORDS, 2))} {h1}\n[[PAGE {h1 + 1}]]\n")
+        for h2 in range(rng.randint(1, 8)):
+            text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 30)))
+            parts.append(f"## Rule {h1}.{h2}\n{text}.\n")
+    return "".join(parts)
+
+
+def random_queries(count: int, seed: int = 5) -> list:
+    rng = random.Random(seed)
+    queries = [" ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 7))) for _ in range(count)]
+    return queries + queries[:10]
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class ResultCacheTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tree = parse_markdown_to_tree(
+            SAMPLE_MARKDOWN, IngestionConfig(doc_id="code", pdf_name="code.pdf")
+        )
+        self.bm25 = BM25Index()
+        self.bm25.add_many(self.tree.h1_nodes.values())
+        self.vector = VectorIndex()
+        self.vector.add_many(self.tree.h2_nodes.values())
+        self.clock = FakeClock()
+        self.cache = ResultCache(max_entries=2, ttl_s=60.0, clock=self.clock)
+        self.pipeline = InferencePipeline(self.tree, self.bm25, self.vector, result_cache=self.cache)
+
+    def test_normalized_repeat_queries_hit(self) -> None:
+        first = self.pipeline.answer("Can the board levy tolls?")
+        second = self.pipeline.answer("  can the BOARD levy   tolls?")
+
+        self.assertEqual(first, second)
+        self.assertEqual(self.pipeline.debug_state()["result_cache"]["hits"], 1)
+        self.assertEqual(self.pipeline.agent.retrieve("can the BOARD levy tolls?").query, "can the BOARD levy tolls?")
+
+    def test_mutation_invalidates_cached_results(self) -> None:
+        query = "Who hears appeals against the collector?"
+        before = self.pipeline.agent.retrieve(query)
+        self.bm25.add(
+            H1Node(
+                node_id="h1_03",
+                level="H1",
+                head="Appeals tribunal",
+                summary="Appeals against the collector are heard by the tribunal.",
+                pages=[3],
+                pdf_name="code.pdf",
+            )
+        )
+        after = self.pipeline.agent.retrieve(query)
+
+        self.assertNotEqual(before.h1_candidates, after.h1_candidates)
+        self.assertEqual(after.h1_candidates[0], "h1_03")
+        self.assertEqual(self.cache.stats()["invalidations"], 1)
+
+        self.vector.remove("h2_01_01")
+        self.pipeline.agent.retrieve(query)
+        self.assertEqual(self.cache.stats()["invalidations"], 2)
+
+    def test_ttl_and_lru_bounds(self) -> None:
+        agent = self.pipeline.agent
+        agent.retrieve("board powers")
+        self.clock.now = 61.0
+        agent.retrieve("board powers")
+        agent.retrieve("appeals filing")
+        agent.retrieve("board duties")
+
+        stats = self.cache.stats()
+        self.assertEqual(stats["expirations"], 1)
+        self.assertEqual(stats["evictions"], 1)
+        self.assertEqual(stats["hits"], 0)
+        self.assertEqual(len(self.cache), 2)
+
+
+class RetrieveManyTests(unittest.TestCase):
+    def build_agent(self, backend: str) -> RetrievalAgent:
+        tree = parse_markdown_to_tree(
+            random_markdown(60), IngestionConfig(doc_id="code", pdf_name="code.pdf")
+        )
+        bm25 = BM25Index()
+        bm25.add_many(tree.h1_nodes.values())
+        vector = VectorIndex(backend=backend)
+        vector.add_many(tree.h2_nodes.values())
+        return RetrievalAgent(tree, bm25, vector)
+
+    def assert_matches_loop(self, agent: RetrievalAgent, **kwargs) -> None:
+        queries = random_queries(120)
+        expected = [agent.retrieve(query, top_h1=5, top_h2=6) for query in queries]
+        self.assertEqual(agent.retrieve_many(queries, top_h1=5, top_h2=6, **kwargs), expected)
+
+    def test_python_backend_matches_loop(self) -> None:
+        self.assert_matches_loop(self.build_agent("python"))
+
+    @unittest.skipIf(np is None, "numpy is not installed")
+    def test_numpy_backend_matches_loop(self) -> None:
+        agent = self.build_agent("numpy")
+        self.assert_matches_loop(agent)
+        self.assert_matches_loop(agent, workers=4)
+
+    def test_bm25_batch_matches_search_with_filter(self) -> None:
+        agent = self.build_agent("python")
+        queries = random_queries(40)
+        for allowed in (None, {"h1_01", "h1_07", "h1_30"}, set(agent.bm25.documents) - {"h1_02"}):
+            with self.subTest(allowed=allowed and len(allowed)):
+                self.assertEqual(
+                    agent.bm25.search_many(queries, top_k=4, allowed=allowed),
+                    [agent.bm25.search(query, top_k=4, allowed=allowed) for query in queries],
+                )
+
+    def test_answer_many_uses_result_cache(self) -> None:
+        agent = self.build_agent("python")
+        cache = ResultCache()
+        pipeline = InferencePipeline(agent.tree, agent.bm25, agent.vector, result_cache=cache)
+        queries = random_queries(20)
+        expected = [pipeline.answer(query) for query in queries]
+        cache.clear()
+        hits = cache.hits
+
+        self.assertEqual(pipeline.answer_many(queries), expected)
+        self.assertEqual(pipeline.answer_many(queries[:5]), expected[:5])
+        self.assertEqual(cache.hits - hits, 5)
+
+
+class NavigationTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tree = parse_markdown_to_tree(
+            random_markdown(30, seed=9), IngestionConfig(doc_id="code", pdf_name="code.pdf")
+        )
+
+    def scan_expand(self, node_id: str, window: int) -> list:
+        h2_ids = []
+        for h1_node in self.tree.h1_nodes.values():
+            if node_id in h1_node.children:
+                idx = h1_node.children.index(node_id)
+                h2_ids.extend(h1_node.children[max(0, idx - window) : idx + window + 1])
+        return list(dict.fromkeys(h2_ids))
+
+    def test_siblings_match_full_scan(self) -> None:
+        navigation = self.tree.navigation
+        for h2_id in self.tree.h2_nodes:
+            for window in (0, 1, 3):
+                self.assertEqual(navigation.siblings(h2_id, window), self.scan_expand(h2_id, window))
+            self.assertEqual(navigation.parent(h2_id), self.tree.h2_nodes[h2_id].parent)
+        self.assertEqual(navigation.siblings("missing"), [])
+
+    def test_nodes_on_page(self) -> None:
+        expected = [h1_id for h1_id, node in self.tree.h1_nodes.items() if 4 in node.pages]
+        expected += [h2_id for h2_id, node in self.tree.h2_nodes.items() if 4 in node.pages]
+        self.assertEqual(self.tree.navigation.nodes_on_page(4), expected)
+        self.assertEqual(self.tree.navigation.nodes_on_page(999), [])
+
+    def test_retrieve_expands_hits_with_neighbours(self) -> None:
+        bm25 = BM25Index()
+        bm25.add_many(self.tree.h1_nodes.values())
+        vector = VectorIndex()
+        vector.add_many(self.tree.h2_nodes.values())
+        agent = RetrievalAgent(self.tree, bm25, vector)
+        query = "which board officer may levy the water tax"
+
+        plain = agent.retrieve(query, top_h2=2)
+        expanded = agent.retrieve(query, top_h2=2, expand_window=1)
+
+        expected_ids = list(
+            dict.fromkeys(
+                h2_id for chunk in plain.chunks for h2_id in self.scan_expand(chunk.node_id, 1)
+            )
+        )
+        self.assertEqual([chunk.node_id for chunk in expanded.chunks], expected_ids)
+        scores = {chunk.node_id: chunk.score for chunk in plain.chunks}
+        for chunk in expanded.chunks:
+            self.assertEqual(chunk.score, scores.get(chunk.node_id, 0.0))
+        self.assertEqual(agent.retrieve_many([query], top_h2=2, expand_window=1), [expanded])
+
+    def test_corpus_mutation_rebuilds_navigation(self) -> None:
+        corpus = CorpusIndex()
+        corpus.add_tree("code", self.tree)
+        self.assertIn("code:h2_01_01", corpus.tree.navigation.parents)
+
+        corpus.remove_document("code")
+        self.assertNotIn("code:h2_01_01", corpus.tree.navigation.parents)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,237 @@
+import asyncio
+import contextlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from benchmarks.synthetic import SAMPLE_MARKDOWN
+from rag_pipeline.corpus import CorpusIndex
+from rag_pipeline.ingestion import IngestionConfig, parse_markdown_to_tree
+from rag_pipeline.indexes import BM25Index
+from rag_pipeline.serve import (
+    MicroBatcher,
+    Overloaded,
+    QueryServer,
+    ServeConfig,
+    answer_json,
+    build_pipeline,
+    load_corpus,
+    main,
+)
+from rag_pipeline.snapshot import SnapshotError
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+QUERIES = [
+    "can the board levy taxes and tolls",
+    "when does the board meet each month",
+    "appeals",
+    "where do appeals lie within thirty days",
+]
+
+
+async def request(port: int, method: str, path: str, body: bytes = b"") -> tuple:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nHost: test\r\nContent-Length: {len(body)}\r\n"
+        f"Connection: close\r\n\r\n".encode("latin-1")
+        + body
+    )
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, payload = response.partition(b"\r\n\r\n")
+    status = int(head.split()[1])
+    return status, head.decode("latin-1"), payload
+
+
+class MicroBatcherTests(unittest.IsolatedAsyncioTestCase):
+    async def test_concurrent_submissions_share_a_batch(self) -> None:
+        seen = []
+
+        def handler(queries: list) -> list:
+            seen.append(list(queries))
+            return [query.upper() for query in queries]
+
+        batcher = MicroBatcher(handler, max_batch_size=8, max_wait_ms=50)
+        batcher.start()
+        results = await asyncio.gather(*(batcher.submit(f"q{idx}") for idx in range(10)))
+        await batcher.stop()
+
+        self.assertEqual(results, [f"Q{idx}" for idx in range(10)])
+        self.assertEqual([len(batch) for batch in seen], [8, 2])
+        self.assertEqual(batcher.stats()["batches"], 2)
+
+    async def test_full_queue_rejects_instead_of_waiting(self) -> None:
+        release = threading.Event()
+
+        def handler(queries: list) -> list:
+            release.wait(5)
+            return queries
+
+        batcher = MicroBatcher(handler, max_batch_size=1, max_wait_ms=0, max_queue=1)
+        batcher.start()
+        first = asyncio.ensure_future(batcher.submit("running"))
+        await asyncio.sleep(0.05)
+        queued = asyncio.ensure_future(batcher.submit("queued"))
+        await asyncio.sleep(0)
+        with self.assertRaises(Overloaded):
+            await batcher.submit("rejected")
+        release.set()
+        self.assertEqual(await asyncio.gather(first, queued), ["running", "queued"])
+        await batcher.stop()
+        self.assertEqual(batcher.stats()["rejected"], 1)
+
+    async def test_handler_errors_reach_every_caller(self) -> None:
+        def handler(queries: list) -> list:
+            raise RuntimeError("index unavailable")
+
+        batcher = MicroBatcher(handler, max_batch_size=4, max_wait_ms=20)
+        batcher.start()
+        results = await asyncio.gather(
+            batcher.submit("a"), batcher.submit("b"), return_exceptions=True
+        )
+        await batcher.stop()
+        self.assertTrue(all(isinstance(result, RuntimeError) for result in results))
+        self.assertEqual(batcher.stats()["failed_batches"], 1)
+
+
+class QueryServerTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        corpus = CorpusIndex()
+        ingestion = IngestionConfig(doc_id="code", pdf_name="code.pdf")
+        corpus.add_tree("code", parse_markdown_to_tree(SAMPLE_MARKDOWN, ingestion))
+        self.pipeline, registry = build_pipeline(corpus, ServeConfig())
+        config = ServeConfig(port=0, max_batch_size=16, max_wait_ms=30, max_body_bytes=1024)
+        self.server = QueryServer(self.pipeline, config, registry)
+        await self.server.start()
+
+    async def asyncTearDown(self) -> None:
+        await self.server.stop()
+
+    async def test_answers_match_the_pipeline(self) -> None:
+        responses = await asyncio.gather(
+            *(
+                request(self.server.port, "POST", "/answer", json.dumps({"query": query}).encode())
+                for query in QUERIES
+            )
+        )
+        for query, (status, _, payload) in zip(QUERIES, responses):
+            self.assertEqual(status, 200)
+            self.assertEqual(json.loads(payload), answer_json(self.pipeline.answer(query)))
+        self.assertLess(self.server.batcher.stats()["batches"], len(QUERIES))
+
+    async def test_health_and_metrics(self) -> None:
+        await request(self.server.port, "POST", "/answer", b'{"query": "board powers to levy taxes"}')
+        status, _, payload = await request(self.server.port, "GET", "/health")
+        health = json.loads(payload)
+        self.assertEqual(status, 200)
+        self.assertEqual(health["status"], "ok")
+        self.assertEqual(health["batcher"]["submitted"], 1)
+        self.assertIn("serve_batch", health["pipeline"]["metrics"]["stage_seconds"])
+
+        status, head, payload = await request(self.server.port, "GET", "/metrics")
+        self.assertEqual(status, 200)
+        self.assertIn("text/plain", head)
+        self.assertIn('rag_queries_bucket{stage="serve_batch"', payload.decode())
+
+    async def test_bad_requests(self) -> None:
+        port = self.server.port
+        self.assertEqual((await request(port, "POST", "/answer", b"not json"))[0], 400)
+        self.assertEqual((await request(port, "POST", "/answer", b'{"query": " "}'))[0], 400)
+        self.assertEqual((await request(port, "GET", "/answer"))[0], 405)
+        self.assertEqual((await request(port, "GET", "/missing"))[0], 404)
+        self.assertEqual((await request(port, "POST", "/answer", b"x" * 2048))[0], 413)
+
+    async def test_keep_alive_serves_several_requests(self) -> None:
+        reader, writer = await asyncio.open_connection("127.0.0.1", self.server.port)
+        for _ in range(2):
+            writer.write(b"GET /health HTTP/1.1\r\nHost: test\r\n\r\n")
+            await writer.drain()
+            head = await reader.readuntil(b"\r\n\r\n")
+            length = int(head.split(b"Content-Length: ")[1].split(b"\r\n")[0])
+            self.assertEqual(json.loads(await reader.readexactly(length))["status"], "ok")
+        writer.close()
+
+
+class LoadCorpusTests(unittest.TestCase):
+    def test_numpy_corpus_drops_per_node_vectors(self) -> None:
+        try:
+            corpus = load_corpus(FIXTURES, backend="numpy")
+        except ModuleNotFoundError:
+            self.skipTest("numpy is not installed")
+        self.assertTrue(corpus.tree.h2_nodes)
+        self.assertTrue(all(node.embedding is None for node in corpus.tree.h2_nodes.values()))
+        self.assertEqual(len(corpus.vector.store), len(corpus.tree.h2_nodes))
+
+    def test_precision_applies_without_snapshots(self) -> None:
+        try:
+            corpus = load_corpus(FIXTURES, backend="numpy", precision="int8")
+        except ModuleNotFoundError:
+            self.skipTest("numpy is not installed")
+        self.assertEqual(corpus.vector.precision, "int8")
+        self.assertEqual(len(corpus.vector.store), len(corpus.tree.h2_nodes))
+
+    def test_snapshots_replace_ingested_indexes(self) -> None:
+        try:
+            built = load_corpus(FIXTURES, backend="numpy")
+        except ModuleNotFoundError:
+            self.skipTest("numpy is not installed")
+        with tempfile.TemporaryDirectory() as root:
+            vectors = os.path.join(root, "vectors.snap")
+            bm25 = os.path.join(root, "bm25.snap")
+            built.vector.save(vectors)
+            built.bm25.save(bm25)
+            corpus = load_corpus(FIXTURES, vectors=vectors, bm25=bm25)
+            self.assertEqual(sorted(corpus.vector.node_ids()), sorted(corpus.tree.h2_nodes))
+            self.assertEqual(corpus.bm25.documents, built.bm25.documents)
+            query = "can the board levy taxes and tolls"
+            self.assertEqual(
+                [(node.node_id, score) for node, score in corpus.vector.search(query, None, 3)],
+                [(node.node_id, score) for node, score in built.vector.search(query, None, 3)],
+            )
+
+    def test_snapshot_from_another_corpus_is_rejected(self) -> None:
+        try:
+            built = load_corpus(FIXTURES, backend="numpy")
+        except ModuleNotFoundError:
+            self.skipTest("numpy is not installed")
+        with tempfile.TemporaryDirectory() as root:
+            vectors = os.path.join(root, "vectors.snap")
+            bm25 = os.path.join(root, "bm25.snap")
+            built.vector.save(vectors)
+            built.bm25.save(bm25)
+            smaller = os.path.join(root, "corpus")
+            os.mkdir(smaller)
+            shutil.copy(os.path.join(FIXTURES, "doc1.md"), smaller)
+            with self.assertRaises(SnapshotError):
+                load_corpus(smaller, vectors=vectors)
+            with self.assertRaises(SnapshotError):
+                load_corpus(smaller, bm25=bm25)
+            self.assertIsInstance(load_corpus(FIXTURES, bm25=bm25).bm25, BM25Index)
+
+    def test_python_backend_loads_vector_snapshot(self) -> None:
+        try:
+            built = load_corpus(FIXTURES, backend="numpy")
+        except ModuleNotFoundError:
+            self.skipTest("numpy is not installed")
+        with tempfile.TemporaryDirectory() as root:
+            vectors = os.path.join(root, "vectors.snap")
+            built.vector.save(vectors)
+            corpus = load_corpus(FIXTURES, vectors=vectors, backend="python")
+        self.assertEqual(corpus.vector.backend, "python")
+        self.assertEqual(sorted(corpus.vector.embeddings), sorted(corpus.tree.h2_nodes))
+
+    def test_quantized_precision_needs_numpy_backend(self) -> None:
+        stderr = io.StringIO()
+        with contextlib.redirect_stderr(stderr), self.assertRaises(SystemExit):
+            main([FIXTURES, "--backend", "python", "--precision", "int8"])
+        self.assertIn("requires --backend numpy", stderr.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
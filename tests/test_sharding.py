@@ -0,0 +1,86 @@
+import unittest
+
+from benchmarks.synthetic import CorpusSpec, generate_markdown, generate_queries
+from rag_pipeline.corpus import CorpusIndex
+from rag_pipeline.indexes import VectorIndex
+from rag_pipeline.ingestion import IngestionConfig, parse_markdown_to_tree
+from rag_pipeline.schemas import DocFilter
+from rag_pipeline.sharding import ShardedRetrievalAgent, ShardError, partition
+from rag_pipeline.vector_store import np
+
+QUERIES = generate_queries(12) + ["fund", "board appeal", "zoning", "chapter tax levy"]
+
+
+def build_corpus(backend: str = "python", precision: str = "float32") -> CorpusIndex:
+    corpus = CorpusIndex(vector=VectorIndex(backend=backend, precision=precision))
+    for idx in range(3):
+        spec = CorpusSpec(h1_count=7, h2_per_h1=4, words_per_section=30, seed=idx)
+        corpus.add_tree(
+            f"act{idx}",
+            parse_markdown_to_tree(
+                generate_markdown(spec), IngestionConfig(doc_id=f"act{idx}", pdf_name=f"act{idx}.pdf")
+            ),
+        )
+    return corpus
+
+
+class ShardedRetrievalTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.corpus = build_corpus()
+        cls.agent = cls.corpus.agent()
+        cls.sharded = ShardedRetrievalAgent(cls.corpus, shards=3)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.sharded.close()
+
+    def test_partition_keeps_children_with_their_heads(self) -> None:
+        parts = partition(self.corpus, 3)
+        self.assertEqual(sum(len(part.h1_nodes) for part in parts), len(self.corpus.tree.h1_nodes))
+        for part in parts:
+            for h1 in part.h1_nodes.values():
+                self.assertTrue(all(h2_id in part.h2_nodes for h2_id in h1.children))
+
+    def test_global_statistics_are_summed_across_shards(self) -> None:
+        self.assertEqual(self.sharded.doc_count, len(self.corpus.bm25.documents))
+        self.assertEqual(self.sharded.total_doc_len, self.corpus.bm25.total_doc_len)
+        self.assertEqual(self.sharded.doc_freqs, self.corpus.bm25.doc_freqs)
+
+    def test_results_match_the_unsharded_agent(self) -> None:
+        for options in ({}, {"top_h1": 1, "top_h2": 2}, {"top_h1": 5, "expand_window": 1}):
+            with self.subTest(**options):
+                self.assertEqual(
+                    self.sharded.retrieve_many(QUERIES, **options),
+                    self.agent.retrieve_many(QUERIES, **options),
+                )
+        self.assertEqual(self.sharded.retrieve(QUERIES[0]), self.agent.retrieve(QUERIES[0]))
+
+    def test_doc_filter_is_applied_before_the_merge(self) -> None:
+        doc_filter = DocFilter(doc_ids=["act1"])
+        results = self.sharded.retrieve_many(QUERIES, top_h1=4, doc_filter=doc_filter)
+        self.assertEqual(results, self.agent.retrieve_many(QUERIES, top_h1=4, doc_filter=doc_filter))
+        self.assertTrue(
+            all(h1_id.startswith("act1:") for result in results for h1_id in result.h1_candidates)
+        )
+
+    def test_shard_failures_raise(self) -> None:
+        with self.assertRaises(ShardError):
+            self.sharded.broadcast("missing", [None] * self.sharded.shards)
+        self.assertEqual(self.sharded.retrieve(QUERIES[1]), self.agent.retrieve(QUERIES[1]))
+
+
+@unittest.skipIf(np is None, "numpy is not installed")
+class NumpyShardedRetrievalTests(unittest.TestCase):
+    def test_numpy_and_int8_backends_match(self) -> None:
+        for precision in ("float32", "int8"):
+            corpus = build_corpus("numpy", precision)
+            with self.subTest(precision=precision), ShardedRetrievalAgent(corpus, shards=2) as sharded:
+                self.assertEqual(
+                    sharded.retrieve_many(QUERIES, top_h1=4),
+                    corpus.agent().retrieve_many(QUERIES, top_h1=4),
+                )
+
+
+if __name__ == "__main__":
+    unittest.main()
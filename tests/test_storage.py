@@ -0,0 +1,127 @@
+import unittest
+
+from rag_pipeline.embeddings import HashEmbedder, attach_embeddings
+from rag_pipeline.indexes import BM25Index, VectorIndex
+from rag_pipeline.ingestion import IngestionConfig, parse_markdown_to_tree
+from rag_pipeline.retrieval import RetrievalAgent
+from rag_pipeline.schemas import DocumentRoot
+from rag_pipeline.storage import LazyH2Nodes, MissingTextError, MongoTreeStore
+
+try:
+    import mongomock
+except ModuleNotFoundError:
+    mongomock = None
+
+
+def build_tree(doc_id: str, sections: int):
+    markdown = "".join(
+        f"# Part {idx}\n[[PAGE {idx + 1}]]\n## Rule {idx}\nRule {idx} text.\n## Note {idx}\nNote.\n"
+        for idx in range(sections)
+    )
+    return parse_markdown_to_tree(markdown, IngestionConfig(doc_id=doc_id, pdf_name=f"{doc_id}.pdf"))
+
+
+@unittest.skipIf(mongomock is None, "mongomock is not installed")
+class MongoTreeStoreTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.store = MongoTreeStore(uri="mongodb://stub", client=mongomock.MongoClient(), batch_size=4)
+        self.trees = {doc_id: build_tree(doc_id, 5) for doc_id in ("a", "b", "c")}
+
+    def test_save_trees_round_trips_in_batches(self) -> None:
+        calls = []
+        bulk_write = self.store.h2_nodes.bulk_write
+
+        def counting_bulk_write(operations, ordered=True):
+            calls.append((len(operations), ordered))
+            return bulk_write(operations, ordered=ordered)
+
+        self.store.h2_nodes.bulk_write = counting_bulk_write
+        self.store.save_trees(
+            (DocumentRoot(pdf_name=f"{doc_id}.pdf", doc_id=doc_id), tree)
+            for doc_id, tree in self.trees.items()
+        )
+
+        self.assertEqual(calls, [(4, False)] * 7 + [(2, False)])
+        self.assertEqual(self.store.load_trees(["a", "b", "c"]), self.trees)
+        self.assertEqual(self.store.documents.count_documents({}), 3)
+
+    def test_save_tree_is_idempotent_and_indexes_once(self) -> None:
+        created = []
+        create_index = self.store.documents.create_index
+        self.store.documents.create_index = lambda *args, **kwargs: created.append(args) or create_index(
+            *args, **kwargs
+        )
+        doc_root = DocumentRoot(pdf_name="a.pdf", doc_id="a")
+        self.store.save_tree(doc_root, self.trees["a"])
+        self.store.save_tree(doc_root, self.trees["a"])
+
+        self.assertEqual(len(created), 1)
+        self.assertEqual(self.store.h1_nodes.count_documents({"doc_id": "a"}), 5)
+        self.assertEqual(self.store.load_tree("a"), self.trees["a"])
+
+    def test_lazy_tree_fetches_text_for_returned_chunks_only(self) -> None:
+        tree = attach_embeddings(self.trees["a"], HashEmbedder(dim=64))
+        self.store.save_tree(DocumentRoot(pdf_name="a.pdf", doc_id="a"), tree)
+
+        lazy = self.store.load_tree("a", lazy=True, cache_size=2)
+        h2_nodes = lazy.h2_nodes
+        self.assertIsInstance(h2_nodes, LazyH2Nodes)
+        self.assertEqual(h2_nodes.fetches, 0)
+        self.assertEqual(h2_nodes.skeletons["h2_01_01"].text, "")
+        self.assertIn("h2_01_01", h2_nodes)
+        self.assertNotIn("h2_99_99", h2_nodes)
+        self.assertIsNone(h2_nodes.get("h2_99_99"))
+        self.assertEqual(h2_nodes.fetches, 0)
+
+        bm25 = BM25Index()
+        bm25.add_many(lazy.h1_nodes.values())
+        vector = VectorIndex(embedder=HashEmbedder(dim=64), node_source=h2_nodes)
+        vector.add_many(h2_nodes.skeletons.values())
+        result = RetrievalAgent(lazy, bm25, vector).retrieve("What does rule 3 text say?", top_h2=2)
+
+        self.assertEqual(h2_nodes.fetches, 1)
+        self.assertEqual(len(h2_nodes.texts), 2)
+        self.assertEqual(result.chunks[0].text, tree.h2_nodes[result.chunks[0].node_id].text)
+        self.assertEqual(lazy, self.store.load_tree("a"))
+
+    def test_lazy_pop_never_fetches(self) -> None:
+        self.store.save_tree(DocumentRoot(pdf_name="a.pdf", doc_id="a"), self.trees["a"])
+        h2_nodes = self.store.load_tree("a", lazy=True).h2_nodes
+
+        popped = h2_nodes.pop("h2_01_01")
+        self.assertEqual(popped.node_id, "h2_01_01")
+        self.assertIsNone(h2_nodes.pop("h2_01_01", None))
+        with self.assertRaises(KeyError):
+            h2_nodes.pop("h2_01_01")
+        self.assertNotIn("h2_01_01", h2_nodes)
+        self.assertEqual(h2_nodes.fetches, 0)
+
+    def test_lazy_missing_text_is_reported(self) -> None:
+        self.store.save_tree(DocumentRoot(pdf_name="a.pdf", doc_id="a"), self.trees["a"])
+        h2_nodes = self.store.load_tree("a", lazy=True).h2_nodes
+        self.store.h2_nodes.delete_one({"doc_id": "a", "node_id": "h2_01_02"})
+
+        with self.assertRaisesRegex(MissingTextError, "h2_01_02"):
+            h2_nodes["h2_01_02"]
+        with self.assertRaisesRegex(MissingTextError, "h2_01_02"):
+            h2_nodes.items()
+
+    def test_embeddings_are_packed_as_float32_binary(self) -> None:
+        tree = attach_embeddings(self.trees["a"], HashEmbedder(dim=16))
+        self.store.save_tree(DocumentRoot(pdf_name="a.pdf", doc_id="a"), tree)
+        self.store.h2_nodes.update_one(
+            {"doc_id": "a", "node_id": "h2_01_02"},
+            {"$set": {"embedding": tree.h2_nodes["h2_01_02"].embedding}},
+        )
+
+        record = self.store.h2_nodes.find_one({"doc_id": "a", "node_id": "h2_01_01"})
+        reloaded = self.store.load_tree("a")
+
+        self.assertEqual(len(record["embedding"]), 16 * 4)
+        for node_id, node in tree.h2_nodes.items():
+            for stored, expected in zip(reloaded.h2_nodes[node_id].embedding, node.embedding):
+                self.assertAlmostEqual(stored, expected, places=6)
+
+
+if __name__ == "__main__":
+    unittest.main()
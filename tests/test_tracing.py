@@ -0,0 +1,72 @@
+import unittest
+
+from benchmarks.synthetic import SAMPLE_MARKDOWN
+from rag_pipeline.indexes import BM25Index, VectorIndex
+from rag_pipeline.inference import InferencePipeline
+from rag_pipeline.ingestion import IngestionConfig, parse_markdown_to_tree
+from rag_pipeline.tracing import NOOP_SPAN, CallbackTracer, FanoutTracer, MetricsRegistry, span
+
+
+def build_pipeline(tracer):
+    tree = parse_markdown_to_tree(
+        SAMPLE_MARKDOWN, IngestionConfig(doc_id="code", pdf_name="code.pdf")
+    )
+    bm25 = BM25Index()
+    bm25.add_many(tree.h1_nodes.values())
+    vector = VectorIndex()
+    vector.add_many(tree.h2_nodes.values())
+    return InferencePipeline(tree, bm25, vector, tracer=tracer)
+
+
+class TracingTests(unittest.TestCase):
+    def test_spans_cover_each_stage(self) -> None:
+        spans = []
+        pipeline = build_pipeline(CallbackTracer(lambda *args: spans.append(args)))
+
+        pipeline.answer("Can the board levy tolls on traders?")
+
+        stages = [stage for stage, _, _ in spans]
+        self.assertEqual(
+            stages, ["bm25", "vector", "chunks", "citations", "retrieve", "format", "answer"]
+        )
+        attributes = {stage: attrs for stage, _, attrs in spans}
+        self.assertEqual(attributes["bm25"], {"candidates": 2})
+        self.assertEqual(attributes["vector"], {"scope_size": 3, "hits": 3})
+        self.assertTrue(all(seconds >= 0.0 for _, seconds, _ in spans))
+
+    def test_registry_exports_json_and_prometheus(self) -> None:
+        registry = MetricsRegistry()
+        spans = []
+        tracer = FanoutTracer(registry, CallbackTracer(lambda *args: spans.append(args)))
+        pipeline = build_pipeline(tracer)
+
+        pipeline.answer("Can the board levy tolls on traders?")
+        pipeline.agent.retrieve_many(["board powers", "Who hears appeals about tolls?"])
+
+        metrics = pipeline.debug_state()["metrics"]
+        self.assertEqual(metrics["stage_seconds"]["retrieve"]["count"], 1)
+        self.assertEqual(metrics["stage_seconds"]["bm25"]["count"], 2)
+        self.assertEqual(metrics["scope_size"]["vector"]["sum"], 6.0)
+        self.assertEqual(metrics["candidates"]["bm25"]["buckets"]["2"], 1)
+
+        text = registry.to_prometheus()
+        self.assertIn("# TYPE rag_stage_seconds histogram", text)
+        self.assertIn('rag_stage_seconds_count{stage="answer"} 1', text)
+        self.assertIn('rag_candidates_bucket{stage="bm25",le="+Inf"} 2', text)
+
+    def test_errors_are_counted(self) -> None:
+        registry = MetricsRegistry()
+        with self.assertRaises(RuntimeError):
+            with span(registry, "bm25"):
+                raise RuntimeError("boom")
+        self.assertEqual(registry.to_json()["errors"], {"bm25": 1})
+        self.assertIn('rag_stage_errors_total{stage="bm25"} 1', registry.to_prometheus())
+
+    def test_disabled_tracing_uses_shared_noop_span(self) -> None:
+        self.assertIs(span(None, "bm25"), NOOP_SPAN)
+        pipeline = build_pipeline(None)
+        self.assertNotIn("metrics", pipeline.debug_state())
+
+
+if __name__ == "__main__":
+    unittest.main()